@@ -0,0 +1,9 @@
+"""Нагрузочные замеры всех страниц Yatube.
+
+``seed`` наполняет отдельную базу правдоподобными данными, ``routes``
+перечисляет все адреса ``posts``, ``users`` и ``about`` с аргументами
+из этих данных, ``runner`` гоняет их через тестовый клиент и через
+WSGI-сервер в том же процессе и считает задержки, запросы к базе и
+память, а также сравнивает итог с сохранённым эталоном. Запуск —
+``manage.py benchmark``.
+"""
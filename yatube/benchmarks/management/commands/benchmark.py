@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+from benchmarks import routes, runner, seed
+
+# База и файлы замеров живут здесь между запусками с --keepdb.
+WORKDIR = os.path.join(tempfile.gettempdir(), 'yatube-benchmark')
+COLUMNS = ('p50', 'p95', 'p99', 'queries', 'memory_kib', 'rps')
+
+
+class Command(BaseCommand):
+    help = ('Наполняет отдельную базу и замеряет все адреса сайта: '
+            'задержки p50/p95/p99, запросы к базе и память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=seed.SCALES, default='small',
+            help='Размер набора данных.')
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько запросов на каждый адрес.')
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Сколько запросов перед замером не учитывать.')
+        parser.add_argument(
+            '--transport', choices=(*runner.TRANSPORTS, 'all'),
+            default='all', help='Тестовый клиент, WSGI-сервер или оба.')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Сколько потоков шлют запросы одновременно.')
+        parser.add_argument(
+            '--route', action='append', dest='route_names',
+            help='Замерять только этот маршрут («posts:index»); '
+                 'можно указать несколько раз.')
+        parser.add_argument(
+            '--save-baseline', help='Сохранить результаты как эталон.')
+        parser.add_argument(
+            '--baseline', help='Сравнить результаты с эталоном.')
+        parser.add_argument(
+            '--tolerance', type=float, default=runner.TOLERANCE,
+            help='Допустимый рост p95 и памяти, доля (0.2 — на 20%%).')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять наполненную базу, взять её в следующий раз.')
+
+    def handle(self, *args, scale='small', requests=50, warmup=5,
+               transport='all', concurrency=1, route_names=None,
+               save_baseline=None, baseline=None,
+               tolerance=runner.TOLERANCE, keepdb=False, **options):
+        unknown = set(route_names or ()) - set(routes.ROUTES)
+        if unknown:
+            raise CommandError(f'Нет таких маршрутов: {", ".join(unknown)}')
+        expected = runner.load_baseline(baseline) if baseline else None
+        transports = (
+            list(runner.TRANSPORTS) if transport == 'all' else [transport])
+
+        workdir = os.path.join(WORKDIR, scale)
+        os.makedirs(workdir, exist_ok=True)
+        # Файловая база, а не в памяти: её видит поток WSGI-сервера.
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            workdir, 'db.sqlite3')
+        setup_test_environment(debug=False)
+        config = setup_databases(
+            verbosity=0, interactive=False, keepdb=keepdb)
+        try:
+            with override_settings(
+                    MEDIA_ROOT=os.path.join(workdir, 'media')):
+                results = self.benchmark(
+                    scale, transports, route_names, requests, warmup,
+                    concurrency)
+        finally:
+            teardown_databases(config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+            if not keepdb:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        if save_baseline:
+            runner.save_baseline(
+                save_baseline, results, scale=scale, requests=requests,
+                concurrency=concurrency, profile=settings.PROFILE)
+            self.stdout.write(f'Эталон сохранён: {save_baseline}')
+        if expected is not None:
+            regressions = runner.compare(results, expected, tolerance)
+            for line in regressions:
+                self.stderr.write(line)
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def benchmark(self, scale, transports, route_names, requests, warmup,
+                  concurrency):
+        # Профили настроек сравниваются прогонами с разным DJANGO_ENV:
+        # эталон одного профиля, --baseline с ним — для другого.
+        self.stdout.write(f'Профиль настроек: {settings.PROFILE}')
+        data = seed.dataset()
+        if data is None:
+            self.stdout.write(f'Наполнение базы, масштаб {scale}')
+            data = seed.seed(seed.SCALES[scale], stdout=self.stdout)
+        self.stdout.write(
+            f'{"транспорт":<8} {"маршрут":<32} ' + ' '.join(
+                f'{column:>10}' for column in COLUMNS))
+        results = []
+        try:
+            for result in runner.run(
+                    transports, data.user, routes.build(data, route_names),
+                    requests, warmup, concurrency):
+                results.append(result)
+                self.stdout.write(
+                    f'{result.transport:<8} {result.route:<32} ' + ' '.join(
+                        f'{self.cell(getattr(result, column)):>10}'
+                        for column in COLUMNS))
+        except runner.BenchmarkError as error:
+            raise CommandError(error)
+        return results
+
+    def cell(self, value):
+        return '—' if value is None else str(value)
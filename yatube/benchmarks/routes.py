@@ -0,0 +1,80 @@
+"""Адреса замеров: каждый маршрут ``posts``, ``users`` и ``about``.
+
+Аргументы берутся из наполненной базы (``seed.Dataset``). Все запросы —
+GET: так страница с формой отдаёт форму, а адреса-действия (подписка,
+комментарий) проходят проверку входа, поиск объекта и редирект.
+Маршруты, меняющие данные или сессию, идут в конце; после выхода
+(``logout``) сессия восстанавливается перед следующим запросом.
+"""
+from collections import namedtuple
+
+from django.contrib.auth.tokens import default_token_generator
+from django.urls import get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+Route = namedtuple('Route', 'name url auth relogin')
+
+NAMESPACES = ('posts', 'users', 'about')
+
+# Маршрут → (аргументы из Dataset, нужен ли вход).
+ROUTES = {
+    'posts:index': (lambda data: {}, False),
+    'posts:group_list': (lambda data: {'slug': data.group.slug}, False),
+    'posts:profile': (
+        lambda data: {'username': data.author.username}, False),
+    'posts:post_detail': (lambda data: {'post_id': data.post.pk}, False),
+    'posts:search': (lambda data: {}, False),
+    'posts:follow_index': (lambda data: {}, True),
+    'posts:post_create': (lambda data: {}, True),
+    'posts:post_edit': (lambda data: {'post_id': data.post.pk}, True),
+    'about:author': (lambda data: {}, False),
+    'about:tech': (lambda data: {}, False),
+    'users:signup': (lambda data: {}, False),
+    'users:login': (lambda data: {}, False),
+    'users:password_reset': (lambda data: {}, False),
+    'users:password_reset_done': (lambda data: {}, False),
+    'users:password_reset_confirm': (lambda data: {
+        'uidb64': urlsafe_base64_encode(force_bytes(data.user.pk)),
+        'token': default_token_generator.make_token(data.user),
+    }, False),
+    'users:password_reset_complete': (lambda data: {}, False),
+    'users:password_change': (lambda data: {}, True),
+    'users:password_change_done': (lambda data: {}, True),
+    'posts:add_comment': (lambda data: {'post_id': data.post.pk}, True),
+    'posts:profile_unfollow': (
+        lambda data: {'username': data.author.username}, True),
+    'posts:profile_follow': (
+        lambda data: {'username': data.author.username}, True),
+    'users:logout': (lambda data: {}, True),
+}
+# Запросы с параметрами: одного имени маршрута для них мало.
+QUERIES = {
+    'posts:search': {'q': 'работа'},
+}
+
+
+def url_names():
+    """Все именованные маршруты приложений сайта: «ns:name»."""
+    resolver = get_resolver()
+    names = set()
+    for namespace in NAMESPACES:
+        _, sub_resolver = resolver.namespace_dict[namespace]
+        names.update(
+            f'{namespace}:{name}' for name in sub_resolver.reverse_dict
+            if isinstance(name, str))
+    return names
+
+
+def build(data, names=None):
+    """Список ``Route`` для набора данных, по порядку ``ROUTES``."""
+    routes = []
+    for name, (kwargs, auth) in ROUTES.items():
+        if names and name not in names:
+            continue
+        url = reverse(name, kwargs=kwargs(data))
+        query = QUERIES.get(name)
+        if query:
+            url = f'{url}?{urlencode(query)}'
+        routes.append(Route(name, url, auth, name == 'users:logout'))
+    return routes
@@ -0,0 +1,289 @@
+"""Прогон адресов и сравнение с эталоном.
+
+Запросы идут двумя путями: через тестовый клиент Django (без сети,
+видно чистое время представления и шаблонов) и через настоящий
+WSGI-сервер в потоке того же процесса (добавляются разбор HTTP,
+сокеты и новое соединение с базой на запрос). Для каждого адреса
+считаются перцентили задержки p50/p95/p99 по правилу ближайшего ранга,
+число запросов к базе и пик выделенной памяти (``tracemalloc``, только
+для тестового клиента: он работает в потоке замера).
+
+Эталон — JSON с результатами прошлого прогона. Регрессия — это p95
+или память больше эталона на ``tolerance`` и не меньше порога в
+абсолютных единицах (чтобы шум на быстрых страницах не срабатывал),
+а также любой лишний запрос к базе.
+"""
+import json
+import math
+import socket
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+
+PERCENTILES = (50, 95, 99)
+QUERIES_HEADER = 'X-Benchmark-Queries'
+# Прогонов под tracemalloc: он замедляет код в разы, много не нужно.
+MEMORY_SAMPLES = 5
+TOLERANCE = 0.2
+MIN_DELTA_MS = 2.0
+MIN_DELTA_KIB = 64
+
+Result = namedtuple(
+    'Result', 'transport route status p50 p95 p99 queries memory_kib rps')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@contextmanager
+def count_queries(counts):
+    """Добавляет в список ``counts`` по единице на запрос к базе."""
+    def wrapper(execute, sql, params, many, context):
+        counts.append(1)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def percentile(values, rank):
+    """Перцентиль по правилу ближайшего ранга: всегда одно из значений."""
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class ClientTransport:
+    """Запросы через ``django.test.Client`` в текущем потоке."""
+    name = 'client'
+
+    def __init__(self, user):
+        self.user = user
+
+    def session(self, auth):
+        client = Client()
+        if auth:
+            client.force_login(self.user)
+
+        def get(route):
+            counts = []
+            with count_queries(counts):
+                response = client.get(route.url)
+            if route.relogin:
+                client.force_login(self.user)
+            return response.status_code, len(counts)
+
+        return get
+
+    def close(self):
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    def setup(self):
+        super().setup()
+        # Заголовки и тело ответа уходят разными вызовами send; без
+        # TCP_NODELAY алгоритм Нейгла и отложенный ACK клиента
+        # добавляют к каждому ответу ~40 мс.
+        self.connection.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def counting(application):
+    """WSGI-обёртка: число запросов к базе уходит в заголовке ответа.
+
+    Django вызывает ``start_response`` после представления, поэтому к
+    этому моменту все запросы уже посчитаны.
+    """
+    def wrapper(environ, start_response):
+        counts = []
+
+        def start(status, headers, exc_info=None):
+            headers.append((QUERIES_HEADER, str(len(counts))))
+            return start_response(status, headers, exc_info)
+
+        with count_queries(counts):
+            return application(environ, start)
+
+    return wrapper
+
+
+class WsgiTransport:
+    """Запросы по HTTP к WSGI-серверу в потоке этого же процесса."""
+    name = 'wsgi'
+
+    def __init__(self, user):
+        self.user = user
+        self.server = ThreadedWSGIServer(
+            ('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        self.server.set_app(counting(get_wsgi_application()))
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address
+        self.base_url = f'http://{host}:{port}'
+
+    def login(self, http):
+        client = Client()
+        client.force_login(self.user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+        http.cookies.set(settings.SESSION_COOKIE_NAME, cookie.value)
+
+    def session(self, auth):
+        http = requests.Session()
+        if auth:
+            self.login(http)
+
+        def get(route):
+            response = http.get(
+                self.base_url + route.url, allow_redirects=False)
+            if route.relogin:
+                self.login(http)
+            return (
+                response.status_code,
+                int(response.headers.get(QUERIES_HEADER, 0)))
+
+        return get
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+TRANSPORTS = {
+    transport.name: transport
+    for transport in (ClientTransport, WsgiTransport)
+}
+
+
+def _timed(get, route, count):
+    """Время каждого из ``count`` запросов, худший статус ответа и число
+    запросов к базе последнего."""
+    timings = []
+    worst = queries = None
+    for _ in range(count):
+        started = time.perf_counter()
+        status, queries = get(route)
+        timings.append((time.perf_counter() - started) * 1000)
+        worst = status if worst is None else max(worst, status)
+    return timings, worst, queries
+
+
+def _memory(get, route):
+    """Пик памяти одного запроса в КиБ, медиана из нескольких."""
+    peaks = []
+    for _ in range(MEMORY_SAMPLES):
+        tracemalloc.start()
+        try:
+            get(route)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return round(percentile(peaks, 50), 1)
+
+
+def measure(transport, route, count, warmup=5, concurrency=1):
+    """Прогоняет адрес ``count`` раз; возвращает ``Result``."""
+    get = transport.session(route.auth)
+    _timed(get, route, warmup)
+    if concurrency > 1:
+        # У каждого потока своя сессия: клиент и requests.Session
+        # не рассчитаны на общий доступ.
+        sessions = [get] + [
+            transport.session(route.auth) for _ in range(concurrency - 1)]
+        share = math.ceil(count / concurrency)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            parts = list(pool.map(
+                lambda session: _timed(session, route, share), sessions))
+        elapsed = time.perf_counter() - started
+        timings = [timing for part in parts for timing in part[0]]
+        # Ошибка в любом потоке портит замер, а не только в первом.
+        status = max(part[1] for part in parts)
+        queries = parts[0][2]
+    else:
+        started = time.perf_counter()
+        timings, status, queries = _timed(get, route, count)
+        elapsed = time.perf_counter() - started
+    if status >= 400:
+        raise BenchmarkError(
+            f'{transport.name} {route.url}: ответ {status}')
+    memory = _memory(get, route) if transport.name == 'client' else None
+    p50, p95, p99 = (
+        round(percentile(timings, rank), 2) for rank in PERCENTILES)
+    return Result(
+        transport.name, route.name, status, p50, p95, p99, queries, memory,
+        round(len(timings) / elapsed, 1) if elapsed else None)
+
+
+def run(transport_names, user, routes, count, warmup=5, concurrency=1):
+    """Все адреса через все транспорты; отдаёт ``Result`` по одному."""
+    for name in transport_names:
+        transport = TRANSPORTS[name](user)
+        try:
+            for route in routes:
+                yield measure(transport, route, count, warmup, concurrency)
+        finally:
+            transport.close()
+
+
+def key(result):
+    return f'{result["transport"]} {result["route"]}'
+
+
+def save_baseline(path, results, **meta):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump({
+            **meta,
+            'results': [result._asdict() for result in results],
+        }, stream, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        data = json.load(stream)
+    return {key(result): result for result in data['results']}
+
+
+def compare(results, baseline, tolerance=TOLERANCE,
+            min_delta_ms=MIN_DELTA_MS, min_delta_kib=MIN_DELTA_KIB):
+    """Регрессии относительно эталона — список строк для отчёта."""
+    regressions = []
+    for result in results:
+        current = result._asdict()
+        base = baseline.get(key(current))
+        if base is None:
+            continue
+        name = key(current)
+        if (current['p95'] > base['p95'] * (1 + tolerance)
+                and current['p95'] - base['p95'] >= min_delta_ms):
+            regressions.append(
+                f'{name}: p95 {base["p95"]} → {current["p95"]} мс')
+        if current['queries'] > base['queries']:
+            regressions.append(
+                f'{name}: запросов {base["queries"]} → {current["queries"]}')
+        if (current['memory_kib'] is not None
+                and base.get('memory_kib') is not None
+                and current['memory_kib'] > base['memory_kib'] * (
+                    1 + tolerance)
+                and current['memory_kib'] - base['memory_kib'] >= (
+                    min_delta_kib)):
+            regressions.append(
+                f'{name}: память {base["memory_kib"]} → '
+                f'{current["memory_kib"]} КиБ')
+    return regressions
@@ -0,0 +1,123 @@
+"""Правдоподобный набор данных для замеров.
+
+Пользователи и группы создаются через mixer, тексты — Faker с
+русской локалью и фиксированным зерном, поэтому два прогона одного
+масштаба получают одинаковые данные. Посты, комментарии и подписки
+сохраняются обычным ``create``: срабатывают сигналы, и счётчики,
+ленты подписок и поисковый индекс заполняются так же, как на сайте.
+Часть постов получает картинку, миниатюры для неё строятся сразу.
+"""
+import io
+import random
+from collections import namedtuple
+
+from django.core.files.base import ContentFile
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Comment, Follow, Group, Post, User
+
+# Имя и пароль пользователя, от которого идут запросы со входом.
+USERNAME = 'benchmark'
+PASSWORD = 'benchmark-password'
+SEED = 2022
+
+Scale = namedtuple(
+    'Scale', 'users groups posts comments follows image_share')
+
+SCALES = {
+    'tiny': Scale(5, 2, 30, 40, 10, 0.2),
+    'small': Scale(50, 5, 500, 1000, 300, 0.2),
+    'medium': Scale(300, 20, 5000, 15000, 3000, 0.2),
+    'large': Scale(2000, 50, 50000, 150000, 30000, 0.2),
+}
+# Разных картинок немного: хранилище по содержимому хранит одну копию.
+IMAGE_COLORS = 16
+
+Dataset = namedtuple('Dataset', 'user author group post')
+
+
+def jpeg(color, size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def dataset():
+    """Объекты, на которые ссылаются адреса замеров, из уже наполненной
+    базы; ``None``, если база не наполнена."""
+    user = User.objects.filter(username=USERNAME).first()
+    if user is None:
+        return None
+    post = user.posts.order_by('-id').first()
+    author = User.objects.filter(
+        following__user=user).order_by('pk').first() or user
+    return Dataset(user, author, post.group, post)
+
+
+def seed(scale, stdout=None):
+    """Наполняет базу в масштабе ``scale``; возвращает ``Dataset``."""
+    def report(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    fake = Faker('ru_RU')
+    fake.seed_instance(SEED)
+    rand = random.Random(SEED)
+    user = User.objects.create_user(USERNAME, password=PASSWORD)
+    users = [user] + [
+        mixer.blend(
+            User, username=f'{fake.user_name()}{number}',
+            first_name=fake.first_name(), last_name=fake.last_name())
+        for number in range(scale.users - 1)
+    ]
+    groups = [
+        mixer.blend(
+            Group, title=fake.catch_phrase()[:200], slug=f'group-{number}',
+            description=fake.paragraph())
+        for number in range(scale.groups)
+    ]
+    report(f'Пользователей: {len(users)}, групп: {len(groups)}')
+
+    images = {}
+    posts = []
+    for number in range(scale.posts):
+        # Пользователь замеров пишет в группы, остальные — в случайные.
+        author = user if number % 50 == 0 else rand.choice(users)
+        group = groups[number % len(groups)] if (
+            author is user or rand.random() < 0.7) else None
+        post = Post(
+            author=author, group=group,
+            text=fake.text(max_nb_chars=rand.choice((200, 600, 1500))))
+        if rand.random() < scale.image_share:
+            color = rand.randrange(IMAGE_COLORS)
+            post.image = ContentFile(
+                jpeg((color * 16, 120, 255 - color * 16)),
+                name=f'benchmark-{color}.jpg')
+        post.save()
+        if post.image:
+            images.setdefault(post.image.name, post.image)
+        posts.append(post.pk)
+    for name in images:
+        thumbnails.generate(name)
+    report(f'Постов: {len(posts)}, разных картинок: {len(images)}')
+
+    for _ in range(scale.comments):
+        Comment.objects.create(
+            post_id=rand.choice(posts), author=rand.choice(users),
+            text=fake.sentence(nb_words=rand.randint(3, 20)))
+    pairs = {
+        (rand.choice(users), rand.choice(users))
+        for _ in range(scale.follows)
+    }
+    # Пользователь замеров подписан на десяток авторов, чтобы лента
+    # подписок была не пустой.
+    pairs.update((user, author) for author in users[1:11])
+    follows = [
+        Follow.objects.create(user=follower, author=author)
+        for follower, author in pairs if follower != author
+    ]
+    report(f'Комментариев: {scale.comments}, подписок: {len(follows)}')
+    return dataset()
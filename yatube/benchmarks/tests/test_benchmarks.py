@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from benchmarks import routes, runner, seed
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def result(**values):
+    defaults = dict(
+        transport='client', route='posts:index', status=200, p50=5.0,
+        p95=10.0, p99=12.0, queries=3, memory_kib=500.0, rps=100.0)
+    return runner.Result(**{**defaults, **values})
+
+
+class RoutesTests(TestCase):
+    def test_every_named_route_is_benchmarked(self):
+        """Замеры покрывают все именованные адреса posts, users и about."""
+        self.assertEqual(set(routes.ROUTES), routes.url_names())
+
+    def test_failure_in_any_thread_is_reported(self):
+        """Ошибка в любом из параллельных потоков проваливает замер."""
+        statuses = iter([200, 500])
+
+        class Transport:
+            name = 'fake'
+
+            def session(self, auth):
+                status = next(statuses, 200)
+                return lambda route: (status, 0)
+
+        route = routes.Route('posts:index', '/', False, False)
+        with self.assertRaisesMessage(runner.BenchmarkError, 'ответ 500'):
+            runner.measure(Transport(), route, 4, warmup=0, concurrency=2)
+
+    def test_percentile_is_nearest_rank(self):
+        """Перцентиль — одно из измеренных значений."""
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 50), 50)
+        self.assertEqual(runner.percentile(values, 99), 99)
+        self.assertEqual(runner.percentile([7], 95), 7)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RunTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_client_run_covers_seeded_site(self):
+        """Все адреса наполненного сайта отвечают без ошибок."""
+        self.assertIsNone(seed.dataset())
+        data = seed.seed(seed.SCALES['tiny'])
+        self.assertEqual(data.post.author, data.user)
+        self.assertTrue(data.user.follower.filter(author=data.author))
+        results = list(runner.run(
+            ['client'], data.user, routes.build(data), count=2, warmup=0))
+        self.assertEqual(len(results), len(routes.ROUTES))
+        detail = {item.route: item for item in results}['posts:post_detail']
+        self.assertEqual(detail.status, 200)
+        self.assertGreater(detail.queries, 0)
+        self.assertGreater(detail.memory_kib, 0)
+        self.assertLessEqual(detail.p50, detail.p99)
+
+
+class CompareTests(TestCase):
+    def baseline(self, **values):
+        item = result(**values)._asdict()
+        return {runner.key(item): item}
+
+    def test_regressions_are_reported(self):
+        """Рост p95, памяти и числа запросов — регрессия."""
+        regressions = runner.compare(
+            [result(p95=20.0, queries=4, memory_kib=1000.0)],
+            self.baseline())
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('p95 10.0 → 20.0', regressions[0])
+
+    def test_noise_is_not_a_regression(self):
+        """Рост в пределах допуска или порога не считается регрессией."""
+        self.assertEqual(runner.compare(
+            [result(p95=11.0, memory_kib=550.0)], self.baseline()), [])
+        self.assertEqual(runner.compare(
+            [result(p95=1.5)], self.baseline(p95=1.0)), [])
+        self.assertEqual(runner.compare(
+            [result(route='posts:search')], self.baseline()), [])
@@ -0,0 +1,312 @@
+"""Кэш, общий для всех воркеров одной машины, и двухуровневая обёртка.
+
+``SQLiteCache`` хранит записи в отдельном файле SQLite в режиме WAL:
+его одновременно читают и пишут все процессы gunicorn, поэтому
+страница, собранная одним воркером, достаётся остальным. Целые числа
+хранятся как INTEGER, и ``incr`` выполняется одним атомарным UPDATE.
+
+``TieredCache`` добавляет перед общим кэшем (L2) маленький LRU в
+памяти процесса (L1) с коротким временем жизни, чтобы горячие ключи
+не ходили в L2 на каждом запросе. Ключи с префиксами из
+``L1_SKIP_PREFIXES`` (например, счётчики поколений) читаются только
+из L2, чтобы сброс кэша одним воркером сразу видели все остальные.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._sets = 0
+
+    @property
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _alive(self):
+        return '(expires IS NULL OR expires > ?)', time.time()
+
+    def _keys(self, keys, version):
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        return made
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = self._keys(keys, version)
+        if not made:
+            return {}
+        alive, now = self._alive()
+        placeholders = ', '.join('?' * len(made))
+        rows = self._connection.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {alive}',
+            (*made, now),
+        ).fetchall()
+        return {made[key]: self._decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (made_key, self._encode(data[key]), expires)
+            for made_key, key in self._keys(data, version).items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', rows,
+            )
+        self._sets += len(rows)
+        if self._sets >= self.cull_every:
+            self._sets = 0
+            self._cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        alive, now = self._alive()
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as connection:
+            connection.execute(
+                f'DELETE FROM cache WHERE key = ? AND NOT {alive}',
+                (made_key, now))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', (made_key, self._encode(value), expires),
+            )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        alive, now = self._alive()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {alive}',
+                (self.get_backend_timeout(timeout), made_key, now),
+            )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        alive, now = self._alive()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f'UPDATE cache SET value = value + ? WHERE key = ? '
+                f"AND typeof(value) = 'integer' AND {alive}",
+                (delta, made_key, now),
+            )
+            if cursor.rowcount != 1:
+                raise ValueError("Key '%s' not found" % key)
+            (value,) = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (made_key,)
+            ).fetchone()
+        return value
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = self._keys(keys, version)
+        if not made:
+            return
+        placeholders = ', '.join('?' * len(made))
+        self._connection.execute(
+            f'DELETE FROM cache WHERE key IN ({placeholders})', tuple(made))
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def _cull(self):
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            (count,) = connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()
+            if count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency,),
+                )
+
+    def close(self, **kwargs):
+        # Соединение живёт дольше запроса: его открытие дороже выборки.
+        pass
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options.get('L2', location)
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.l1_skip_prefixes = tuple(options.get('L1_SKIP_PREFIXES', ()))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def _l1_allowed(self, key):
+        return not key.startswith(self.l1_skip_prefixes)
+
+    def _l1_get(self, key, version):
+        made_key = self.make_key(key, version=version)
+        with self._lock:
+            item = self._l1.get(made_key)
+            if item is None:
+                return None
+            expires, payload = item
+            if expires <= time.monotonic():
+                del self._l1[made_key]
+                return None
+            self._l1.move_to_end(made_key)
+        return pickle.loads(payload)
+
+    def _l1_set(self, key, value, version):
+        if not self._l1_allowed(key):
+            return
+        made_key = self.make_key(key, version=version)
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[made_key] = (time.monotonic() + self.l1_timeout, payload)
+            self._l1.move_to_end(made_key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, keys, version):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(self.make_key(key, version=version), None)
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        found = self.get_many([key], version=version).get(key, missing)
+        return default if found is missing else found
+
+    def get_many(self, keys, version=None):
+        found = {}
+        misses = []
+        for key in keys:
+            value = self._l1_get(key, version)
+            if value is None:
+                misses.append(key)
+            else:
+                found[key] = value
+        if misses:
+            fetched = self.l2.get_many(misses, version=version)
+            for key, value in fetched.items():
+                self._l1_set(key, value, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._l1_set(key, value, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            self._l1_set(key, value, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._l1_set(key, value, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete([key], version)
+        return self.l2.incr(key, delta=delta, version=version)
+
+    def has_key(self, key, version=None):
+        if self._l1_get(key, version) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete([key], version)
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        self._l1_delete(keys, version)
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
@@ -0,0 +1,22 @@
+from django.core.checks import Error, Tags, register
+
+from core import precompile
+
+
+@register(Tags.templates, deploy=True)
+def check_templates(app_configs, **kwargs):
+    """Каждый шаблон разбирается, а его extends и include существуют.
+
+    Только для ``check --deploy``: разбор всех шаблонов не нужен при
+    каждом запуске manage.py и runserver.
+    """
+    _, failures = precompile.compile_all()
+    return [
+        Error(
+            f'Шаблон {failure.name}: {failure.error}',
+            hint='Проверить всё разом: manage.py compile_templates.',
+            obj=failure.name,
+            id='core.E001',
+        )
+        for failure in failures
+    ]
@@ -0,0 +1,35 @@
+"""Настройка соединений с базой.
+
+* ``apply_pragmas`` — прагмы ``SQLITE_PRAGMAS`` на каждом новом
+  соединении с SQLite: ``journal_mode`` хранится в файле базы, остальные
+  действуют только в пределах соединения;
+* ``check_connections`` — перед запросом сайта проверяет постоянные
+  соединения (``CONN_MAX_AGE``): оборванное сервером соединение
+  закрывается, и запрос откроет новое, а не упадёт на первом SQL.
+  Django 2.2 сам проверяет соединение, только если в нём уже была
+  ошибка.
+"""
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    if not settings.DATABASE_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,49 @@
+"""Планы выполнения запросов и поиск в них дорогих шагов.
+
+``explain_query_plan`` запускает ``EXPLAIN`` для уже готового SQL (например,
+перехваченного ``CaptureQueriesContext``), ``plan_problems`` находит в
+плане SQLite полный проход по таблице без индекса и сортировку во
+временном B-дереве — то, что на большой таблице превращается в чтение
+всех строк на каждый запрос.
+"""
+import re
+
+from django.db import connections
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(?P<table>\w+)(?P<rest>.*)$')
+TEMP_B_TREE = 'USE TEMP B-TREE'
+
+
+def explain_query_plan(sql, params=None, using='default'):
+    """Возвращает строки плана запроса, по одной на шаг."""
+    connection = connections[using]
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        # id, parent, notused, detail
+        return [row[-1] for row in rows]
+    return [' '.join(map(str, row)) for row in rows]
+
+
+def plan_problems(plan, tables=None):
+    """Шаги плана, которые читают таблицу целиком или сортируют в памяти.
+
+    ``tables`` ограничивает проверку полного прохода перечисленными
+    таблицами: маленькие справочники дешевле прочитать целиком.
+    Проход по индексу (``USING INDEX``) проблемой не считается — так
+    идёт чтение ленты в порядке сортировки до ``LIMIT``.
+    """
+    problems = []
+    for step in plan:
+        step = step.strip()
+        if TEMP_B_TREE in step:
+            problems.append(step)
+            continue
+        match = FULL_SCAN.match(step)
+        if match is None or 'INDEX' in match.group('rest'):
+            continue
+        if tables is None or match.group('table') in tables:
+            problems.append(step)
+    return problems
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import precompile
+
+
+class Command(BaseCommand):
+    help = ('Разбирает все шаблоны и проверяет их extends и include; '
+            'шаг сборки перед выкладкой.')
+
+    def handle(self, *args, **options):
+        count, failures = precompile.compile_all()
+        for failure in failures:
+            self.stderr.write(f'{failure.name}: {failure.error}')
+        if failures:
+            raise CommandError(
+                f'Шаблонов с ошибками: {len(failures)} из {count}')
+        self.stdout.write(self.style.SUCCESS(f'Разобрано шаблонов: {count}'))
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import slow_queries
+
+SQL_WIDTH = 300
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: отпечатки SQL по '
+            'убыванию суммарного времени и страницы, где они выполнялись.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', help='Файл журнала; по умолчанию SLOW_QUERY_LOG.')
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help='Только запросы этого представления («posts:index»); '
+                 'можно указать несколько раз.')
+        parser.add_argument(
+            '--hours', type=float,
+            help='Только записи за последние столько часов.')
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько самых дорогих отпечатков показать.')
+        parser.add_argument(
+            '--plan', action='store_true',
+            help='Показать план самого долгого запроса отпечатка.')
+
+    def handle(self, *args, log=None, views=None, hours=None, limit=20,
+               plan=False, **options):
+        path = log or settings.SLOW_QUERY_LOG
+        since = time.time() - hours * 3600 if hours else None
+        try:
+            found = slow_queries.aggregate(
+                slow_queries.read(path), views=views, since=since)
+        except OSError as error:
+            raise CommandError(error)
+        if not found:
+            self.stdout.write('Медленных запросов нет')
+            return
+        for item in found[:limit]:
+            views_text = ', '.join(
+                f'{view} {ms:.0f} мс' for view, ms in sorted(
+                    item.views.items(), key=lambda pair: -pair[1]))
+            self.stdout.write(
+                f'{item.fingerprint}  всего {item.total_ms:.0f} мс, '
+                f'запросов {item.count}, среднее '
+                f'{item.total_ms / item.count:.1f} мс, '
+                f'максимум {item.max_ms:.1f} мс')
+            self.stdout.write(f'  {views_text}')
+            self.stdout.write(f'  {item.sql[:SQL_WIDTH]}')
+            if plan:
+                for step in item.plan:
+                    self.stdout.write(f'    {step}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Отпечатков: {len(found)}, записей: '
+            f'{sum(item.count for item in found)}'))
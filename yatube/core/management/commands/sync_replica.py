@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import routers
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик: локальная '
+            'замена репликации сервера базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='replicas',
+            help='Реплика из DATABASE_REPLICAS; по умолчанию все.')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять каждые столько секунд, пока не прервут.')
+
+    def handle(self, *args, replicas=None, interval=None, **options):
+        replicas = replicas or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплик нет: задайте DB_REPLICA_NAME')
+        unknown = set(replicas) - set(settings.DATABASE_REPLICAS)
+        if unknown:
+            raise CommandError(f'Нет таких реплик: {", ".join(unknown)}')
+        while True:
+            for replica in replicas:
+                started = time.perf_counter()
+                try:
+                    routers.sync_sqlite(replica)
+                except routers.ReplicaError as error:
+                    raise CommandError(error)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(
+                    f'{replica}: скопирована за {elapsed:.0f} мс')
+            if interval is None:
+                return
+            time.sleep(interval)
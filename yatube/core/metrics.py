@@ -0,0 +1,297 @@
+"""Замеры каждого запроса: заголовок Server-Timing и гистограммы.
+
+``MetricsMiddleware`` стоит первым в ``MIDDLEWARE``. На время запроса
+она вешает на все соединения с базой ``execute_wrapper``, который
+считает запросы и их время, а шаблоны (бэкенд ``DjangoTemplates``
+ниже), кэши лент и миниатюр (``count_cache``) и сборка миниатюр
+(``observe_thumbnail``) докладывают в замеры текущего потока. В ответ
+добавляется ``Server-Timing``, который показывают инструменты
+разработчика браузера, а значения ложатся в гистограммы процесса.
+
+``render`` отдаёт гистограммы в текстовом формате Prometheus (адрес
+``/metrics``). Они живут в памяти процесса: у каждого воркера
+gunicorn свои, и сборщик видит тот воркер, который ответил.
+
+Накладные расходы — несколько ``perf_counter`` и одна короткая
+блокировка на гистограмму за запрос, поэтому замеры можно держать
+включёнными в production.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from core import slow_queries
+
+# Границы корзин в секундах, как у клиентов Prometheus по умолчанию.
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = '<unresolved>'
+
+_local = threading.local()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _label_text(self, values, extra=''):
+        pairs = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.labels, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} {self.kind}'
+        with self._lock:
+            items = sorted(
+                (key, list(value) if isinstance(value, list) else value)
+                for key, value in self._values.items())
+        for key, value in items:
+            yield from self._samples(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self, key, value):
+        yield f'{self.name}_total{self._label_text(key)} {value}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # Храним число значений в каждой корзине, а не накопленное:
+        # наблюдение — это один bisect и три сложения под блокировкой.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (
+                    len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def _samples(self, key, counts):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            total += count
+            labels = self._label_text(key, f'le="{bound}"')
+            yield f'{self.name}_bucket{labels} {total}'
+        labels = self._label_text(key)
+        yield f'{self.name}_sum{labels} {counts[-2]:.6f}'
+        yield f'{self.name}_count{labels} {counts[-1]}'
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds', 'Время ответа представления.',
+    labels=('view', 'method'))
+DB_SECONDS = Histogram(
+    'yatube_db_duration_seconds', 'Время запросов к базе за ответ.',
+    labels=('view',))
+DB_QUERIES = Histogram(
+    'yatube_db_queries', 'Число запросов к базе за ответ.',
+    labels=('view',), buckets=QUERIES)
+TEMPLATE_SECONDS = Histogram(
+    'yatube_template_render_seconds', 'Время отрисовки шаблона.',
+    labels=('template',))
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests', 'Обращения к кэшу по результату.',
+    labels=('cache', 'result'))
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время сборки всех миниатюр одной картинки.')
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+class RequestMetrics:
+    __slots__ = (
+        'queries', 'db', 'templates', 'depth', 'hits', 'misses',
+        'thumbnails', 'view', 'slow_after')
+
+    def __init__(self, slow_after=math.inf):
+        self.queries = 0
+        self.db = self.templates = self.thumbnails = 0.0
+        self.depth = self.hits = self.misses = 0
+        self.view = UNRESOLVED
+        self.slow_after = slow_after
+
+    def server_timing(self, total):
+        entries = [
+            f'app;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} SQL"',
+            f'tpl;dur={self.templates * 1000:.1f}',
+            f'cache;desc="hit {self.hits} miss {self.misses}"',
+        ]
+        if self.thumbnails:
+            entries.append(f'thumb;dur={self.thumbnails * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def current():
+    """Замеры запроса, который обслуживает этот поток, или ``None``."""
+    return getattr(_local, 'request', None)
+
+
+def count_cache(name, hits=0, misses=0):
+    if hits:
+        CACHE_REQUESTS.inc(name, 'hit', amount=hits)
+    if misses:
+        CACHE_REQUESTS.inc(name, 'miss', amount=misses)
+    metrics = current()
+    if metrics is not None:
+        metrics.hits += hits
+        metrics.misses += misses
+
+
+def observe_thumbnail(seconds):
+    THUMBNAIL_SECONDS.observe(seconds)
+    metrics = current()
+    if metrics is not None:
+        metrics.thumbnails += seconds
+
+
+@contextmanager
+def paused():
+    """Запросы внутри блока (например, EXPLAIN) не замеряются."""
+    metrics = current()
+    _local.request = None
+    try:
+        yield
+    finally:
+        _local.request = metrics
+
+
+def _execute(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = current()
+        if metrics is not None:
+            elapsed = time.perf_counter() - started
+            metrics.queries += 1
+            metrics.db += elapsed
+            if elapsed >= metrics.slow_after:
+                with paused():
+                    slow_queries.record(
+                        sql, params, many, elapsed, metrics.view,
+                        using=context['connection'].alias)
+
+
+class Template(django_backend.Template):
+    """Шаблон, который замеряет свою отрисовку.
+
+    Шаблоны виджетов форм и другие вложенные отрисовки идут внутри
+    внешней, поэтому время считается только у самой внешней.
+    """
+
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return super().render(context, request)
+        metrics.depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.depth -= 1
+            if not metrics.depth:
+                elapsed = time.perf_counter() - started
+                metrics.templates += elapsed
+                TEMPLATE_SECONDS.observe(
+                    elapsed, self.origin.template_name or '<string>')
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, чьи шаблоны замеряют отрисовку."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_MS
+        metrics = _local.request = RequestMetrics(
+            math.inf if threshold is None else threshold / 1000)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                response = self.get_response(request)
+        finally:
+            _local.request = None
+        elapsed = time.perf_counter() - started
+        view = metrics.view
+        REQUEST_SECONDS.observe(elapsed, view, request.method)
+        DB_SECONDS.observe(metrics.db, view)
+        DB_QUERIES.observe(metrics.queries, view)
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(elapsed)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current()
+        if metrics is not None:
+            metrics.view = request.resolver_match.view_name
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    return '\n'.join(
+        line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+def allowed(request):
+    addresses = settings.METRICS_ALLOWED_IPS
+    return '*' in addresses or request.META.get('REMOTE_ADDR') in addresses
@@ -0,0 +1,208 @@
+"""Постраничная навигация по ключу сортировки (keyset / cursor).
+
+Вместо ``OFFSET`` следующая страница выбирается условием «строго после
+последнего объекта текущей страницы» по полям сортировки, поэтому
+N-я страница обходится базе так же дёшево, как первая, а ``COUNT(*)``
+выполняется только если нужна полоса с номерами всех страниц.
+"""
+import base64
+import binascii
+import heapq
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по курсору, совместимый с шаблонами Django ``Page``.
+
+    ``ordering`` — поля сортировки в одном направлении; последнее поле
+    должно быть уникальным (обычно ``id``), чтобы порядок был строгим.
+    Ссылки «вперёд/назад» строятся из ``next_cursor`` и
+    ``previous_cursor``. Старые ссылки вида ``?page=N`` продолжают
+    работать через ``OFFSET``.
+
+    Вместо одного queryset можно передать список: каждый источник
+    читается своей выборкой по ключу, а страница собирается слиянием
+    уже отсортированных потоков (объекты с одинаковым ключом
+    считаются одним).
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 with_page_range=False):
+        directions = {field.startswith('-') for field in ordering}
+        if len(directions) != 1:
+            raise ValueError('Все поля ordering должны идти в одну сторону.')
+        self.ordering = tuple(ordering)
+        self.descending = directions.pop()
+        self.keys = tuple(field.lstrip('-') for field in ordering)
+        self.with_page_range = with_page_range
+        self.next_cursor = None
+        self.previous_cursor = None
+        if not isinstance(object_list, (list, tuple)):
+            object_list = [object_list]
+        self.sources = [
+            queryset.order_by(*self.ordering) for queryset in object_list]
+        super().__init__(self.sources[0], per_page)
+
+    @cached_property
+    def count(self):
+        return sum(queryset.count() for queryset in self.sources)
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                direction, number, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                return self.first_page()
+            if direction == BACKWARD:
+                return self._backward_page(number, values)
+            return self._forward_page(number, values)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if number <= 1:
+            return self.first_page()
+        return self._offset_page(number)
+
+    def first_page(self):
+        rows = self._fetch(self.sources, self.per_page + 1)
+        return self._make_page(rows, 1)
+
+    def _offset_page(self, number):
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page + 1
+        if len(self.sources) == 1:
+            rows = list(self.sources[0][bottom:top])
+        else:
+            rows = self._fetch(self.sources, top)[bottom:]
+        if not rows:
+            return self.first_page()
+        return self._make_page(rows, number)
+
+    def _forward_page(self, number, values):
+        condition = self._after(values)
+        sources = [queryset.filter(condition) for queryset in self.sources]
+        rows = self._fetch(sources, self.per_page + 1)
+        if not rows:
+            return self.first_page()
+        return self._make_page(rows, number)
+
+    def _backward_page(self, number, values):
+        reverse = tuple(
+            field.lstrip('-') if self.descending else f'-{field}'
+            for field in self.ordering
+        )
+        condition = self._after(values, reverse=True)
+        sources = [
+            queryset.filter(condition).order_by(*reverse)
+            for queryset in self.sources
+        ]
+        rows = self._fetch(sources, self.per_page + 1, reverse=True)
+        if len(rows) <= self.per_page:
+            return self.first_page()
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._make_page(rows, max(number, 2), has_next=True)
+
+    def _fetch(self, sources, limit, reverse=False):
+        """Первые limit объектов из уже отсортированных источников."""
+        if len(sources) == 1:
+            return list(sources[0][:limit])
+        key = attrgetter(*self.keys)
+        merged = heapq.merge(
+            *(queryset[:limit] for queryset in sources),
+            key=key, reverse=self.descending != reverse,
+        )
+        rows = []
+        for obj in merged:
+            if rows and key(rows[-1]) == key(obj):
+                continue
+            rows.append(obj)
+            if len(rows) == limit:
+                break
+        return rows
+
+    def _make_page(self, rows, number, has_next=None):
+        if has_next is None:
+            has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not self.with_page_range:
+            # Общее число страниц неизвестно и не нужно: Page сравнивает
+            # номер с num_pages только чтобы узнать, есть ли следующая.
+            self.num_pages = number + 1 if has_next else number
+        self.next_cursor = None
+        self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(
+                FORWARD, number + 1, rows[-1])
+        if rows and number > 1:
+            self.previous_cursor = self.encode_cursor(
+                BACKWARD, number - 1, rows[0])
+        return self._get_page(rows, number, self)
+
+    def _after(self, values, reverse=False):
+        """Условие «строго после values» для составного ключа.
+
+        Для ключа (a, b) по убыванию это ``a <= x AND (a < x OR b < y)``:
+        первое сравнение даёт индексу диапазон, второе отсекает границу.
+        """
+        descending = self.descending != reverse
+        strict = 'lt' if descending else 'gt'
+        loose = 'lte' if descending else 'gte'
+        condition = None
+        for key, value in reversed(tuple(zip(self.keys, values))):
+            if condition is None:
+                condition = Q(**{f'{key}__{strict}': value})
+                continue
+            condition = Q(**{f'{key}__{loose}': value}) & (
+                Q(**{f'{key}__{strict}': value}) | condition)
+        return condition
+
+    def encode_cursor(self, direction, number, obj):
+        values = [getattr(obj, key) for key in self.keys]
+        parts = [direction, str(number)] + [
+            value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in values
+        ]
+        raw = '|'.join(parts).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(cursor + padding).decode()
+            direction, number, *values = raw.split('|')
+            number = int(number)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor(cursor)
+        if direction not in (FORWARD, BACKWARD) or number < 1:
+            raise InvalidCursor(cursor)
+        if len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        try:
+            values = [
+                self._key_field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+        return direction, number, values
+
+    def _key_field(self, key):
+        """Поле ключа: поле модели или аннотация (например, оценка)."""
+        annotations = self.object_list.query.annotations
+        if key in annotations:
+            return annotations[key].output_field
+        return self.object_list.model._meta.get_field(key)
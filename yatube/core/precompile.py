@@ -0,0 +1,121 @@
+"""Предварительный разбор и проверка всех шаблонов.
+
+Без ``DEBUG`` шаблоны загружает ``cached.Loader``: шаблон читается с
+диска и разбирается один раз, дальше берётся из памяти процесса. Чтобы
+эту цену не платил первый запрос после выкладки, воркер при запуске
+(``yatube/wsgi.py``, настройка ``TEMPLATE_WARMUP``) разбирает все
+шаблоны заранее — ``warm_up()``.
+
+Тот же обход проверяет шаблоны: ошибки разбора, неизвестные теги и
+фильтры, а также ``{% extends %}`` и ``{% include %}`` с именем
+несуществующего шаблона. Проверку запускают команда
+``compile_templates`` (шаг сборки, код возврата не ноль при ошибках) и
+``manage.py check --deploy``.
+"""
+import logging
+import os
+from collections import namedtuple
+
+from django.conf import settings
+from django.template import (
+    TemplateDoesNotExist, TemplateSyntaxError, engines)
+from django.template.backends.django import DjangoTemplates
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+logger = logging.getLogger('yatube.templates')
+
+Failure = namedtuple('Failure', 'name error')
+
+
+def _loaders(engine):
+    for loader in engine.template_loaders:
+        # cached.Loader хранит настоящие загрузчики в ``loaders``.
+        yield from getattr(loader, 'loaders', [loader])
+
+
+def template_names(engine):
+    """Имена всех шаблонов, которые видят загрузчики ``engine``."""
+    seen = set()
+    for loader in _loaders(engine):
+        for directory in loader.get_dirs():
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = sorted(
+                    name for name in dirs if not name.startswith('.'))
+                for filename in sorted(files):
+                    if filename.startswith('.'):
+                        continue
+                    name = os.path.relpath(
+                        os.path.join(root, filename), directory)
+                    name = name.replace(os.sep, '/')
+                    if name not in seen:
+                        seen.add(name)
+                        yield name
+
+
+def _constant(expression):
+    """Имя шаблона, если оно задано строкой прямо в теге."""
+    if expression.filters or not isinstance(expression.var, str):
+        return None
+    return expression.var
+
+
+def _references(template):
+    for node in template.nodelist.get_nodes_by_type(
+            (ExtendsNode, IncludeNode)):
+        if isinstance(node, ExtendsNode):
+            name = _constant(node.parent_name)
+        else:
+            name = _constant(node.template)
+        if name is not None:
+            yield name
+
+
+def compile_engine(engine, names=None):
+    """Разбирает шаблоны ``engine``; отдаёт (число шаблонов, ошибки).
+
+    Через ``cached.Loader`` разобранные шаблоны остаются в его кэше.
+    """
+    failures = []
+    count = 0
+    for name in template_names(engine) if names is None else names:
+        count += 1
+        try:
+            template = engine.get_template(name)
+        except (TemplateSyntaxError, TemplateDoesNotExist,
+                UnicodeDecodeError) as error:
+            failures.append(Failure(name, str(error)))
+            continue
+        for reference in _references(template):
+            try:
+                engine.find_template(reference)
+            except TemplateDoesNotExist:
+                failures.append(
+                    Failure(name, f'нет шаблона «{reference}»'))
+    return count, failures
+
+
+def compile_all():
+    """Разбирает шаблоны всех бэкендов на языке шаблонов Django."""
+    count = 0
+    failures = []
+    for backend in engines.all():
+        if isinstance(backend, DjangoTemplates):
+            compiled, failed = compile_engine(backend.engine)
+            count += compiled
+            failures += failed
+    return count, failures
+
+
+def warm_up():
+    """Заполняет кэш шаблонов воркера при запуске (``TEMPLATE_WARMUP``).
+
+    Ошибки не мешают запуску: они уходят в журнал, а страница со
+    сломанным шаблоном упадёт так же, как упала бы без разогрева.
+    """
+    if not settings.TEMPLATE_WARMUP:
+        return
+    count, failures = compile_all()
+    for failure in failures:
+        logger.error('Шаблон %s: %s', failure.name, failure.error)
+    logger.info('Разобрано шаблонов: %d, с ошибками: %d',
+                count, len(failures))
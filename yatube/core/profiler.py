@@ -0,0 +1,231 @@
+"""Выборочный профилировщик для работающих воркеров.
+
+Поток ``Sampler`` раз в ``PROFILER_INTERVAL`` секунд снимает стеки
+потоков через ``sys._current_frames()`` и считает одинаковые стеки.
+Профилируемый код не трассируется, поэтому замедление не зависит от
+числа вызовов: платит только поток выборки, и только пока идёт замер.
+Результат — стеки в свёрнутом формате (``корень;…;лист число``),
+который открывают speedscope, ``flamegraph.pl`` и inferno.
+
+Два способа замера, оба только для сотрудников (``is_staff``) и только
+при ``PROFILER_ENABLED``; иначе профилировщика нет вовсе:
+
+* ``?__profile=1`` к любому адресу — вместо страницы отдаётся профиль
+  этого запроса (``ProfilerMiddleware``); ``?__profile=N`` выполняет
+  GET-запрос N раз подряд, чтобы быстрая страница набрала выборок;
+* ``/__profile/?seconds=N`` — профиль всех потоков воркера за N секунд
+  (представление ``core.views.profile_worker``). Замер идёт в фоновом
+  потоке, а запрос сразу получает 202 со ссылкой на результат
+  (``?result=…``): иначе синхронный воркер спал бы в этом запросе и
+  выборке было бы нечего снимать. Результат лежит в кэше
+  ``PROFILER_RESULT_TIMEOUT`` секунд, поэтому его отдаст любой воркер.
+
+В процессе одновременно идёт не больше одного замера.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; charset=utf-8'
+QUERY_PARAMETER = '__profile'
+RESULT_PREFIX = 'profiler:'
+
+_busy = threading.Lock()
+_labels = {}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _roots():
+    """Каталоги, относительно которых печатаются пути файлов."""
+    installed = sysconfig.get_paths()
+    paths = {installed[name] for name in ('purelib', 'platlib', 'stdlib')}
+    paths.add(settings.BASE_DIR)
+    return sorted(
+        (os.path.join(path, '') for path in paths if path),
+        key=len, reverse=True)
+
+
+def label(code, roots):
+    """Имя кадра: «путь/к/модулю.py:функция»; кэшируется по коду."""
+    name = _labels.get(code)
+    if name is None:
+        filename = code.co_filename
+        for root in roots:
+            if filename.startswith(root):
+                filename = filename[len(root):]
+                break
+        # «;» и пробел разделяют кадры и число в свёрнутом формате.
+        name = f'{filename}:{code.co_name}'.replace(';', ',').replace(
+            ' ', '_')
+        _labels[code] = name
+    return name
+
+
+class Sampler(threading.Thread):
+    """Поток, который снимает стеки ``thread_ids`` (или всех потоков,
+    кроме ``exclude``)."""
+
+    def __init__(self, thread_ids=None, exclude=(), interval=None):
+        super().__init__(name='profiler', daemon=True)
+        self.thread_ids = thread_ids
+        self.exclude = {*exclude}
+        self.interval = interval or settings.PROFILER_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._roots = _roots()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            self.exclude.add(threading.get_ident())
+            for thread_id, frame in frames.items():
+                if thread_id in self.exclude or (
+                        self.thread_ids is not None
+                        and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(label(frame.f_code, self._roots))
+                    frame = frame.f_back
+                if self.thread_ids is None:
+                    if thread_id not in names:
+                        names = {
+                            thread.ident: thread.name
+                            for thread in threading.enumerate()}
+                    stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n'
+            for stack, count in self.stacks.most_common())
+
+
+def sample(function, thread_ids=None, exclude=(), interval=None):
+    """Выполняет ``function`` под профилировщиком; отдаёт (результат,
+    ``Sampler``). Если уже идёт другой замер — ``ProfilerBusy``."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy
+    try:
+        sampler = Sampler(thread_ids, exclude, interval)
+        sampler.start()
+        try:
+            result = function()
+        finally:
+            sampler.stop()
+        return result, sampler
+    finally:
+        _busy.release()
+
+
+def start_profile(seconds, interval=None):
+    """Запускает в фоне профиль всех потоков процесса за ``seconds``;
+    отдаёт ключ результата для ``result()``. Если уже идёт другой
+    замер — ``ProfilerBusy``."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy
+    key = f'{os.getpid()}-{uuid.uuid4().hex}'
+    timeout = seconds + settings.PROFILER_RESULT_TIMEOUT
+
+    def run():
+        try:
+            sampler = Sampler(
+                exclude={threading.get_ident()}, interval=interval)
+            sampler.start()
+            try:
+                time.sleep(seconds)
+            finally:
+                sampler.stop()
+            cache.set(RESULT_PREFIX + key, {
+                'stacks': sampler.collapsed(), 'samples': sampler.samples,
+            }, timeout)
+        finally:
+            _busy.release()
+
+    cache.set(RESULT_PREFIX + key, {'stacks': None}, timeout)
+    try:
+        threading.Thread(
+            target=run, name='profiler-timer', daemon=True).start()
+    except BaseException:
+        _busy.release()
+        raise
+    return key
+
+
+def result(key):
+    """Результат замера ``start_profile``: словарь со свёрнутыми стеками
+    (``stacks`` — ``None``, пока замер идёт) или ``None``, если ключа
+    нет или результат устарел."""
+    return cache.get(RESULT_PREFIX + key)
+
+
+def response(stacks, samples, name):
+    """Свёрнутые стеки как файл для скачивания."""
+    result = HttpResponse(stacks, content_type=CONTENT_TYPE)
+    result['Content-Disposition'] = (
+        f'attachment; filename="{name}.collapsed"')
+    result['X-Profile-Samples'] = str(samples)
+    return result
+
+
+def allowed(request):
+    user = getattr(request, 'user', None)
+    return bool(
+        settings.PROFILER_ENABLED and user is not None and user.is_staff)
+
+
+class ProfilerMiddleware:
+    """Профиль запроса вместо ответа по ``?__profile=1``.
+
+    Стоит после ``AuthenticationMiddleware``: нужен ``request.user``.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if QUERY_PARAMETER not in request.GET or not allowed(request):
+            return self.get_response(request)
+        try:
+            _, sampler = sample(
+                lambda: [
+                    self.get_response(request)
+                    for _ in range(self.repeat(request))],
+                thread_ids={threading.get_ident()})
+        except ProfilerBusy:
+            return HttpResponse('Уже идёт другой замер', status=409)
+        match = request.resolver_match
+        view = match.view_name.replace(':', '-') if match else 'request'
+        return response(
+            sampler.collapsed(), sampler.samples, f'profile-{view}')
+
+    def repeat(self, request):
+        # Повторять можно только запросы, которые ничего не меняют.
+        if request.method not in ('GET', 'HEAD'):
+            return 1
+        try:
+            count = int(request.GET[QUERY_PARAMETER])
+        except ValueError:
+            return 1
+        return min(max(count, 1), settings.PROFILER_MAX_REPEAT)
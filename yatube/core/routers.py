@@ -0,0 +1,135 @@
+"""Чтение с реплики, запись в основную базу.
+
+``PrimaryReplicaRouter`` отправляет чтение на реплику
+(``DATABASE_REPLICAS``) только внутри запроса сайта, который отметил
+``ReplicaMiddleware``: GET-запросы лент и страниц. Команды, фоновые
+потоки миниатюр и миграции всегда работают с основной базой.
+
+Автор видит свои записи сразу (read-your-writes):
+
+* после первой записи в запросе его чтения тоже идут в основную базу;
+* ответ на запрос, который писал в базу (``post_create``,
+  ``post_edit``, ``add_comment``, подписка, вход), ставит cookie
+  ``STICKY_COOKIE`` на ``REPLICA_STICKY_SECONDS`` секунд: страница после
+  редиректа и следующие запросы этого браузера читают основную базу,
+  пока реплика не догонит.
+
+Страница ленты, которой нет в кэше, читается с основной базы
+(``primary``): она ляжет в кэш под текущим поколением, и отстающая
+реплика сохранила бы там старые данные до следующей записи. С реплики
+читают страницы, которые не кэшируются.
+
+Локально реплика — второй файл SQLite, копия основного; его обновляет
+команда ``sync_replica`` (``sync_sqlite`` через backup API SQLite).
+"""
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'read_primary'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Сессии только что вошедшего пользователя нужны сразу, иначе отставание
+# реплики разлогинивает его.
+PRIMARY_APPS = {'sessions'}
+# Страниц за шаг копирования: между шагами основная база доступна
+# для записи.
+BACKUP_PAGES = 1024
+
+_state = threading.local()
+
+
+class ReplicaError(Exception):
+    pass
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        # Связанный объект из другой базы (шарда) чтение туда не тянет.
+        if instance is not None and instance._state.db in (
+                DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS):
+            return instance._state.db
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Дальше в этом запросе читается то, что только что записано.
+        _state.replica = None
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приезжает на реплику вместе с данными.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+@contextmanager
+def primary():
+    """Чтения внутри блока идут в основную базу."""
+    replica = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        # После записи запрос и дальше читает основную базу.
+        if not getattr(_state, 'wrote', False):
+            _state.replica = replica
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтения на время запроса и ставит cookie
+    ``STICKY_COOKIE`` после записи."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reading = (
+            request.method in READ_METHODS
+            and STICKY_COOKIE not in request.COOKIES)
+        _state.replica = (
+            random.choice(settings.DATABASE_REPLICAS) if reading else None)
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.replica = None
+            _state.wrote = False
+        if wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+
+def sync_sqlite(replica, primary=DEFAULT_DB_ALIAS):
+    """Копирует основную базу SQLite в файл реплики ``replica``."""
+    source = connections[primary]
+    target = connections[replica]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ReplicaError(
+            'Копировать можно только SQLite; реплику другой базы '
+            'ведёт репликация её сервера')
+    source.ensure_connection()
+    destination = sqlite3.connect(target.settings_dict['NAME'])
+    try:
+        source.connection.backup(destination, pages=BACKUP_PAGES)
+    finally:
+        destination.close()
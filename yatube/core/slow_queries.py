@@ -0,0 +1,186 @@
+"""Журнал медленных запросов к базе с планом выполнения.
+
+Запросы замеряет ``execute_wrapper`` из ``core.metrics``; всё, что
+дольше ``SLOW_QUERY_MS``, попадает сюда вместе с именем представления,
+отпечатком SQL, образцом параметров и планом ``EXPLAIN``
+(``core.explain``). Записи — строки JSON в логгере ``yatube.slow_queries``,
+который в настройках пишет в ротируемый файл ``SLOW_QUERY_LOG``.
+
+Параметры запросов к сессиям и таблицам ``auth_*`` (ключи сессий,
+хеши паролей; таблица — основная в запросе, не присоединённая) в
+журнал не попадают: вместо значения пишутся только его
+тип и длина, а плана у таких запросов нет.
+
+Отпечаток — SQL без значений: строки и числа заменены на ``?``, списки
+``IN (…)`` свёрнуты, пробелы схлопнуты. Одинаковые запросы с разными
+аргументами получают один отпечаток, и команда ``slow_queries``
+складывает их время, чтобы было видно, какой запрос какой страницы
+обходится дороже всего.
+"""
+import glob
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import time
+from collections import namedtuple
+
+from django.db import DatabaseError, transaction
+
+from core.explain import explain_query_plan
+
+logger = logging.getLogger('yatube.slow_queries')
+
+MAX_PARAMS = 10
+MAX_PARAM_LENGTH = 100
+EXPLAINABLE = ('SELECT', 'WITH')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+_SPACE = re.compile(r'\s+')
+_TARGET = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
+# Таблицы, значения параметров которых нельзя хранить в журнале.
+_SENSITIVE = re.compile(r'django_session$|auth_')
+
+Fingerprint = namedtuple(
+    'Fingerprint', 'fingerprint sql count total_ms max_ms views plan')
+
+
+def normalize(sql):
+    """SQL без значений аргументов — одинаков у запросов одной формы."""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def sensitive(sql):
+    """Запрос читает или пишет сессии либо таблицы ``auth_*``.
+
+    Смотрим на основную таблицу (первую вне скобок после FROM, INTO
+    или UPDATE):
+    ленты присоединяют ``auth_user`` ради автора, но их параметры —
+    id и даты, которые нужны в журнале.
+    """
+    for match in _TARGET.finditer(sql):
+        before = sql[:match.start()]
+        # Подзапросы в списке столбцов стоят в скобках — пропускаем.
+        if before.count('(') == before.count(')'):
+            return bool(_SENSITIVE.match(match.group(1)))
+    return False
+
+
+def _redacted(value):
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__}, {len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def sample(params, sql=''):
+    """Первые параметры запроса, каждый обрезан, для записи в журнал.
+
+    Для запросов к сессиям и ``auth_*`` — только типы и длины.
+    """
+    if not params:
+        return []
+    if isinstance(params, dict):
+        params = list(params.values())
+    params = params[:MAX_PARAMS]
+    if sensitive(sql):
+        return [_redacted(value) for value in params]
+    return [repr(value)[:MAX_PARAM_LENGTH] for value in params]
+
+
+def explain(sql, params, using):
+    """План запроса; ошибка EXPLAIN не мешает записи в журнал.
+
+    Запросы к сессиям и ``auth_*`` не объясняются: план PostgreSQL
+    показывает значения параметров.
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    if sensitive(sql):
+        return []
+    try:
+        # Точка сохранения: в PostgreSQL ошибка внутри транзакции
+        # иначе сломала бы транзакцию самого представления.
+        with transaction.atomic(using=using):
+            return explain_query_plan(sql, params, using=using)
+    except DatabaseError as error:
+        return [f'EXPLAIN не удался: {error}']
+
+
+def record(sql, params, many, elapsed, view, using='default'):
+    """Пишет медленный запрос в журнал."""
+    logger.info(json.dumps({
+        'time': time.time(),
+        'view': view,
+        'ms': round(elapsed * 1000, 2),
+        'fingerprint': fingerprint(sql),
+        'sql': normalize(sql),
+        'params': [] if many else sample(params, sql),
+        'plan': [] if many else explain(sql, params, using),
+    }, ensure_ascii=False))
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Ротируемый журнал, который сам создаёт свой каталог."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def read(path):
+    """Записи журнала и его ротированных копий, от старых к новым."""
+    backups = [
+        name for name in glob.glob(f'{glob.escape(path)}.*')
+        if name.rsplit('.', 1)[1].isdigit()
+    ]
+    # Чем больше номер копии, тем она старше.
+    paths = sorted(
+        backups, key=lambda name: int(name.rsplit('.', 1)[1]),
+        reverse=True)
+    if os.path.exists(path):
+        paths.append(path)
+    for name in paths:
+        with open(name, encoding='utf-8') as stream:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def aggregate(entries, views=None, since=None):
+    """Отпечатки по убыванию суммарного времени."""
+    found = {}
+    for entry in entries:
+        if views and entry['view'] not in views:
+            continue
+        if since is not None and entry['time'] < since:
+            continue
+        item = found.get(entry['fingerprint'])
+        if item is None:
+            item = found[entry['fingerprint']] = {
+                'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'views': {}, 'plan': entry['plan']}
+        item['count'] += 1
+        item['total_ms'] += entry['ms']
+        if entry['ms'] >= item['max_ms']:
+            item['max_ms'] = entry['ms']
+            item['plan'] = entry['plan'] or item['plan']
+        item['views'][entry['view']] = item['views'].get(
+            entry['view'], 0) + entry['ms']
+    return sorted(
+        (Fingerprint(key, **item) for key, item in found.items()),
+        key=lambda item: item.total_ms, reverse=True)
@@ -0,0 +1,148 @@
+"""Стеммер русского языка по алгоритму Snowball.
+
+Перенос ``russian.sbl`` из проекта Snowball (Мартин Портер): окончание
+отрезается только внутри области RV (после первой гласной), а
+словообразовательные суффиксы ``-ост``/``-ость`` — внутри R2. Как и в
+Snowball, из подходящих окончаний группы выбирается самое длинное; если
+его условие не выполнено, короче окончание уже не ищется.
+
+Слово должно быть в нижнем регистре, «ё» заменяется на «е» здесь же.
+Слова не из кириллицы (латиница, числа) возвращаются без изменений.
+"""
+from functools import lru_cache
+
+VOWELS = frozenset('аеиоуыэюя')
+
+
+class Endings(frozenset):
+    """Окончания группы; ``conditional`` — требующие «а»/«я» перед собой."""
+
+    def __new__(cls, plain, conditional=()):
+        endings = super().__new__(cls, (*plain, *conditional))
+        endings.conditional = frozenset(conditional)
+        endings.longest = max(map(len, endings))
+        return endings
+
+
+PERFECTIVE_GERUND = Endings(
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+    conditional=('в', 'вши', 'вшись'),
+)
+ADJECTIVE = Endings((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = Endings(
+    ('ивш', 'ывш', 'ующ'), conditional=('ем', 'нн', 'вш', 'ющ', 'щ'))
+REFLEXIVE = Endings(('ся', 'сь'))
+VERB = Endings(
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+    conditional=('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло',
+                 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+)
+NOUN = Endings((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+DERIVATIONAL = Endings(('ост', 'ость'))
+SUPERLATIVE = ('ейше', 'ейш')
+TIDY_UP = Endings((*SUPERLATIVE, 'н', 'ь'))
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    length = len(word)
+    rv = r2 = length
+    position = 0
+    marks = []
+    for expect_vowel in (True, False, True, False):
+        while position < length and (word[position] in VOWELS) != (
+                expect_vowel):
+            position += 1
+        if position == length:
+            break
+        position += 1
+        marks.append(position)
+    if marks:
+        rv = marks[0]
+    if len(marks) == 4:
+        r2 = marks[3]
+    return rv, r2
+
+
+def _longest(word, limit, endings):
+    """Самое длинное окончание из ``endings``, целиком лежащее после limit.
+
+    Окончания сравниваются срезами от длинных к коротким: это проверки
+    по множеству, а не перебор всего списка.
+    """
+    for size in range(min(endings.longest, len(word) - limit), 0, -1):
+        ending = word[-size:]
+        if ending in endings:
+            return ending
+    return None
+
+
+def _remove(word, rv, group):
+    """Отрезает окончание из группы; возвращает (слово, удалось ли)."""
+    ending = _longest(word, rv, group)
+    if ending is None:
+        return word, False
+    stem = word[:-len(ending)]
+    if ending not in group.conditional:
+        return stem, True
+    if len(stem) > rv and stem[-1] in 'ая':
+        return stem, True
+    return word, False
+
+
+def _step1(word, rv):
+    word, removed = _remove(word, rv, PERFECTIVE_GERUND)
+    if removed:
+        return word
+    word, _ = _remove(word, rv, REFLEXIVE)
+    word, removed = _remove(word, rv, ADJECTIVE)
+    if removed:
+        word, _ = _remove(word, rv, PARTICIPLE)
+        return word
+    word, removed = _remove(word, rv, VERB)
+    if removed:
+        return word
+    word, _ = _remove(word, rv, NOUN)
+    return word
+
+
+def _tidy_up(word, rv):
+    ending = _longest(word, rv, TIDY_UP)
+    if ending is None:
+        return word
+    if ending in SUPERLATIVE:
+        word = word[:-len(ending)]
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if ending == 'ь':
+        return word[:-1]
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова; частые слова берутся из кэша."""
+    word = word.replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+    word = _step1(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    ending = _longest(word, max(rv, r2), DERIVATIONAL)
+    if ending is not None:
+        word = word[:-len(ending)]
+    return _tidy_up(word, rv)
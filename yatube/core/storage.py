@@ -0,0 +1,64 @@
+"""Хранилище файлов, адресуемое содержимым.
+
+Файл сохраняется под именем из SHA-256 его байтов
+(``posts/ab/ab12….gif``), поэтому одинаковые загрузки занимают одно
+место на диске, а миниатюры sorl-thumbnail, ключ которых строится из
+имени исходника, у них общие. Хэш считается, пока загрузка по частям
+пишется во временный файл рядом с целевым; затем файл атомарно
+переименовывается или, если такой уже есть, просто удаляется.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    hash_name = 'sha256'
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определит содержимое в _save, суффиксы не нужны.
+        return name
+
+    def digest_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, digest[:2], f'{digest}{extension}').replace(os.sep, '/')
+
+    def _save(self, name, content):
+        directory = self.path(os.path.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.new(self.hash_name)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = self.digest_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Такой файл уже есть: освежаем время изменения, чтобы
+                # параллельное освобождение не удалило его из-под нас.
+                os.utime(full_path)
+                os.remove(temporary)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary, self.file_permissions_mode)
+                os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+
+content_storage = ContentAddressedStorage()
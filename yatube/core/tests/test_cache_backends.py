@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import get_context
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import SQLiteCache
+
+TEMP_DIR = tempfile.mkdtemp()
+CACHE_FILE = os.path.join(TEMP_DIR, 'cache.sqlite3')
+
+
+def increment(location, times):
+    worker_cache = SQLiteCache(location, {})
+    for _ in range(times):
+        worker_cache.incr('counter')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_TIMEOUT': 60,
+            'L1_SKIP_PREFIXES': ['feed:v:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_FILE,
+    },
+})
+class SharedCacheTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_sqlite_cache_roundtrip(self):
+        """Общий кэш хранит, продлевает и удаляет значения."""
+        cache = caches['shared']
+        cache.set('page', {'html': 'страница'})
+        cache.set_many({'a': 1, 'b': [2]}, timeout=None)
+        self.assertEqual(cache.get('page'), {'html': 'страница'})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2]})
+        self.assertFalse(cache.add('a', 10))
+        self.assertTrue(cache.add('c', 3))
+        cache.delete_many(['a', 'c'])
+        self.assertIsNone(cache.get('a'))
+        cache.set('gone', 1, timeout=0)
+        self.assertIsNone(cache.get('gone'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_counter_shared_between_processes(self):
+        """incr атомарен для нескольких процессов с одним файлом."""
+        caches['shared'].set('counter', 0, timeout=None)
+        context = get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(CACHE_FILE, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(caches['shared'].get('counter'), 200)
+
+    def test_tiered_cache_serves_hot_keys_from_l1(self):
+        """Горячий ключ читается из памяти процесса, а не из L2."""
+        cache = caches['default']
+        cache.set('hot', 'значение')
+        caches['shared'].set('hot', 'изменено другим воркером')
+        self.assertEqual(cache.get('hot'), 'значение')
+        cache.delete('hot')
+        self.assertIsNone(cache.get('hot'))
+
+    def test_tiered_cache_skips_l1_for_versions(self):
+        """Счётчики поколений всегда читаются из общего кэша."""
+        cache = caches['default']
+        cache.set('feed:v:global', 1)
+        caches['shared'].incr('feed:v:global')
+        self.assertEqual(cache.get('feed:v:global'), 2)
+        self.assertEqual(cache.incr('feed:v:global'), 3)
@@ -0,0 +1,80 @@
+import importlib
+import os
+import sys
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from core import db
+from yatube.settings import base
+
+
+class ConnectionTests(TestCase):
+    def connect(self):
+        connection = connections['default'].copy()
+        self.addCleanup(connection.close)
+        connection.ensure_connection()
+        return connection
+
+    def pragma(self, connection, name):
+        return connection.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234})
+    def test_pragmas_on_new_connection(self):
+        """Прагмы SQLITE_PRAGMAS действуют на каждом новом соединении."""
+        self.assertEqual(self.pragma(self.connect(), 'cache_size'), -1234)
+
+    def test_no_pragmas_by_default(self):
+        self.assertNotEqual(self.pragma(self.connect(), 'cache_size'), -1234)
+
+    @override_settings(DATABASE_HEALTH_CHECKS=True)
+    def test_broken_connection_is_closed(self):
+        """Оборванное постоянное соединение закрывается до запроса."""
+        connection = self.connect()
+        connection.close = mock.Mock()
+        with mock.patch.object(connections, 'all', return_value=[connection]):
+            db.check_connections()
+            connection.close.assert_not_called()
+            connection.is_usable = mock.Mock(return_value=False)
+            db.check_connections()
+        connection.close.assert_called_once_with()
+
+
+class ProdProfileTests(TestCase):
+    def load(self, **environ):
+        # Профиль читает окружение при импорте, поэтому модули
+        # перезагружаются; после теста base снова видит настоящее.
+        self.addCleanup(importlib.reload, base)
+        with mock.patch.dict(os.environ, environ):
+            importlib.reload(base)
+            sys.modules.pop('yatube.settings.prod', None)
+            return importlib.import_module('yatube.settings.prod')
+
+    def test_requires_secret_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(DJANGO_SECRET_KEY='')
+
+    def test_prod_profile(self):
+        """Постоянные соединения, WAL и кэш шаблонов только в prod."""
+        prod = self.load(DJANGO_SECRET_KEY='secret', DB_CONN_MAX_AGE='60')
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(prod.DATABASES['default']['CONN_MAX_AGE'], 60)
+        self.assertEqual(prod.SQLITE_PRAGMAS['journal_mode'], 'WAL')
+        loader, _ = prod.TEMPLATES[0]['OPTIONS']['loaders'][0]
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+        self.assertTrue(prod.TEMPLATE_WARMUP)
+        self.assertEqual(
+            base.TEMPLATES[0]['OPTIONS']['loaders'], base.TEMPLATE_LOADERS)
+
+    def test_prod_cache_is_shared(self):
+        """prod по умолчанию берёт общий кэш SQLite и не берёт locmem."""
+        with mock.patch.dict(os.environ):
+            os.environ.pop('CACHE_BACKEND', None)
+            prod = self.load(DJANGO_SECRET_KEY='secret')
+        self.assertEqual(
+            prod.CACHES['default']['BACKEND'],
+            'core.cache_backends.SQLiteCache')
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(DJANGO_SECRET_KEY='secret', CACHE_BACKEND='locmem')
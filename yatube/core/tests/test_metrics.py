@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+class HistogramTests(TestCase):
+    def test_buckets_are_cumulative(self):
+        """Корзины в выводе накопленные, как требует Prometheus."""
+        histogram = metrics.Histogram(
+            'test_seconds', 'Тест.', labels=('view',), buckets=(1, 2))
+        metrics.REGISTRY.remove(histogram)
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value, 'index')
+        lines = list(histogram.render())
+        self.assertIn('test_seconds_bucket{view="index",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="index",le="2"} 3', lines)
+        self.assertIn('test_seconds_bucket{view="index",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_sum{view="index"} 6.000000', lines)
+        self.assertIn('test_seconds_count{view="index"} 4', lines)
+
+
+class MiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def timing(self, response):
+        return dict(
+            entry.split(';', 1)
+            for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        """Ответ сообщает время базы, шаблонов и обращения к кэшу."""
+        timing = self.timing(self.client.get(reverse('posts:index')))
+        self.assertEqual(set(timing), {'app', 'db', 'tpl', 'cache'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="\d+ SQL"$')
+        # Промах страницы ленты и промах карточки её поста.
+        self.assertEqual(timing['cache'], 'desc="hit 0 miss 2"')
+        timing = self.timing(self.client.get(reverse('posts:index')))
+        self.assertEqual(timing['cache'], 'desc="hit 1 miss 0"')
+
+    def test_queries_are_counted(self):
+        """Число запросов в заголовке совпадает с выполненными."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertIn('desc="2 SQL"', response['Server-Timing'])
+
+    def test_nested_templates_are_timed_once(self):
+        """Шаблоны виджетов не замеряются отдельно от страницы."""
+        self.client.force_login(self.user)
+        before = list(metrics.TEMPLATE_SECONDS.render())
+        self.client.get(reverse('posts:post_create'))
+        added = set(metrics.TEMPLATE_SECONDS.render()) - set(before)
+        self.assertTrue(any(
+            'posts/create_post.html' in line for line in added))
+        self.assertFalse(any('django/forms' in line for line in added))
+
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт гистограммы в формате Prometheus."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count'
+            '{view="posts:index",method="GET"}', text)
+        self.assertIn(
+            'yatube_cache_requests_total{cache="feed",result="miss"}', text)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_endpoint_is_restricted(self):
+        """Чужим адресам /metrics не показывается."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
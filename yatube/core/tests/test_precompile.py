@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.checks.registry import registry
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.template import engines
+from django.test import TestCase, override_settings
+
+from core import checks, precompile
+
+TEMP_TEMPLATES = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CACHED_LOADERS = [(
+    'django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ],
+)]
+
+
+def templates(directory, loaders=None):
+    options = {'loaders': loaders} if loaders else {}
+    return [{
+        'BACKEND': 'core.metrics.DjangoTemplates',
+        'DIRS': [directory],
+        'APP_DIRS': not loaders,
+        'OPTIONS': options,
+    }]
+
+
+class PrecompileTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_TEMPLATES, ignore_errors=True)
+
+    def write(self, name, source):
+        directory = tempfile.mkdtemp(dir=TEMP_TEMPLATES)
+        with open(f'{directory}/{name}', 'w', encoding='utf-8') as file:
+            file.write(source)
+        return directory
+
+    def test_project_templates_compile(self):
+        """Все шаблоны проекта разбираются без ошибок."""
+        count, failures = precompile.compile_all()
+        self.assertEqual(failures, [])
+        names = set(precompile.template_names(engines.all()[0].engine))
+        self.assertTrue(
+            {'base.html', 'posts/includes/paginator.html'} <= names)
+        self.assertGreaterEqual(count, len(names))
+
+    def test_broken_templates_are_reported(self):
+        """Ошибка разбора и include несуществующего шаблона видны."""
+        directory = self.write('broken.html', '{% if %}')
+        with open(f'{directory}/missing.html', 'w') as file:
+            file.write('{% include "nowhere.html" %}')
+        with override_settings(TEMPLATES=templates(directory)):
+            _, failures = precompile.compile_all()
+            errors = checks.check_templates(None)
+        failed = {failure.name for failure in failures}
+        self.assertTrue({'broken.html', 'missing.html'} <= failed)
+        self.assertEqual(
+            {error.obj for error in errors if error.id == 'core.E001'},
+            failed)
+
+    def test_check_runs_only_on_deploy(self):
+        """Проверка шаблонов входит только в check --deploy."""
+        self.assertIn(
+            checks.check_templates,
+            registry.get_checks(include_deployment_checks=True))
+        self.assertNotIn(checks.check_templates, registry.get_checks())
+
+    def test_command_fails_on_broken_template(self):
+        """compile_templates завершается ошибкой для шага сборки."""
+        directory = self.write('broken.html', '{% unknown_tag %}')
+        with override_settings(TEMPLATES=templates(directory)):
+            with self.assertRaises(CommandError):
+                call_command('compile_templates', stderr=StringIO())
+
+    def test_warm_up_fills_cached_loader(self):
+        """Разогрев кладёт шаблоны в кэш загрузчика до первого запроса."""
+        directory = self.write('page.html', 'Страница')
+        with override_settings(
+                TEMPLATES=templates(directory, CACHED_LOADERS),
+                TEMPLATE_WARMUP=True):
+            loader = engines.all()[0].engine.template_loaders[0]
+            with self.assertLogs('yatube.templates', 'INFO'):
+                precompile.warm_up()
+            cached = {key.split('-')[0] for key in loader.get_template_cache}
+        self.assertIn('page.html', cached)
+        self.assertIn('admin/base.html', cached)
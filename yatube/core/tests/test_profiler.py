@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import profiler
+from posts.models import Post
+
+User = get_user_model()
+COLLAPSED_LINE = re.compile(r'^\S+ \d+$')
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def wait_result(self, client, started):
+        self.assertEqual(started.status_code, 202)
+        deadline = time.monotonic() + 5
+        while True:
+            response = client.get(started['Location'])
+            if response.status_code != 202 or time.monotonic() > deadline:
+                return response
+            time.sleep(0.05)
+
+    def test_disabled_by_default(self):
+        """Без PROFILER_ENABLED профилировщика нет даже для сотрудника."""
+        client = self.client_for(self.staff)
+        response = client.get(self.url, {'__profile': 1})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        response = client.get(reverse('profile_worker'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_only_staff_can_profile(self):
+        """Обычный пользователь получает страницу, а не профиль."""
+        client = self.client_for(self.user)
+        response = client.get(self.url, {'__profile': 1})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        response = client.get(reverse('profile_worker'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PROFILER_ENABLED=True, PROFILER_INTERVAL=0.001)
+    def test_request_profile_is_collapsed_stacks(self):
+        """Профиль запроса — свёрнутые стеки с кадрами представления."""
+        response = self.client_for(self.staff).get(
+            self.url, {'__profile': 30})
+        self.assertEqual(response['Content-Type'], profiler.CONTENT_TYPE)
+        self.assertIn(
+            'profile-posts-post_detail.collapsed',
+            response['Content-Disposition'])
+        lines = response.content.decode().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, COLLAPSED_LINE)
+        self.assertIn('posts/views.py:post_detail', response.content.decode())
+
+    @override_settings(PROFILER_ENABLED=True, PROFILER_INTERVAL=0.001)
+    def test_worker_profile_samples_other_threads(self):
+        """Замер воркера видит работу других потоков, но не свою."""
+        client = self.client_for(self.staff)
+        stop = threading.Event()
+        worker = threading.Thread(target=spin, args=(stop,), name='busy')
+        worker.start()
+        try:
+            started = client.get(reverse('profile_worker'), {'seconds': 0.2})
+            response = self.wait_result(client, started)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('busy;', content)
+        self.assertIn('core/tests/test_profiler.py:spin', content)
+        self.assertNotIn('core/profiler.py:run', content)
+
+    @override_settings(PROFILER_ENABLED=True, PROFILER_INTERVAL=0.001)
+    def test_worker_profile_does_not_block_request(self):
+        """Замер идёт в фоне: запрос отвечает сразу, а выборка видит и
+        поток, который его запустил (синхронный воркер)."""
+        client = self.client_for(self.staff)
+        started = time.monotonic()
+        response = client.get(reverse('profile_worker'), {'seconds': 0.3})
+        self.assertLess(time.monotonic() - started, 0.3)
+        stop = threading.Event()
+        threading.Timer(0.3, stop.set).start()
+        spin(stop)
+        response = self.wait_result(client, response)
+        self.assertIn(
+            'core/tests/test_profiler.py:spin', response.content.decode())
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_unknown_result_is_not_found(self):
+        """Ключ без замера — 404."""
+        response = self.client_for(self.staff).get(
+            reverse('profile_worker'), {'result': 'нет'})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_one_profile_at_a_time(self):
+        """Второй одновременный замер отклоняется."""
+        client = self.client_for(self.staff)
+        with profiler._busy:
+            started = time.monotonic()
+            response = client.get(reverse('profile_worker'), {'seconds': 5})
+        self.assertEqual(response.status_code, 409)
+        self.assertLess(time.monotonic() - started, 1)
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_seconds_must_be_finite(self):
+        """Нечисло и бесконечность — ошибка запроса, а не 500."""
+        client = self.client_for(self.staff)
+        for seconds in ('nan', 'inf', '-inf', 'много'):
+            with self.subTest(seconds=seconds):
+                response = client.get(
+                    reverse('profile_worker'), {'seconds': seconds})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import routers
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class RouterTests(TransactionTestCase):
+    # Реплика — зеркало default; данные должны быть закоммичены, чтобы
+    # их видело её отдельное соединение.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Текст')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def queries(self, request):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = request()
+        # Сессия всегда читается с основной базы.
+        primary = [
+            query for query in primary.captured_queries
+            if 'django_session' not in query['sql']]
+        return response, len(primary), len(replica)
+
+    def test_pages_read_replica(self):
+        """Некэшируемые GET-страницы читают с реплики всё, кроме сессии."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response, primary, replica = self.queries(
+            lambda: self.client.get(url))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_feed_cache_miss_reads_primary(self):
+        """Промах кэша ленты читает основную базу, попадание — ничего."""
+        cache.clear()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=('author',)),
+        ):
+            with self.subTest(url=url):
+                response, primary, replica = self.queries(
+                    lambda: self.client.get(url))
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(primary, 0)
+                self.assertEqual(replica, 0)
+                _, primary, replica = self.queries(
+                    lambda: self.client.get(url))
+                self.assertEqual((primary, replica), (0, 0))
+
+    def lag_replica(self):
+        """Замораживает реплику копией текущей основной базы."""
+        path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        snapshot = sqlite3.connect(path)
+        connections['default'].ensure_connection()
+        connections['default'].connection.backup(snapshot)
+        snapshot.close()
+        # У зеркала тот же словарь настроек, что у default: подменяем
+        # словарь целиком. Соединение с базой в памяти close() не
+        # закрывает, поэтому закрываем уже с новым NAME.
+        replica = connections['replica']
+        patcher = mock.patch.object(
+            replica, 'settings_dict', {**replica.settings_dict, 'NAME': path})
+        patcher.start()
+        replica.close()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(replica.close)
+
+    def test_lagging_replica_is_not_cached(self):
+        """Аноним сразу после записи не кэширует ленту с отстающей
+        реплики."""
+        cache.clear()
+        self.lag_replica()
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        anonymous = Client()
+        self.assertNotContains(
+            anonymous.get(reverse('posts:post_detail', args=(
+                Post.objects.latest('pk').pk,))),
+            'Новый пост', status_code=404)
+        for _ in range(2):
+            self.assertContains(
+                anonymous.get(reverse('posts:index')), 'Новый пост')
+
+    def test_author_reads_primary_after_write(self):
+        """После создания поста автор читает основную базу."""
+        response, _, replica = self.queries(lambda: self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}))
+        self.assertEqual(replica, 0)
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        response, primary, replica = self.queries(
+            lambda: self.client.get(response['Location']))
+        self.assertContains(response, 'Новый пост')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_outside_request_reads_primary(self):
+        """Команды и фоновые потоки читают основную базу."""
+        _, primary, replica = self.queries(Post.objects.count)
+        self.assertEqual((primary, replica), (1, 0))
+
+
+class SyncTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.connections = ConnectionHandler({
+            alias: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(self.directory, f'{alias}.sqlite3'),
+            }
+            for alias in ('default', 'replica')
+        })
+        self.addCleanup(self.connections.close_all)
+
+    def test_replica_gets_copy_of_primary(self):
+        """Копия основной базы целиком оказывается в файле реплики."""
+        with self.connections['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE post (text TEXT)')
+            cursor.execute("INSERT INTO post VALUES ('Текст')")
+        with mock.patch.object(routers, 'connections', self.connections):
+            routers.sync_sqlite('replica')
+        replica = sqlite3.connect(os.path.join(
+            self.directory, 'replica.sqlite3'))
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute('SELECT text FROM post').fetchall(), [('Текст',)])
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import slow_queries
+from posts.models import Post
+
+User = get_user_model()
+TEMP_DIR = tempfile.mkdtemp()
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fingerprint_ignores_values(self):
+        """Запросы одной формы с разными значениями — один отпечаток."""
+        self.assertEqual(
+            slow_queries.normalize(
+                "SELECT * FROM t WHERE a = %s AND b IN (%s, %s) "
+                "AND c = 'x''y'  LIMIT 10"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ? LIMIT ?')
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT 1 FROM t WHERE id IN (%s)'),
+            slow_queries.fingerprint(
+                'SELECT 1 FROM t  WHERE id IN (%s, %s, %s)'))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_plan(self):
+        """Запрос дольше порога пишется с представлением и планом."""
+        url = reverse('posts:profile', args=('author',))
+        with self.assertLogs('yatube.slow_queries', 'INFO') as logs:
+            response = Client().get(url)
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        select = next(
+            entry for entry in entries
+            if entry['sql'].startswith('SELECT "posts_post"'))
+        self.assertEqual(select['view'], 'posts:profile')
+        self.assertIn(str(self.author.pk), select['params'])
+        self.assertTrue(select['plan'])
+        self.assertNotIn(str(self.author.pk), select['sql'])
+        # EXPLAIN не попадает ни в журнал, ни в счёт запросов.
+        self.assertIn(
+            f'desc="{len(entries)} SQL"', response['Server-Timing'])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_session_and_auth_params_are_redacted(self):
+        """Ключ сессии и username пишутся только типом и длиной."""
+        client = Client()
+        client.force_login(self.author)
+        session_key = client.session.session_key
+        with self.assertLogs('yatube.slow_queries', 'INFO') as logs:
+            client.get(reverse('posts:profile', args=('author',)))
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        logged = json.dumps(entries, ensure_ascii=False)
+        self.assertNotIn(session_key, logged)
+        self.assertNotIn("'author'", logged)
+        session = next(
+            entry for entry in entries if 'django_session' in entry['sql'])
+        self.assertIn(f'<str, {len(session_key)}>', session['params'])
+        self.assertEqual(session['plan'], [])
+
+    def test_joined_auth_table_keeps_params(self):
+        """Присоединённая ради автора auth_user не скрывает параметры."""
+        sql = ('SELECT "posts_post"."id" FROM "posts_post" INNER JOIN '
+               '"auth_user" ON ("posts_post"."author_id" = "auth_user"."id") '
+               'WHERE "posts_post"."author_id" = %s')
+        self.assertFalse(slow_queries.sensitive(sql))
+        self.assertEqual(slow_queries.sample([7], sql), ['7'])
+        self.assertTrue(slow_queries.sensitive(
+            'SELECT (SELECT 1 FROM "posts_follow") FROM "auth_user"'))
+        self.assertTrue(slow_queries.sensitive(
+            'UPDATE "django_session" SET "session_data" = %s'))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_threshold_can_be_disabled(self):
+        """Без порога журнал не пишется."""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.slow_queries', 'INFO'):
+                Client().get(reverse('posts:index'))
+
+
+class SlowQueriesCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write(self, path, *entries):
+        with open(path, 'w', encoding='utf-8') as stream:
+            for view, sql, ms in entries:
+                stream.write(json.dumps({
+                    'time': 0, 'view': view, 'ms': ms,
+                    'fingerprint': slow_queries.fingerprint(sql),
+                    'sql': slow_queries.normalize(sql), 'params': [],
+                    'plan': [f'SCAN {sql[-1]}'],
+                }) + '\n')
+
+    def test_fingerprints_are_ranked_by_total_time(self):
+        """Сводка читает ротированные копии и сортирует по сумме."""
+        path = os.path.join(TEMP_DIR, 'slow.log')
+        self.write(
+            path, ('posts:index', 'SELECT * FROM a', 150),
+            ('posts:profile', 'SELECT * FROM b', 300))
+        self.write(
+            f'{path}.1', ('posts:index', 'SELECT * FROM a', 200),
+            ('posts:follow_index', 'SELECT * FROM a', 100))
+        out = StringIO()
+        call_command('slow_queries', log=path, plan=True, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('всего 450 мс, запросов 3', lines[0])
+        self.assertEqual(
+            lines[1], '  posts:index 350 мс, posts:follow_index 100 мс')
+        self.assertEqual(lines[3], '    SCAN a')
+        self.assertIn('всего 300 мс, запросов 1', lines[4])
+
+        out = StringIO()
+        call_command(
+            'slow_queries', log=path, views=['posts:profile'], stdout=out)
+        self.assertIn('SELECT * FROM b', out.getvalue())
+        self.assertNotIn('SELECT * FROM a', out.getvalue())
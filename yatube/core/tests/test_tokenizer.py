@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase
+
+from core.stemmer import stem
+from core.tokenizer import tokenize
+
+
+class StemmerTests(SimpleTestCase):
+    def test_snowball_examples(self):
+        """Основы совпадают с эталонным стеммером Snowball."""
+        examples = {
+            'абиссинию': 'абиссин',
+            'абсолютной': 'абсолютн',
+            'авдотьей': 'авдот',
+            'авторитета': 'авторитет',
+            'агаповых': 'агапов',
+            'важнейшие': 'важн',
+            'гуляли': 'гуля',
+            'гулявшись': 'гуля',
+            'котами': 'кот',
+            'радостью': 'радост',
+            'длинный': 'длин',
+            'ёлочка': 'елочк',
+            'python': 'python',
+        }
+        for word, expected in examples.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class TokenizerTests(SimpleTestCase):
+    def test_tokenize(self):
+        """Слова приводятся к основе, стоп-слова и пунктуация отбрасываются."""
+        self.assertEqual(
+            tokenize('Привет, МИР! Мы и наши ёлки; snake_case 42'),
+            ['привет', 'мир', 'наш', 'елк', 'snake', 'case', '42'])
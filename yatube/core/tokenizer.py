@@ -0,0 +1,45 @@
+"""Разбиение текста на термины для поискового индекса.
+
+Один и тот же ``tokenize`` используется и при индексации, и при разборе
+запроса, поэтому термины в индексе и в запросе всегда совпадают по
+написанию. Конвейер: слова (буквы и цифры; подчёркивание и пунктуация —
+разделители) → нижний регистр и «ё» → «е» → без стоп-слов → основа
+по Snowball (``core.stemmer``), так что «котами» находит «кот».
+"""
+import re
+
+from core.stemmer import stem
+
+WORD = re.compile(r'[^\W_]+')
+# Длиннее не бывает слов, только мусора; обрезаем, чтобы термин
+# помещался в столбец индекса.
+MAX_TERM_LENGTH = 64
+
+# Стоп-слова Snowball для русского, уже с «е» вместо «ё»: они есть
+# почти в каждом посте и только раздувают индекс.
+STOPWORDS = frozenset('''
+    и в во не что он на я с со как а то все она так его но да ты к у же
+    вы за бы по только ее мне было вот от меня еще нет о из ему теперь
+    когда даже ну вдруг ли если уже или ни быть был него до вас нибудь
+    опять уж вам ведь там потом себя ничего ей может они тут где есть
+    надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже
+    себе под будет ж тогда кто этот того потому этого какой совсем ним
+    здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех
+    никогда можно при наконец два об другой хоть после над больше тот
+    через эти нас про всего них какая много разве три эту моя впрочем
+    хорошо свою этой перед иногда лучше чуть том нельзя такой им более
+    всегда конечно всю между
+'''.split())
+
+
+def words(text):
+    """Слова текста в нижнем регистре, «ё» заменена на «е»."""
+    return [
+        match.group().lower().replace('ё', 'е')[:MAX_TERM_LENGTH]
+        for match in WORD.finditer(text or '')
+    ]
+
+
+def tokenize(text):
+    """Термины текста в порядке появления, с повторами."""
+    return [stem(word) for word in words(text) if word not in STOPWORDS]
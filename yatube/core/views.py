@@ -1,5 +1,11 @@
+import math
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 
+from core import metrics, profiler
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +17,46 @@ def csrf_failure(request, reason=''):
 
 def server_error(request, reason=''):
     return render(request, 'core/500.html')
+
+
+def metrics_view(request):
+    if not metrics.allowed(request):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def profile_worker(request):
+    if not profiler.allowed(request):
+        raise Http404
+    key = request.GET.get('result')
+    if key:
+        return profile_result(key)
+    try:
+        seconds = float(request.GET.get('seconds', 10))
+    except ValueError:
+        seconds = math.nan
+    # float() принимает и nan с inf, а min/max с nan не справляются.
+    if not math.isfinite(seconds):
+        return HttpResponseBadRequest('seconds — число секунд')
+    seconds = min(max(seconds, 0), settings.PROFILER_MAX_SECONDS)
+    try:
+        key = profiler.start_profile(seconds)
+    except profiler.ProfilerBusy:
+        return HttpResponse('Уже идёт другой замер', status=409)
+    response = HttpResponse(
+        f'Замер идёт {seconds:g} с, результат: ?result={key}', status=202)
+    response['Location'] = f'{request.path}?result={key}'
+    response['Retry-After'] = str(math.ceil(seconds))
+    return response
+
+
+def profile_result(key):
+    found = profiler.result(key)
+    if found is None:
+        raise Http404
+    if found['stacks'] is None:
+        response = HttpResponse('Замер ещё идёт', status=202)
+        response['Retry-After'] = '1'
+        return response
+    return profiler.response(
+        found['stacks'], found['samples'], f'profile-worker-{key}')
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 
 from posts.models import Post, Group, Comment, Follow
+from posts.search import search_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -17,6 +18,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%…%' по всей таблице — поисковый индекс.
+        if not search_term.strip():
+            return queryset, False
+        found = search_posts(search_term).values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
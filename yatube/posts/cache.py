@@ -0,0 +1,114 @@
+"""Кэш страниц лент, который сбрасывается данными, а не таймаутом.
+
+У каждой ленты есть счётчик поколения в кэше: общий ``global``,
+``group:<slug>`` и ``author:<username>``. Номера поколений входят в
+ключ закэшированной страницы, поэтому сохранение или удаление поста,
+комментария или подписки просто увеличивает нужные счётчики, и
+старые страницы больше никогда не читаются. Пока данные не меняются,
+страница отдаётся из кэша сколь угодно долго.
+
+Промах кэша рендерится с основной базы, а не с реплики: страница,
+прочитанная с отстающей реплики, легла бы под новое поколение.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_cache_key, has_vary_header, learn_cache_key, patch_vary_headers,
+)
+
+from core import metrics, routers
+from posts.models import Group, User
+
+VERSION_PREFIX = 'feed:v:'
+
+
+def _initial_version():
+    # Если счётчик вытеснен из кэша, новый отсчёт не должен совпасть
+    # ни с одним из прежних поколений.
+    return int(time.time() * 1000)
+
+
+def _version_key(scope):
+    # Имена и слаги бывают не ASCII и с пробелами, а ключ кэша — нет.
+    return VERSION_PREFIX + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def author_scope(user_id):
+    username = User.objects.filter(pk=user_id).values_list(
+        'username', flat=True).first()
+    return f'author:{username}'
+
+
+def post_scopes(post, *group_ids):
+    """Ленты, в которых виден пост (и группы, где он был раньше)."""
+    scopes = ['global', author_scope(post.author_id)]
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    scopes.extend(f'group:{slug}' for slug in slugs)
+    return scopes
+
+
+def cached_feed(*scopes):
+    """Кэширует GET-ответ ленты до смены поколения любого из scopes.
+
+    Шаблоны scopes подставляют именованные аргументы вьюхи, например
+    ``@cached_feed('group:{slug}')``. Ответ зависит от пользователя
+    (шапка, кнопка подписки), поэтому он всегда варьируется по Cookie.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            versions = get_versions(
+                [scope.format(**kwargs) for scope in scopes])
+            key_prefix = 'feed:' + '.'.join(map(str, versions))
+            cache_key = get_cache_key(
+                request, key_prefix, 'GET', cache=cache)
+            if cache_key is not None:
+                response = cache.get(cache_key)
+                if response is not None:
+                    metrics.count_cache('feed', hits=1)
+                    return response
+            metrics.count_cache('feed', misses=1)
+            with routers.primary():
+                response = view_func(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if (
+                response.status_code != 200
+                or response.streaming
+                or (not request.COOKIES and response.cookies
+                    and has_vary_header(response, 'Cookie'))
+            ):
+                return response
+            timeout = settings.FEED_CACHE_TIMEOUT
+            cache_key = learn_cache_key(
+                request, response, timeout, key_prefix, cache=cache)
+            cache.set(cache_key, response, timeout)
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,58 @@
+"""Карточки постов в лентах: один шаблон и кэш готовых фрагментов.
+
+Карточка (автор, дата, картинка, текст, ссылки) одинакова во всех
+лентах и не зависит от читателя, поэтому её HTML кэшируется по ключу
+из id поста и версии. Версия — отпечаток всего, что есть в карточке и
+меняется: время правки поста (``updated``), число комментариев, имя
+автора и группа. Правка меняет ключ, и старый фрагмент просто больше
+не читается.
+
+Страница ленты берёт все свои карточки одним ``get_many`` и рисует
+только промахи; миниатюры тоже ищутся только для них. Карточку, чья
+миниатюра ещё строится, не кэшируем, иначе в ней застрял бы оригинал.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core import metrics
+from posts import thumbnails
+
+TEMPLATE = 'posts/includes/post_card.html'
+KEY_PREFIX = 'post_card:'
+
+
+def version(post):
+    group = post.group.slug if post.group_id else ''
+    parts = (
+        post.updated.timestamp(), post.comments_count, post.author.username,
+        post.author.get_full_name(), group)
+    return hashlib.md5(
+        '|'.join(map(str, parts)).encode()).hexdigest()[:12]
+
+
+def cache_key(post):
+    return f'{KEY_PREFIX}{post.pk}:{version(post)}'
+
+
+def render(posts):
+    """HTML карточек ``posts`` по порядку; готовые берутся из кэша."""
+    posts = list(posts)
+    keys = {post.pk: cache_key(post) for post in posts}
+    found = cache.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.pk] not in found]
+    metrics.count_cache(
+        'cards', hits=len(posts) - len(missing), misses=len(missing))
+    thumbnails.prefetch(missing)
+    fresh = {}
+    for post in missing:
+        picture = thumbnails.picture(post.image)
+        html = render_to_string(TEMPLATE, {'post': post, 'picture': picture})
+        found[keys[post.pk]] = html
+        if not (picture and picture.get('pending')):
+            fresh[keys[post.pk]] = html
+    if fresh:
+        cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return [found[keys[post.pk]] for post in posts]
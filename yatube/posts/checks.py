@@ -0,0 +1,24 @@
+from django.core.checks import Tags, Warning, register
+from django.db import DatabaseError
+
+from posts import search
+
+
+@register(Tags.database)
+def check_search_index(app_configs, **kwargs):
+    """Поисковый индекс заполнен: после миграций он пуст."""
+    try:
+        stale = search.stale_databases()
+    except DatabaseError:
+        # Таблиц ещё нет: миграции не применены.
+        return []
+    return [
+        Warning(
+            f'Поисковый индекс в базе {using} пуст, поиск ничего '
+            f'не найдёт.',
+            hint='Построить индекс: manage.py reindex_search.',
+            obj=using,
+            id='posts.W001',
+        )
+        for using in stale
+    ]
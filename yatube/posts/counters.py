@@ -0,0 +1,90 @@
+"""Денормализованные счётчики записей, комментариев и подписок.
+
+Счётчики меняются атомарным ``UPDATE ... SET x = x + 1`` в той же
+транзакции, что и сама запись; расхождения, если они всё же
+появятся, исправляет команда ``manage.py reconcile_counters``.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def _change(queryset, **deltas):
+    for field, delta in deltas.items():
+        if delta < 0:
+            # Не уводим счётчик ниже нуля, если он уже разошёлся с данными.
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def change_user(user_id, **deltas):
+    if user_id is not None:
+        _change(UserCounters.objects.filter(user_id=user_id), **deltas)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def change_post(post_id, delta, using=None):
+    if post_id is not None:
+        _change(
+            Post.objects.using(using).filter(pk=post_id),
+            comments_count=delta)
+
+
+def get_counters(user):
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        counters, _ = UserCounters.objects.get_or_create(user=user)
+        return counters
+
+
+def _real_count(model, field, outer='pk'):
+    counted = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def reconcile(dry_run=False):
+    """Пересчитывает все счётчики, возвращает число исправленных строк."""
+    existing = UserCounters.objects.values('user_id')
+    missing = User.objects.exclude(pk__in=existing).values_list(
+        'pk', flat=True)
+    fixed = {'users_missing': missing.count()}
+    if not dry_run:
+        UserCounters.objects.bulk_create(
+            UserCounters(user_id=pk) for pk in missing.iterator())
+    targets = (
+        (UserCounters.objects.all(), {
+            'posts_count': _real_count(Post, 'author', 'user_id'),
+            'comments_count': _real_count(Comment, 'author', 'user_id'),
+            'followers_count': _real_count(Follow, 'author', 'user_id'),
+            'following_count': _real_count(Follow, 'user', 'user_id'),
+        }),
+        (Group.objects.all(), {
+            'posts_count': _real_count(Post, 'group'),
+        }),
+        (Post.objects.all(), {
+            'comments_count': _real_count(Comment, 'post'),
+        }),
+    )
+    for queryset, expressions in targets:
+        real = {f'real_{field}': value for field, value in expressions.items()}
+        drift = Q()
+        for field in expressions:
+            drift |= ~Q(**{field: F(f'real_{field}')})
+        stale = queryset.annotate(**real).filter(drift)
+        label = queryset.model._meta.model_name
+        fixed[label] = stale.count()
+        if fixed[label] and not dry_run:
+            queryset.filter(pk__in=stale.values('pk')).update(**expressions)
+    return fixed
@@ -1,16 +1,32 @@
 from django import forms
 
 
+from posts.images import normalize
 from posts.models import Post, Comment
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
 
 class PostForm(forms.ModelForm):
+    animation = None
 
     class Meta:
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        normalized = normalize(image)
+        self.animation = normalized.animation
+        return normalized.still
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.animation = self.animation or ''
+        return super().save(commit)
+
     def clean_subject(self):
         text = self.cleaned_data['text']
         if text == '':
@@ -0,0 +1,176 @@
+"""Нормализация картинок постов при загрузке.
+
+Оригинал хранится и раскодируется при каждом промахе миниатюры, поэтому
+уже при загрузке картинка проверяется на бюджет байтов и пикселей
+(``IMAGE_MAX_BYTES``, ``IMAGE_MAX_PIXELS``), уменьшается до
+``IMAGE_MAX_SIDE``, теряет метаданные (EXIF с геометкой, комментарии), а
+анимированный GIF превращается в неподвижный первый кадр и, если
+включено ``IMAGE_ANIMATED_WEBP``, компактную анимацию WebP.
+
+Файл, которому ничего из этого не нужно, сохраняется как есть, без
+перекодирования. Pillow читает только заголовок и нужные кадры: кадры
+анимации раскодируются по одному и сразу уменьшаются.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, ImageSequence
+
+# Форматы, в которых храним неподвижную картинку, и их расширения.
+STILL_FORMATS = {'JPEG': 'jpg', 'PNG': 'png'}
+# Метаданные, которые Pillow кладёт в Image.info и которые не нужны.
+METADATA_KEYS = ('exif', 'comment', 'xmp', 'XML:com.adobe.xmp', 'photoshop')
+EXIF_ORIENTATION = 0x0112
+
+
+class NormalizedImage:
+    """Результат нормализации: неподвижная картинка и, возможно, анимация."""
+
+    def __init__(self, still, animation=None):
+        self.still = still
+        self.animation = animation
+
+
+def _frame_count(image):
+    try:
+        return getattr(image, 'n_frames', 1)
+    except (EOFError, OSError):
+        return 1
+
+
+def _needs_processing(image, frames):
+    if frames > 1:
+        return True
+    if max(image.size) > settings.IMAGE_MAX_SIDE:
+        return True
+    if image.format not in (*STILL_FORMATS, 'GIF'):
+        return True
+    return any(key in image.info for key in METADATA_KEYS) or bool(
+        image.getexif())
+
+
+def _still_format(image):
+    if image.format in STILL_FORMATS:
+        return image.format
+    if image.mode in ('RGBA', 'LA', 'P') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def _downscale(frame):
+    side = settings.IMAGE_MAX_SIDE
+    if max(frame.size) > side:
+        frame.thumbnail((side, side), Image.LANCZOS, reducing_gap=3.0)
+    return frame
+
+
+def _renamed(name, extension):
+    return f'{os.path.splitext(os.path.basename(name))[0]}.{extension}'
+
+
+def _encode_still(image, name):
+    format_ = _still_format(image)
+    if image.format == 'JPEG':
+        # Раскодируем сразу в уменьшенном масштабе (1/2, 1/4, 1/8).
+        side = settings.IMAGE_MAX_SIDE
+        image.draft('RGB', (side, side))
+    image.seek(0)
+    frame = ImageOps.exif_transpose(image)
+    frame = _downscale(frame)
+    if format_ == 'JPEG' and frame.mode not in ('RGB', 'L'):
+        frame = frame.convert('RGB')
+    output = BytesIO()
+    if format_ == 'JPEG':
+        frame.save(output, 'JPEG', quality=85, optimize=True)
+    else:
+        frame.save(output, 'PNG', optimize=True)
+    return ContentFile(
+        output.getvalue(), name=_renamed(name, STILL_FORMATS[format_]))
+
+
+class _ScaledFrames:
+    """Кадры анимации начиная с ``first``, которые раскодируются и
+    уменьшаются по одному, когда Pillow до них доходит.
+
+    Кодировщик WebP перебирает через ``seek`` кадры каждой картинки из
+    ``append_images``, поэтому в памяти держится один уменьшенный кадр,
+    а не вся анимация.
+    """
+
+    mode = 'RGBA'
+
+    def __init__(self, image, first, frames):
+        self.image = image
+        self.first = first
+        self.n_frames = frames - first
+        self.frame = None
+
+    @property
+    def size(self):
+        return self.frame.size
+
+    def seek(self, index):
+        self.image.seek(self.first + index)
+        self.frame = _downscale(self.image.convert('RGBA'))
+
+    def load(self):
+        pass
+
+    def tobytes(self, *args):
+        return self.frame.tobytes(*args)
+
+
+def _encode_animation(image, name, frames):
+    Image.init()
+    if 'WEBP' not in Image.SAVE:
+        return None
+    width, height = image.size
+    if width * height * frames > settings.IMAGE_MAX_PIXELS:
+        return None
+    # Длительности читаются из заголовков кадров, без раскодирования.
+    durations = [
+        frame.info.get('duration', 100)
+        for frame in ImageSequence.Iterator(image)
+    ]
+    image.seek(0)
+    first = _downscale(image.convert('RGBA'))
+    output = BytesIO()
+    first.save(
+        output, 'WEBP', save_all=True,
+        append_images=[_ScaledFrames(image, 1, frames)],
+        duration=durations, loop=image.info.get('loop', 0),
+        quality=75, method=4,
+    )
+    return ContentFile(output.getvalue(), name=_renamed(name, 'webp'))
+
+
+def normalize(uploaded):
+    """Проверяет бюджет загруженной картинки и приводит её к норме.
+
+    Возвращает ``NormalizedImage``; ``still`` — либо тот же файл, если
+    менять нечего, либо новый ``ContentFile``.
+    """
+    if uploaded.size > settings.IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_MAX_BYTES)})
+    uploaded.seek(0)
+    image = Image.open(uploaded)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.', code='too_many_pixels',
+            params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6})
+    frames = _frame_count(image)
+    if not _needs_processing(image, frames):
+        uploaded.seek(0)
+        return NormalizedImage(uploaded)
+    animation = None
+    if frames > 1 and settings.IMAGE_ANIMATED_WEBP:
+        animation = _encode_animation(image, uploaded.name, frames)
+    still = _encode_still(image, uploaded.name)
+    return NormalizedImage(still, animation)
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.stemmer import stem
+from core.tokenizer import tokenize, words
+from posts.models import Post
+
+# Текст на случай пустой базы: разные формы одних и тех же слов.
+SAMPLE = (
+    'Вчера мы гуляли по осеннему парку и фотографировали жёлтые листья. '
+    'Листьев было так много, что дорожки казались золотыми, а деревья '
+    'стояли почти голые. Фотографии получились красивыми; самые удачные '
+    'снимки я опубликую в группе о прогулках по городским паркам.'
+)
+
+
+class Command(BaseCommand):
+    help = ('Измеряет скорость разбора текста постов на термины '
+            '(токенов в секунду).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=10000,
+            help='Сколько последних постов взять в выборку.')
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Сколько раз прогнать выборку; берётся лучший прогон.')
+
+    def handle(self, *args, limit=10000, repeat=3, **options):
+        texts = list(
+            Post.objects.order_by('-id').values_list('text', flat=True)
+            [:limit].iterator(chunk_size=1000)
+        ) or [SAMPLE] * 1000
+        count = sum(len(words(text)) for text in texts)
+        self.stdout.write(f'Текстов: {len(texts)}, слов: {count}')
+        stem.cache_clear()
+        self.report('Токенизация, холодный кэш основ', texts, count, 1)
+        self.report('Токенизация, тёплый кэш основ', texts, count, repeat)
+        self.report('Только разбиение на слова', texts, count, repeat,
+                    function=words)
+
+    def report(self, title, texts, count, repeat, function=tokenize):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            for text in texts:
+                function(text)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rate = f'{count / best if best else 0:,.0f}'.replace(',', ' ')
+        self.stdout.write(f'{title}: {rate} токенов/с')
@@ -0,0 +1,57 @@
+import sys
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding, transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в NDJSON '
+            '(и файлы постов в tar) потоком, не держа их в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON (.gz — со сжатием, «-» — stdout).')
+        parser.add_argument(
+            '--media', help='Куда записать tar с картинками постов.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз.')
+
+    def handle(self, *args, path, media=None,
+               chunk_size=transfer.CHUNK_SIZE, **options):
+        if sharding.enabled():
+            raise CommandError(
+                'Выгрузка читает посты только из default, а они '
+                'разнесены по шардам (POST_SHARDS).')
+        # Строки прогресса не должны попасть в выгрузку на stdout.
+        log = self.stderr if path == '-' else self.stdout
+        started = time.monotonic()
+        counts = Counter()
+        stream = transfer.open_ndjson(path, 'w')
+        try:
+            for label in transfer.export(stream, chunk_size):
+                counts[label] += 1
+                total = sum(counts.values())
+                if total % transfer.PROGRESS_EVERY == 0:
+                    log.write(self.rate(total, started))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        for label, count in counts.items():
+            log.write(f'{label}: {count}')
+        log.write(self.style.SUCCESS(
+            f'Выгружено: {self.rate(sum(counts.values()), started)}'))
+        if media:
+            started = time.monotonic()
+            with open(media, 'wb') as archive:
+                files = sum(
+                    1 for _ in transfer.export_media(archive, chunk_size))
+            log.write(self.style.SUCCESS(
+                f'Файлов в архиве: {self.rate(files, started)}'))
+
+    def rate(self, count, started):
+        elapsed = time.monotonic() - started
+        return f'{count} ({count / elapsed if elapsed else 0:.0f} в секунду)'
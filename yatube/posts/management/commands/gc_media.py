@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.media import collect_garbage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из media/posts и media/cache файлы, на которые '
+            'не ссылается ни один пост.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удалять.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько файлов сверять и удалять за один шаг.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, чтобы продолжить прерванную '
+                 'сборку.')
+
+    def handle(self, *args, dry_run=False, batch_size=1000, checkpoint=None,
+               **options):
+        files, size = collect_garbage(
+            dry_run=dry_run, batch_size=batch_size, checkpoint=checkpoint)
+        if dry_run:
+            self.stdout.write(
+                f'Файлов без ссылок: {files}, {filesizeformat(size)}')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено файлов: {files}, '
+                f'освобождено {filesizeformat(size)}'))
@@ -0,0 +1,55 @@
+import sys
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_posts: NDJSON пакетами через '
+            'bulk_create и, если указан, tar с картинками постов. '
+            'Посты пишутся в default; при шардировании их раскладывает '
+            'команда reshard.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON (.gz — со сжатием, «-» — stdin).')
+        parser.add_argument(
+            '--media', help='tar с картинками постов из export_posts.')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.CHUNK_SIZE,
+            help='Сколько записей сохранять одной транзакцией.')
+
+    def handle(self, *args, path, media=None,
+               batch_size=transfer.CHUNK_SIZE, **options):
+        if media:
+            started = time.monotonic()
+            with open(media, 'rb') as archive:
+                files = sum(1 for _ in transfer.import_media(archive))
+            self.stdout.write(f'Файлов: {self.rate(files, started)}')
+        started = time.monotonic()
+        counts = Counter()
+        reported = 0
+        stream = transfer.open_ndjson(path, 'r')
+        try:
+            for label, count in transfer.import_records(stream, batch_size):
+                counts[label] += count
+                total = sum(counts.values())
+                if total - reported >= transfer.PROGRESS_EVERY:
+                    self.stdout.write(self.rate(total, started))
+                    reported = total
+        except transfer.TransferError as error:
+            raise CommandError(error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {self.rate(sum(counts.values()), started)}'))
+
+    def rate(self, count, started):
+        elapsed = time.monotonic() - started
+        return f'{count} ({count / elapsed if elapsed else 0:.0f} в секунду)'
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import sharding
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики записей, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не исправлять.')
+
+    def handle(self, *args, dry_run=False, **options):
+        if sharding.enabled():
+            raise CommandError(
+                'Счётчики сверяются подзапросами к постам в default, а '
+                'посты разнесены по шардам (POST_SHARDS).')
+        with transaction.atomic():
+            fixed = reconcile(dry_run=dry_run)
+        for label, count in fixed.items():
+            self.stdout.write(f'{label}: {count}')
+        total = sum(fixed.values())
+        if dry_run:
+            self.stdout.write(f'Расхождений найдено: {total}')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено строк: {total}'))
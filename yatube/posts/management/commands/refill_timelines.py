@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Помечает авторов, дошедших до TIMELINE_FANOUT_LIMIT, и '
+            'раскладывает по лентам посты авторов, у которых подписчиков '
+            'стало меньше TIMELINE_REFILL_BELOW. Запускается по '
+            'расписанию.')
+
+    def handle(self, *args, **options):
+        marked = timeline.mark_heavy()
+        self.stdout.write(f'Помечено тяжёлыми: {marked}')
+        refilled = 0
+        for author_id in timeline.refill_light():
+            refilled += 1
+            self.stdout.write(f'Ленты заполнены постами автора {author_id}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов разложено по лентам: {refilled}'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search, sharding
+
+
+class Command(BaseCommand):
+    help = ('Переиндексирует посты для поиска частями, не загружая '
+            'всю таблицу в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=search.BATCH_SIZE,
+            help='Сколько постов индексировать одной транзакцией.')
+        parser.add_argument(
+            '--after', type=int, default=0,
+            help='Начать с постов с id больше этого (продолжение).')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала очистить индекс (поиск пуст до конца прохода).')
+
+    def handle(self, *args, batch_size=search.BATCH_SIZE, after=0,
+               clear=False, **options):
+        started = time.monotonic()
+        total = 0
+        for using in sharding.databases():
+            if clear:
+                with transaction.atomic(using=using):
+                    search.get_backend(using=using).clear()
+            for last, count in search.reindex(
+                    using=using, batch_size=batch_size, after=after):
+                total += count
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{using}, до id {last}: {total} постов, '
+                    f'{total / elapsed if elapsed else 0:.0f} в секунду')
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {total}'))
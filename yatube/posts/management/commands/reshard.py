@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты и комментарии авторов в их шарды по '
+            'текущему POST_SHARDS (после включения шардирования или '
+            'смены числа шардов).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', action='append', dest='sources',
+            help='База, откуда переносить (default, старый шард); '
+                 'по умолчанию default и все шарды.')
+        parser.add_argument(
+            '--batch-size', type=int, default=sharding.BATCH_SIZE,
+            help='Сколько постов переносить одной транзакцией.')
+
+    def handle(self, *args, sources=None, batch_size=sharding.BATCH_SIZE,
+               **options):
+        if not sharding.enabled():
+            raise CommandError('Шардов нет: задайте DB_SHARDS')
+        unknown = set(sources or ()) - set(settings.DATABASES)
+        if unknown:
+            raise CommandError(f'Нет таких баз: {", ".join(unknown)}')
+        sources = sources or [DEFAULT_DB_ALIAS, *settings.POST_SHARDS]
+        started = time.monotonic()
+        authors = posts = 0
+        for author_id, source, target, count in sharding.reshard(
+                sources, batch_size):
+            authors += 1
+            posts += count
+            self.stdout.write(
+                f'Автор {author_id}: {source} → {target}, постов: {count}')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено авторов: {authors}, постов: {posts} '
+            f'за {elapsed:.1f} с'))
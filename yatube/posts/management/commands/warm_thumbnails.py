@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import warm
+
+
+class Command(BaseCommand):
+    help = ('Регистрирует в хранилище sorl-thumbnail миниатюры, '
+            'которые уже лежат в media/cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не записывать.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько картинок проверять одним запросом.')
+
+    def handle(self, *args, dry_run=False, batch_size=500, **options):
+        stats = warm(dry_run=dry_run, batch_size=batch_size)
+        self.stdout.write(f'Уже в хранилище: {stats["known"]}')
+        self.stdout.write(f'Нет файла (построит пул): {stats["missing"]}')
+        if dry_run:
+            self.stdout.write(
+                f'Будет зарегистрировано: {stats["registered"]}')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Зарегистрировано: {stats["registered"]}'))
@@ -0,0 +1,194 @@
+"""Учёт ссылок на файлы постов.
+
+Одинаковые загрузки хранятся одним файлом (см.
+``core.storage.ContentAddressedStorage``), поэтому при замене картинки
+или удалении поста файл можно удалить, только если на него больше не
+ссылается ни один пост. Число ссылок — это число строк ``Post`` с этим
+именем в ``image`` или ``animation``; оба столбца проиндексированы.
+
+``collect_garbage`` находит файлы, которые остались без ссылок в обход
+``release`` (каскадное удаление, сбои, старые размеры миниатюр). Живые
+имена — файлы постов и все ожидаемые миниатюры к ним — складываются во
+временную базу SQLite на диске, а дерево медиа обходится потоком в
+отсортированном порядке и сверяется с ней пакетами, так что память не
+зависит от числа файлов. Последний обработанный путь пишется в файл
+контрольной точки, и прерванная сборка продолжается с него.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import content_storage
+from posts import sharding, thumbnails
+from posts.models import MEDIA_FIELDS, Post
+
+CHUNK_SIZE = 2000
+
+
+def references(name):
+    return sum(
+        posts.filter(Q(image=name) | Q(animation=name)).count()
+        for posts in sharding.scatter(Post.objects.all()))
+
+
+def _recently_saved(path):
+    # Тот же файл мог только что прийти с новой загрузкой, пост которой
+    # ещё не закоммичен; такие файлы оставляем сборщику мусора.
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        return False
+    return time.time() - modified < settings.MEDIA_RELEASE_GRACE
+
+
+def release(*names):
+    """Удаляет файлы ``names`` и их миниатюры, если ссылок не осталось."""
+    for name in set(names) - {''}:
+        try:
+            path = content_storage.path(name)
+        except SuspiciousFileOperation:
+            # Имя вне MEDIA_ROOT: файл не наш, не трогаем.
+            continue
+        if references(name) or _recently_saved(path):
+            continue
+        default.kvstore.delete(ImageFile(name, content_storage))
+        content_storage.delete(name)
+
+
+def _live_names():
+    """Имена файлов постов и ожидаемых миниатюр, с повторами."""
+    rows = chain.from_iterable(
+        posts.order_by().values_list(*MEDIA_FIELDS).iterator(
+            chunk_size=CHUNK_SIZE)
+        for posts in sharding.scatter(Post.objects.all()))
+    for image, *others in rows:
+        yield from filter(None, others)
+        if not image:
+            continue
+        yield image
+        source = thumbnails.source_file(image)
+        for size in thumbnails.SIZES:
+            for _, _, geometry, options in thumbnails.variants(size):
+                yield thumbnails.backend.thumbnail_file(
+                    source, geometry, **options).name
+
+
+def _build_live_set(path):
+    live = sqlite3.connect(path)
+    live.execute(
+        'CREATE TABLE live (name TEXT PRIMARY KEY) WITHOUT ROWID')
+    batch = []
+    for name in _live_names():
+        batch.append((name,))
+        if len(batch) == CHUNK_SIZE:
+            live.executemany('INSERT OR IGNORE INTO live VALUES (?)', batch)
+            batch = []
+    live.executemany('INSERT OR IGNORE INTO live VALUES (?)', batch)
+    live.commit()
+    return live
+
+
+def _walk(directory, relative, after):
+    """Файлы под ``directory`` по возрастанию относительного пути,
+    начиная строго после ``after``."""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    # Каталог сортируем как «имя/», чтобы порядок обхода совпал с
+    # порядком строк путей ('a.b' < 'a/x').
+    entries.sort(key=lambda entry: entry.name + (
+        '/' if entry.is_dir(follow_symlinks=False) else ''))
+    for entry in entries:
+        name = f'{relative}/{entry.name}' if relative else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            prefix = name + '/'
+            if after and prefix < after and not after.startswith(prefix):
+                continue
+            yield from _walk(entry.path, name, after)
+        elif not after or name > after:
+            yield name, entry.stat(follow_symlinks=False)
+
+
+def _media_files(after):
+    roots = sorted(('posts', thumbnail_settings.THUMBNAIL_PREFIX.strip('/')))
+    for root in roots:
+        yield from _walk(content_storage.path(root), root, after)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+    return {'after': '', 'files': 0, 'bytes': 0}
+
+
+def _write_checkpoint(path, state):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(temporary, path)
+
+
+def collect_garbage(dry_run=False, batch_size=1000, checkpoint=None):
+    """Удаляет файлы медиа без ссылок; возвращает число файлов и байт.
+
+    ``checkpoint`` — путь к файлу контрольной точки: с ним сборка
+    продолжает прерванный обход, а после полного прохода файл удаляется.
+    """
+    state = _read_checkpoint(checkpoint)
+    grace = time.time() - settings.MEDIA_RELEASE_GRACE
+    with tempfile.TemporaryDirectory() as directory:
+        live = _build_live_set(os.path.join(directory, 'live.sqlite3'))
+        try:
+            for batch in _batches(_media_files(state['after']), batch_size):
+                names = [name for name, _ in batch]
+                placeholders = ', '.join('?' * len(names))
+                alive = {row[0] for row in live.execute(
+                    f'SELECT name FROM live WHERE name IN ({placeholders})',
+                    names,
+                )}
+                for name, stat in batch:
+                    if name in alive or stat.st_mtime > grace:
+                        continue
+                    state['files'] += 1
+                    state['bytes'] += stat.st_size
+                    if not dry_run:
+                        _delete_orphan(name)
+                state['after'] = names[-1]
+                if checkpoint and not dry_run:
+                    _write_checkpoint(checkpoint, state)
+        finally:
+            live.close()
+    if checkpoint and not dry_run and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return state['files'], state['bytes']
+
+
+def _delete_orphan(name):
+    if not name.startswith(thumbnail_settings.THUMBNAIL_PREFIX):
+        # Ссылки хранилища миниатюр на исходник тоже больше не нужны.
+        default.kvstore.delete(
+            ImageFile(name, content_storage), delete_thumbnails=False)
+    content_storage.delete(name)
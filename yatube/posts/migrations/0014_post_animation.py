@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='animation',
+            field=models.FileField(blank=True, editable=False, upload_to='posts/animations/', verbose_name='Анимация'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:17
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_animation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='animation',
+            field=models.FileField(blank=True, db_index=True, editable=False, storage=core.storage.ContentAddressedStorage(), upload_to='posts/animations/', verbose_name='Анимация'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 11:10
+
+from django.db import migrations
+
+
+def clear_index(apps, schema_editor):
+    # Термины теперь основы слов без стоп-слов: старый индекс
+    # с исходными формами запросы больше не находят. Индекс только
+    # очищается — перестроить его: manage.py reindex_search.
+    alias = schema_editor.connection.alias
+    for name in ('SearchPosting', 'SearchDocument'):
+        apps.get_model('posts', name).objects.using(alias).all().delete()
+    if schema_editor.connection.vendor == 'sqlite':
+        tables = schema_editor.connection.introspection.table_names()
+        if 'posts_search' in tables:
+            schema_editor.execute('DELETE FROM posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0018_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(
+                db_constraint=False, help_text='Пожалуйста, укажите автора',
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='posts', to=settings.AUTH_USER_MODEL,
+                verbose_name='Автор'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(
+                blank=True, db_constraint=False,
+                help_text='Пожалуйста, укажите группу', null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='posts', to='posts.Group',
+                verbose_name='Группа'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='comments', to=settings.AUTH_USER_MODEL,
+                verbose_name='Автор'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_heavy(apps, schema_editor):
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.using(schema_editor.connection.alias).filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(heavy=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_sharding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='heavy',
+            field=models.BooleanField(
+                default=False, verbose_name='Тяжёлый автор'),
+        ),
+        migrations.RunPython(mark_heavy, migrations.RunPython.noop),
+    ]
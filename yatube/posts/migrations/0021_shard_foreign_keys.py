@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class AlterFieldOutsideShards(migrations.AlterField):
+    """``AlterField``, который не меняет схему баз-шардов.
+
+    Строки шарда ссылаются на авторов и группы из ``default``, поэтому
+    в шардах связи остаются без внешнего ключа (0019_sharding), а
+    остальные базы получают его обратно.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.alias not in settings.DATABASE_SHARDS:
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.alias not in settings.DATABASE_SHARDS:
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_usercounters_heavy'),
+    ]
+
+    operations = [
+        AlterFieldOutsideShards(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(
+                help_text='Пожалуйста, укажите автора',
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='posts', to=settings.AUTH_USER_MODEL,
+                verbose_name='Автор'),
+        ),
+        AlterFieldOutsideShards(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(
+                blank=True, help_text='Пожалуйста, укажите группу',
+                null=True, on_delete=django.db.models.deletion.SET_NULL,
+                related_name='posts', to='posts.Group',
+                verbose_name='Группа'),
+        ),
+        AlterFieldOutsideShards(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='comments', to=settings.AUTH_USER_MODEL,
+                verbose_name='Автор'),
+        ),
+    ]
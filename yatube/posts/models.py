@@ -1,6 +1,9 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, router
 from django.contrib.auth import get_user_model
 
+from core.storage import content_storage
+
 
 User = get_user_model()
 
@@ -13,12 +16,61 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание',
         help_text='Пожалуйста, добавьте описание')
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Записей')
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Название входит в поисковый индекс постов группы.
+        instance._loaded_title = instance.__dict__.get('title')
+        return instance
+
+
+class IdSequence(models.Model):
+    """Общая последовательность id постов и комментариев всех шардов.
+
+    Хранится только последняя выданная строка (``sharding.next_id``).
+    """
+
+    def __str__(self) -> str:
+        return str(self.pk)
+
+
+class ShardedModel(models.Model):
+    """Модель, строки которой при шардировании лежат в шардах.
+
+    Автоинкремент шарда выдал бы одинаковые id в разных шардах, поэтому
+    новая строка берёт id из ``IdSequence``. База новой строки — всегда
+    шард от роутера: ``objects.create()`` без подсказки передал бы
+    ``default``.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and settings.POST_SHARDS:
+            from posts.sharding import next_id
+            self.pk = next_id()
+            kwargs['force_insert'] = True
+            kwargs['using'] = router.db_for_write(type(self), instance=self)
+        super().save(*args, **kwargs)
+
+
+class PostQuerySet(models.QuerySet):
 
-class Post(models.Model):
+    def for_feed(self):
+        return self.select_related('author', 'group')
+
+
+MEDIA_FIELDS = ('image', 'animation')
+
+
+class Post(ShardedModel):
     text = models.TextField(
         verbose_name='Текст',
         help_text='Пожалуйста, напишите текст поста')
@@ -27,6 +79,8 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         help_text='Введите дату публикации'
     )
+    # Авторы и группы при шардировании лежат в default: в базах-шардах
+    # у этих связей нет внешнего ключа (0021_shard_foreign_keys).
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -43,17 +97,57 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=content_storage,
+        blank=True, db_index=True
     )
+    animation = models.FileField(
+        'Анимация',
+        upload_to='posts/animations/',
+        storage=content_storage,
+        blank=True, editable=False, db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев')
+    updated = models.DateTimeField(auto_now=True, verbose_name='Изменён')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты сортируются по (-pub_date, -id) с курсором по тем же
+        # полям: индекс отдаёт страницу без сортировки в памяти.
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date'),
+        )
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем группу из базы, чтобы при смене группы
+        # поправить счётчики записей обеих групп, и файлы, чтобы
+        # освободить заменённые.
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        instance._loaded_media = instance.media_names()
+        return instance
+
+    def media_names(self):
+        return {
+            field: str(self.__dict__.get(field) or '')
+            for field in MEDIA_FIELDS
+        }
 
-class Comment(models.Model):
+
+class Comment(ShardedModel):
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, blank=True,
         null=True,
@@ -70,6 +164,11 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name='Дата и время')
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created'),)
+
     def __str__(self) -> str:
         return self.text[:30]
 
@@ -85,7 +184,89 @@ class Follow(models.Model):
     class Meta:
         constraints = (
             models.UniqueConstraint(
-                fields=('user', 'author'), name='unique_following'),)       
+                fields=('user', 'author'), name='unique_following'),)
+        # Уникальный индекс начинается с user и не помогает выборкам
+        # подписчиков автора (раскладка ленты, счётчики).
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author'),)
 
     def __str__(self) -> str:
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='counters', verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Записей')
+    comments_count = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок')
+    # Посты автора не раскладываются по лентам подписчиков, а
+    # подмешиваются при чтении (posts.timeline).
+    heavy = models.BooleanField(
+        default=False, verbose_name='Тяжёлый автор')
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline', verbose_name='Читатель')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='timeline_entries', verbose_name='Пост')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_entry'),)
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date'),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.post_id}'
+
+
+class SearchDocument(models.Model):
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True,
+        related_name='search_document', verbose_name='Пост')
+    length = models.PositiveIntegerField(verbose_name='Длина')
+
+    def __str__(self) -> str:
+        return f'Документ {self.post_id}'
+
+
+class SearchPosting(models.Model):
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='search_postings', verbose_name='Пост')
+    term = models.CharField(max_length=64, verbose_name='Термин')
+    frequency = models.PositiveIntegerField(verbose_name='Частота')
+
+    class Meta:
+        # Уникальный индекс начинается с термина: по нему читаются
+        # списки постов термина и их число.
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'), name='unique_search_posting'),)
+
+    def __str__(self) -> str:
+        return f'{self.term}: {self.post_id}'
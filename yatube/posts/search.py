@@ -0,0 +1,418 @@
+"""Полнотекстовый поиск постов с ранжированием BM25.
+
+Документ индекса — пост: его текст, тексты комментариев и название
+группы, каждое поле со своим весом (``SEARCH_WEIGHTS``). Индекс
+обновляется сигналами в той же транзакции, что и данные, поэтому
+откат не оставляет в нём лишнего. Новый комментарий дописывается к
+документу (``add_comment``): остальные комментарии поста заново не
+читаются и не разбираются.
+
+На SQLite документы лежат в виртуальной таблице FTS5 ``posts_search``
+(``rowid`` — id поста), оценку считает встроенная ``bm25()``. На
+остальных базах работает переносимый индекс из таблиц
+``SearchDocument`` (длина документа) и ``SearchPosting`` (термин, пост,
+взвешенная частота): число постов термина и BM25 считаются тем же
+запросом, что выбирает страницу.
+
+Оба варианта возвращают queryset постов с аннотацией ``search_rank``
+(меньше — лучше), который листается ``CursorPaginator`` по
+``ORDERING``. Термины в индекс и в запрос попадают через один и тот же
+``core.tokenizer.tokenize``.
+
+Миграции индекс не строят: после них он пуст (``stale_databases``,
+проверка ``posts.W001``), заполняет его ``manage.py reindex_search``.
+"""
+import math
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Sum, Value, When)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from core.tokenizer import tokenize
+
+FIELDS = ('text', 'comments', 'group_title')
+TABLE = 'posts_search'
+ORDERING = ('search_rank', 'id')
+# Параметры BM25 те же, что у bm25() в FTS5.
+K1 = 1.2
+B = 0.75
+# Столько постов за раз: меньше предела параметров запроса SQLite.
+BATCH_SIZE = 500
+STATS_KEY = 'search:stats'
+STATS_TIMEOUT = 5 * 60
+
+Document = namedtuple('Document', ('id',) + FIELDS)
+
+CREATE_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+    f'{", ".join(FIELDS)}, '
+    # Термины уже приведены tokenize; remove_diacritics 0 не даёт
+    # FTS5 склеить «й» и «и».
+    "tokenize = 'unicode61 remove_diacritics 0')"
+)
+DROP_TABLE = f'DROP TABLE IF EXISTS {TABLE}'
+
+
+def fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        options = {row[0] for row in cursor.fetchall()}
+    return 'ENABLE_FTS5' in options
+
+
+def _nothing(queryset):
+    # Пустая выдача с той же аннотацией: её всё равно сортируют по ней.
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+def _related_model(model, name):
+    return model._meta.get_field(name).related_model
+
+
+class Fts5Index:
+    """Индекс в виртуальной таблице FTS5, оценка — ``bm25()``."""
+
+    name = 'fts5'
+
+    def __init__(self, model, using):
+        self.model = model
+        self.connection = connections[using]
+
+    def index(self, documents):
+        documents = list(documents)
+        self.remove([document.id for document in documents])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, {", ".join(FIELDS)}) '
+                f'VALUES (%s, {", ".join(["%s"] * len(FIELDS))})',
+                [
+                    [document.id] + [
+                        ' '.join(tokenize(getattr(document, field)))
+                        for field in FIELDS
+                    ]
+                    for document in documents
+                ],
+            )
+
+    def append(self, post_id, field, terms):
+        """Дописывает термины в поле документа; ``False`` — документа
+        в индексе нет."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {TABLE} SET {field} = trim({field} || ' ' || %s) "
+                f'WHERE rowid = %s', [' '.join(terms), post_id])
+            return cursor.rowcount > 0
+
+    def remove(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(ids))})', ids)
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+
+    def is_empty(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {TABLE} LIMIT 1')
+            return cursor.fetchone() is None
+
+    def search(self, queryset, terms):
+        # Термины состоят из букв и цифр, в кавычках FTS5 не примет их
+        # за операторы; пробел между фразами означает AND.
+        match = ' '.join(f'"{term}"' for term in terms)
+        weights = ', '.join(
+            str(float(settings.SEARCH_WEIGHTS[field])) for field in FIELDS)
+        post_table = self.model._meta.db_table
+        where = [f'{TABLE}.rowid = {post_table}.id', f'{TABLE} MATCH %s']
+        params = [match]
+        if settings.SEARCH_CANDIDATES:
+            # bm25() дорог, а у частого слова совпадений сотни тысяч:
+            # оцениваем только SEARCH_CANDIDATES самых новых из них.
+            # Граница по rowid — диапазон, который FTS5 отдаёт сам.
+            where.append(
+                f'{TABLE}.rowid >= COALESCE((SELECT rowid FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC '
+                f'LIMIT 1 OFFSET %s), 0)')
+            params.extend([match, settings.SEARCH_CANDIDATES - 1])
+        return queryset.extra(
+            tables=[TABLE], where=where, params=params,
+        ).annotate(search_rank=RawSQL(
+            f'bm25({TABLE}, {weights})', (), output_field=FloatField()))
+
+
+class PostingIndex:
+    """Переносимый индекс: длины документов и списки постов терминов."""
+
+    name = 'postings'
+
+    def __init__(self, model, using):
+        self.model = model
+        self.using = using
+        self.documents = _related_model(model, 'search_document')
+        self.postings = _related_model(model, 'search_postings')
+
+    def index(self, documents):
+        documents = list(documents)
+        self.remove([document.id for document in documents])
+        rows = []
+        lengths = []
+        for document in documents:
+            frequencies = Counter()
+            for field in FIELDS:
+                weight = settings.SEARCH_WEIGHTS[field]
+                for term in tokenize(getattr(document, field)):
+                    frequencies[term] += weight
+            lengths.append(self.documents(
+                post_id=document.id, length=sum(frequencies.values())))
+            rows.extend(
+                self.postings(
+                    post_id=document.id, term=term, frequency=frequency)
+                for term, frequency in frequencies.items()
+            )
+        self.documents.objects.using(self.using).bulk_create(lengths)
+        self.postings.objects.using(self.using).bulk_create(
+            rows, batch_size=BATCH_SIZE)
+
+    def append(self, post_id, field, terms):
+        """Добавляет частоты терминов поля к документу; ``False`` —
+        документа в индексе нет."""
+        weight = settings.SEARCH_WEIGHTS[field]
+        frequencies = Counter(terms)
+        found = self.documents.objects.using(self.using).filter(
+            post_id=post_id).update(
+                length=F('length') + sum(frequencies.values()) * weight)
+        if not found:
+            return False
+        postings = self.postings.objects.using(self.using).filter(
+            post_id=post_id)
+        existing = set(postings.filter(term__in=frequencies).values_list(
+            'term', flat=True))
+        # Одним UPDATE на каждое встреченное число повторов.
+        by_count = defaultdict(list)
+        for term in existing:
+            by_count[frequencies[term]].append(term)
+        for count, same in by_count.items():
+            postings.filter(term__in=same).update(
+                frequency=F('frequency') + count * weight)
+        self.postings.objects.using(self.using).bulk_create(
+            [
+                self.postings(
+                    post_id=post_id, term=term, frequency=count * weight)
+                for term, count in frequencies.items()
+                if term not in existing
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        return True
+
+    def remove(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        self.postings.objects.using(self.using).filter(
+            post_id__in=ids).delete()
+        self.documents.objects.using(self.using).filter(
+            post_id__in=ids).delete()
+
+    def clear(self):
+        self.postings.objects.using(self.using).all().delete()
+        self.documents.objects.using(self.using).all().delete()
+
+    def is_empty(self):
+        return not self.documents.objects.using(self.using).exists()
+
+    def stats(self):
+        """Число документов и средняя длина; кэшируются ненадолго."""
+        key = f'{STATS_KEY}:{self.using}'
+        stats = cache.get(key)
+        if stats is None:
+            totals = self.documents.objects.using(self.using).aggregate(
+                count=Count('pk'), length=Sum('length'))
+            count = totals['count']
+            stats = (count, totals['length'] / count if count else 0.0)
+            cache.set(key, stats, STATS_TIMEOUT)
+        return stats
+
+    def search(self, queryset, terms):
+        total, average_length = self.stats()
+        counts = dict(
+            self.postings.objects.using(self.using).filter(term__in=terms)
+            .values_list('term').annotate(count=Count('id')).order_by()
+        )
+        if len(counts) < len(terms) or not average_length:
+            # Какого-то термина нет ни в одном посте: все термины
+            # обязательны, как и в FTS5.
+            return _nothing(queryset)
+        idf = Case(
+            *(
+                When(search_postings__term=term, then=Value(math.log(
+                    1 + (total - count + 0.5) / (count + 0.5))))
+                for term, count in counts.items()
+            ),
+            output_field=FloatField(),
+        )
+        frequency = Cast('search_postings__frequency', FloatField())
+        length = Cast('search_document__length', FloatField())
+        score = ExpressionWrapper(
+            idf * frequency * (K1 + 1) / (frequency + K1 * (
+                1 - B + B * length / average_length)),
+            output_field=FloatField(),
+        )
+        return queryset.filter(search_postings__term__in=terms).annotate(
+            search_matches=Count('search_postings'),
+            search_rank=ExpressionWrapper(
+                -Sum(score), output_field=FloatField()),
+        ).filter(search_matches=len(terms))
+
+
+BACKENDS = {backend.name: backend for backend in (Fts5Index, PostingIndex)}
+
+
+def get_backend(model=None, using='default'):
+    """Индекс, выбранный ``SEARCH_BACKEND`` для базы ``using``.
+
+    ``model`` — модель поста; миграции передают историческую.
+    """
+    if model is None:
+        from posts.models import Post
+        model = Post
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        available = fts5_available(connections[using])
+        name = Fts5Index.name if available else PostingIndex.name
+    return BACKENDS[name](model, using)
+
+
+def documents(model, ids, using='default'):
+    """Документы индекса для постов ``ids``, которые ещё существуют."""
+    comment_model = _related_model(model, 'comments')
+    comments = defaultdict(list)
+    comment_rows = comment_model.objects.using(using).filter(
+        post_id__in=ids).order_by('post_id', 'id')
+    for post_id, text in comment_rows.values_list('post_id', 'text'):
+        comments[post_id].append(text)
+    posts = model.objects.using(using).filter(id__in=ids)
+    if using in settings.POST_SHARDS:
+        # Группы лежат в default, JOIN с ними в шарде невозможен.
+        rows = posts.values_list('id', 'text', 'group_id')
+        titles = dict(
+            _related_model(model, 'group').objects.filter(
+                id__in={row[2] for row in rows}).values_list('id', 'title'))
+        rows = [
+            (post_id, text, titles.get(group_id))
+            for post_id, text, group_id in rows]
+    else:
+        rows = posts.values_list('id', 'text', 'group__title')
+    return [
+        Document(post_id, text, '\n'.join(comments[post_id]), title or '')
+        for post_id, text, title in rows
+    ]
+
+
+def update(*ids, using='default'):
+    """Переиндексирует посты; удалённые убирает из индекса."""
+    ids = sorted({post_id for post_id in ids if post_id is not None})
+    backend = get_backend(using=using)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = set(ids[start:start + BATCH_SIZE])
+        found = documents(backend.model, batch, using)
+        backend.index(found)
+        backend.remove(batch - {document.id for document in found})
+
+
+def add_comment(post_id, text, using='default'):
+    """Дописывает в документ поста термины нового комментария.
+
+    Если поста в индексе ещё нет, он индексируется целиком.
+    """
+    terms = tokenize(text)
+    if not terms:
+        return
+    if not get_backend(using=using).append(post_id, 'comments', terms):
+        update(post_id, using=using)
+
+
+def remove(*ids, using='default'):
+    get_backend(using=using).remove(ids)
+
+
+def update_group(group_id, batch_size=BATCH_SIZE):
+    """Переиндексирует посты группы (сменилось название) по частям."""
+    from posts import sharding
+    from posts.models import Post
+    for using in sharding.databases():
+        ids = Post.objects.using(using).filter(
+            group_id=group_id).order_by('id').values_list('id', flat=True)
+        last = 0
+        while True:
+            batch = list(ids.filter(id__gt=last)[:batch_size])
+            if not batch:
+                break
+            update(*batch, using=using)
+            last = batch[-1]
+
+
+def reindex(model=None, using='default', batch_size=BATCH_SIZE, after=0):
+    """Переиндексирует посты с id больше ``after`` частями по batch_size.
+
+    Генератор: после каждой части, записанной своей транзакцией,
+    отдаёт ``(последний id, число постов в части)``. В памяти держится
+    только одна часть, а прерванный проход продолжается с ``after``.
+    """
+    backend = get_backend(model, using)
+    ids = backend.model.objects.using(using).order_by('id').values_list(
+        'id', flat=True)
+    while True:
+        batch = list(ids.filter(id__gt=after)[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic(using=using):
+            backend.index(documents(backend.model, batch, using))
+        after = batch[-1]
+        yield after, len(batch)
+
+
+def rebuild(model=None, using='default', batch_size=BATCH_SIZE):
+    """Строит индекс заново; возвращает число проиндексированных постов."""
+    get_backend(model, using).clear()
+    return sum(
+        count for _, count in reindex(model, using, batch_size))
+
+
+def stale_databases():
+    """Базы, где посты есть, а индекс пуст: миграции индекс не строят,
+    его заполняет ``manage.py reindex_search``."""
+    from posts import sharding
+    from posts.models import Post
+    return [
+        using for using in sharding.databases()
+        if Post.objects.using(using).exists()
+        and get_backend(using=using).is_empty()
+    ]
+
+
+def search_posts(query, queryset=None):
+    """Посты, содержащие все термины запроса, с ``search_rank``.
+
+    Пустой запрос (или запрос из одних разделителей) ничего не находит.
+    """
+    if queryset is None:
+        from posts.models import Post
+        queryset = Post.objects.all()
+    terms = list(dict.fromkeys(tokenize(query)))[:settings.SEARCH_MAX_TERMS]
+    if not terms:
+        return _nothing(queryset)
+    return get_backend(queryset.model, queryset.db).search(queryset, terms)
@@ -0,0 +1,258 @@
+"""Шардирование постов и комментариев по автору.
+
+Включается списком баз ``POST_SHARDS`` (``DB_SHARDS=N``); пока он пуст,
+всё лежит в ``default``, а функции модуля отдают выборки без изменений.
+Пост живёт в шарде ``shard_for(author_id)``, комментарии — рядом со
+своим постом, там же поисковый индекс поста. Пользователи, группы,
+подписки и счётчики остаются в ``default``.
+
+* id постов и комментариев выдаёт общая последовательность
+  ``IdSequence`` в ``default``: они уникальны во всех шардах и не
+  меняются при переносе в другой шард;
+* ``ShardRouter`` выбирает шард по подсказке ``instance``: автор
+  (``author.posts``), пост (``post.comments``), сам объект при
+  сохранении. Выборка без подсказки идёт в ``default``, поэтому ленты
+  и поиск по id берут ``scatter()`` — ту же выборку в каждом шарде;
+* ленты собирает ``CursorPaginator`` слиянием уже отсортированных по
+  ``(pub_date, id)`` выборок шардов;
+* внешних ключей на авторов и группы в шардах нет (миграция
+  ``0021_shard_foreign_keys``, базы из ``DATABASE_SHARDS``);
+* таблиц ``default`` в шарде нет, поэтому ``select_related`` выборки
+  шарда заменяется на ``prefetch_related`` (``local()``);
+* лента подписок при шардировании не раскладывается по читателям: её
+  собирает слияние постов подписок из шардов (``timeline``);
+* запись поста или комментария идёт в две базы: сам он — в шард, а
+  счётчики, id и сброс кэша — в ``default``; ``atomic()`` открывает
+  транзакцию в обеих, чтобы ошибка откатывала и строку шарда;
+* ``reshard()`` (команда ``reshard``) переносит посты и комментарии
+  авторов, чей шард изменился после смены ``POST_SHARDS``, в том числе
+  из ``default`` при включении шардирования.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.http import Http404
+from django.shortcuts import get_object_or_404 as get_or_404
+
+from posts import search
+from posts.models import Comment, IdSequence, Post, TimelineEntry
+from posts.utils import keeping_dates
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def databases():
+    """Базы, в которых лежат посты."""
+    return list(settings.POST_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def shard_for(author_id):
+    shards = settings.POST_SHARDS
+    if not shards:
+        return DEFAULT_DB_ALIAS
+    return shards[author_id % len(shards)]
+
+
+def by_shard(author_ids):
+    """Авторы, разложенные по своим шардам."""
+    found = defaultdict(list)
+    for author_id in author_ids:
+        found[shard_for(author_id)].append(author_id)
+    return found
+
+
+@contextmanager
+def atomic(using):
+    """Транзакция в ``default`` и, если это другая база, в ``using``.
+
+    Это не двухфазная фиксация: шард фиксируется первым, и если затем
+    не удастся ``default``, разошедшиеся счётчики поправит
+    ``reconcile_counters``.
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if using == DEFAULT_DB_ALIAS:
+            yield
+        else:
+            with transaction.atomic(using=using):
+                yield
+
+
+def next_id():
+    sequence = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+    pk = sequence.create().pk
+    # Последовательность продолжает последняя строка, прежние не нужны.
+    sequence.filter(pk__lt=pk).delete()
+    return pk
+
+
+def advance_sequence(value):
+    """Следующий id из последовательности будет больше ``value``."""
+    sequence = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+    if not value or sequence.filter(pk__gte=value).exists():
+        return
+    sequence.create(pk=value)
+    connection = connections[DEFAULT_DB_ALIAS]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(), [IdSequence]):
+            cursor.execute(sql)
+
+
+def _lookups(related, prefix=''):
+    for name, nested in related.items():
+        if nested:
+            yield from _lookups(nested, f'{prefix}{name}__')
+        else:
+            yield f'{prefix}{name}'
+
+
+def local(queryset):
+    """Выборка без JOIN с таблицами ``default``, если она идёт в шард."""
+    related = queryset.query.select_related
+    if queryset.db not in settings.POST_SHARDS or not isinstance(
+            related, dict):
+        return queryset
+    return queryset.select_related(None).prefetch_related(
+        *_lookups(related))
+
+
+def scatter(queryset):
+    """Та же выборка в каждой базе постов."""
+    if not enabled():
+        return [queryset]
+    return [local(queryset.using(alias)) for alias in settings.POST_SHARDS]
+
+
+def get_object_or_404(queryset, **kwargs):
+    """Объект из первого шарда, где он нашёлся."""
+    if not enabled():
+        return get_or_404(queryset, **kwargs)
+    for source in scatter(queryset):
+        found = source.filter(**kwargs).first()
+        if found is not None:
+            return found
+    raise Http404(f'Нет объекта {queryset.model._meta.object_name}')
+
+
+def locate(post_id):
+    """Шард поста или ``None``, если поста нет."""
+    for alias in databases():
+        if Post.objects.using(alias).filter(pk=post_id).exists():
+            return alias
+    return None
+
+
+class ShardRouter:
+    """Посты и комментарии — в шард автора поста, остальное — дальше
+    по списку роутеров."""
+
+    def _shard(self, model, instance):
+        if not enabled() or model not in (Post, Comment):
+            return None
+        if isinstance(instance, User):
+            # Комментарии пользователя разбросаны по шардам авторов
+            # постов, одного шарда для них нет.
+            return shard_for(instance.pk) if model is Post else None
+        if isinstance(instance, Post):
+            if instance._state.adding:
+                return shard_for(instance.author_id)
+            return instance._state.db
+        if isinstance(instance, Comment):
+            if not instance._state.adding:
+                return instance._state.db
+            if Comment.post.is_cached(instance) and instance.post:
+                return self._shard(Post, instance.post)
+            return locate(instance.post_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Все базы проекта — одна схема, а строки шарда ссылаются на
+        # пользователей и группы из default. Шард, ещё не включённый в
+        # POST_SHARDS, тоже своя база: в ней создаются права и типы
+        # содержимого при migrate.
+        if obj1._state.db in settings.DATABASES and (
+                obj2._state.db in settings.DATABASES):
+            return True
+        return None
+
+
+def _max_id(aliases):
+    return max(
+        (
+            model.objects.using(alias).aggregate(last=Max('pk'))['last'] or 0
+            for alias in aliases
+            for model in (Post, Comment)
+        ),
+        default=0,
+    )
+
+
+def _move(author_id, source, target, batch_size):
+    """Переносит посты автора с комментариями; отдаёт их число."""
+    ids = list(
+        Post.objects.using(source).filter(author_id=author_id)
+        .order_by('id').values_list('id', flat=True))
+    moved = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        posts = Post.objects.using(source).filter(id__in=batch)
+        comments = Comment.objects.using(source).filter(post_id__in=batch)
+        # Сначала копия, потом удаление: прерванный перенос безопасно
+        # повторить, а пока есть обе копии, ленты показывают одну.
+        with transaction.atomic(using=target), \
+                keeping_dates(Post), keeping_dates(Comment):
+            Post.objects.using(target).bulk_create(
+                list(posts), ignore_conflicts=True)
+            Comment.objects.using(target).bulk_create(
+                list(comments), ignore_conflicts=True)
+            search.update(*batch, using=target)
+        with transaction.atomic(using=source):
+            search.remove(*batch, using=source)
+            TimelineEntry.objects.using(source).filter(
+                post_id__in=batch).delete()
+            # Без сигналов: пост не удалён, а переехал, счётчики и файлы
+            # остаются как есть.
+            comments._raw_delete(source)
+            posts._raw_delete(source)
+        moved += len(batch)
+    return moved
+
+
+def reshard(sources=None, batch_size=BATCH_SIZE):
+    """Переносит посты авторов, чей шард по ``POST_SHARDS`` сменился.
+
+    ``sources`` — базы, где посты могут лежать сейчас: по умолчанию
+    ``default`` и все шарды. Генератор: отдаёт ``(автор, откуда, куда,
+    число постов)`` после переноса каждого автора.
+    """
+    if sources is None:
+        sources = [DEFAULT_DB_ALIAS, *settings.POST_SHARDS]
+    sources = list(dict.fromkeys(sources))
+    advance_sequence(_max_id(dict.fromkeys([*sources, *databases()])))
+    for source in sources:
+        authors = (
+            Post.objects.using(source).order_by('author_id')
+            .values_list('author_id', flat=True).distinct())
+        for author_id in list(authors):
+            target = shard_for(author_id)
+            if target == source:
+                continue
+            yield author_id, source, target, _move(
+                author_id, source, target, batch_size)
@@ -0,0 +1,182 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from posts import cache, counters, media, search, sharding, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def _bump(*scopes):
+    # Сразу — чтобы сам пишущий запрос не увидел старую страницу, и
+    # ещё раз после коммита: запрос, пришедший между ними, прочитал
+    # старые данные и мог закэшировать их под промежуточным поколением.
+    cache.bump(*scopes)
+    transaction.on_commit(lambda: cache.bump(*scopes))
+
+
+# Поля пользователя, которые видны в лентах с его постами.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login: имя тогда не перечитываем.
+    instance._loaded_names = None
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(NAME_FIELDS) & set(update_fields)):
+        return
+    instance._loaded_names = User.objects.filter(
+        pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, **kwargs):
+    loaded = instance._loaded_names
+    if created or loaded is None or loaded == tuple(
+            getattr(instance, field) for field in NAME_FIELDS):
+        return
+    group_ids = set()
+    for db in sharding.databases():
+        group_ids.update(
+            Post.objects.using(db).filter(author_id=instance.pk)
+            .exclude(group=None).order_by()
+            .values_list('group_id', flat=True).distinct())
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    _bump(
+        'global', f'author:{loaded[0]}', f'author:{instance.username}',
+        *(f'group:{slug}' for slug in slugs))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # Каскад удаляет только строки в базе пользователя; посты и
+    # комментарии в шардах удаляем сами, с сигналами.
+    for db in settings.POST_SHARDS:
+        Comment.objects.using(db).filter(author_id=instance.pk).delete()
+        Post.objects.using(db).filter(author_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+        counters.change_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    else:
+        old_group_id = getattr(instance, '_loaded_group_id', None)
+        if old_group_id != instance.group_id:
+            counters.change_group(old_group_id, -1)
+            counters.change_group(instance.group_id, 1)
+    _bump(*cache.post_scopes(
+        instance, getattr(instance, '_loaded_group_id', None)))
+    search.update(instance.id, using=instance._state.db)
+    instance._loaded_group_id = instance.group_id
+    loaded = getattr(instance, '_loaded_media', {})
+    current = instance.media_names()
+    replaced = [
+        name for field, name in loaded.items() if name != current[field]]
+    if replaced:
+        transaction.on_commit(lambda: media.release(*replaced))
+    instance._loaded_media = current
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change_group(instance.group_id, -1)
+    _bump(*cache.post_scopes(instance))
+    search.remove(instance.id, using=instance._state.db)
+    names = list(instance.media_names().values())
+    transaction.on_commit(lambda: media.release(*names))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, comments_count=1)
+        counters.change_post(instance.post_id, 1, instance._state.db)
+    if instance.post_id is None:
+        return
+    _bump(*cache.post_scopes(instance.post))
+    if created:
+        # Остальные комментарии поста уже в индексе: дописываем только
+        # этот, а не разбираем заново весь пост.
+        search.add_comment(
+            instance.post_id, instance.text, using=instance._state.db)
+    else:
+        search.update(instance.post_id, using=instance._state.db)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, comments_count=-1)
+    counters.change_post(instance.post_id, -1, instance._state.db)
+    post = Post.objects.using(instance._state.db).filter(
+        pk=instance.post_id).first()
+    if post is not None:
+        _bump(*cache.post_scopes(post))
+        search.update(post.id, using=instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.user_id, following_count=1)
+        counters.change_user(instance.author_id, followers_count=1)
+        timeline.mark_heavy(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+    # Счётчики подписок видны в профилях обоих.
+    _bump(
+        cache.author_scope(instance.author_id),
+        cache.author_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, following_count=-1)
+    counters.change_user(instance.author_id, followers_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    # Счётчики подписок видны в профилях обоих.
+    _bump(
+        cache.author_scope(instance.author_id),
+        cache.author_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    _bump(f'group:{instance.slug}', 'groups')
+    if not created and getattr(instance, '_loaded_title', None) != (
+            instance.title):
+        search.update_group(instance.id)
+    instance._loaded_title = instance.title
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты останутся без группы обычным UPDATE, без сигналов. В шардах
+    # внешних ключей на группы нет, там UPDATE делаем сами.
+    instance._post_ids = {
+        db: list(Post.objects.using(db).filter(
+            group_id=instance.pk).values_list('id', flat=True))
+        for db in sharding.databases()
+    }
+    for db in settings.POST_SHARDS:
+        Post.objects.using(db).filter(group_id=instance.pk).update(
+            group=None)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    _bump(f'group:{instance.slug}', 'groups')
+    for db, ids in getattr(instance, '_post_ids', {}).items():
+        search.update(*ids, using=db)
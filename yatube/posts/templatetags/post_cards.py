@@ -0,0 +1,13 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек постов страницы из кэша фрагментов:
+    ``{% post_cards page_obj as cards %}``."""
+    return [mark_safe(html) for html in cards.render(posts)]
@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import cards, thumbnails
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Классика', slug='classic', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        return self.client.get(reverse('posts:follow_index'))
+
+    def load(self, post):
+        return Post.objects.for_feed().get(pk=post.pk)
+
+    def test_card_is_shared_by_every_feed(self):
+        """Одна и та же карточка поста во всех лентах."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Война и мир')
+        html = cards.render([self.load(post)])[0]
+        self.assertIn('Лев Толстой', html)
+        self.assertIn(reverse('posts:group_list', args=('classic',)), html)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=('classic',)),
+            reverse('posts:profile', args=('author',)),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=война',
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), html)
+
+    def test_cached_card_is_not_rendered_again(self):
+        """Второй показ страницы берёт карточки из кэша."""
+        Post.objects.create(author=self.author, text='Анна Каренина')
+        self.assertIn('miss 1"', self.feed()['Server-Timing'])
+        response = self.feed()
+        self.assertIn('hit 1 miss 0"', response['Server-Timing'])
+        self.assertContains(response, 'Анна Каренина')
+
+    def test_edit_changes_card_version(self):
+        """Правка поста и новый комментарий меняют ключ карточки."""
+        post = Post.objects.create(author=self.author, text='Черновик')
+        key = cards.cache_key(self.load(post))
+        self.feed()
+        post.text = 'Воскресение'
+        post.save()
+        edited = cards.cache_key(self.load(post))
+        self.assertNotEqual(key, edited)
+        self.assertContains(self.feed(), 'Воскресение')
+        Comment.objects.create(post=post, author=self.reader, text='!')
+        self.assertNotEqual(cards.cache_key(self.load(post)), edited)
+        self.assertContains(self.feed(), 'Комментариев: 1')
+
+    def test_card_with_pending_thumbnail_is_not_cached(self):
+        """Карточка с ещё не готовой миниатюрой не попадает в кэш."""
+        post = Post.objects.create(
+            author=self.author, text='С картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF))
+        self.feed()
+        key = cards.cache_key(self.load(post))
+        self.assertIsNone(cache.get(key))
+        thumbnails.generate(post.image.name)
+        self.feed()
+        self.assertIsNotNone(cache.get(key))
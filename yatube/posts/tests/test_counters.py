@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Alex')
+        cls.author = User.objects.create_user(username='Petya')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug2',
+            description='Тестовое описание 2',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, смена группы и удаление записи меняют счётчики."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст', 'group': self.group.pk})
+        post = Post.objects.get(author=self.user)
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Текст', 'group': self.group2.pk})
+        self.group.refresh_from_db()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 1)
+        Post.objects.get(pk=post.pk).delete()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.counters(self.user).posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 0)
+
+    def test_comment_counters(self):
+        """Комментарий меняет счётчики записи и автора комментария."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'})
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.user).comments_count, 1)
+        Comment.objects.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(self.user).comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        url_kwargs = {'username': self.author.username}
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs=url_kwargs))
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs=url_kwargs))
+        self.assertEqual(self.counters(self.user).following_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs=url_kwargs))
+        self.assertEqual(self.counters(self.user).following_count, 0)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+
+    def test_profile_reads_counters(self):
+        """Профиль показывает счётчик, а не пересчитывает записи."""
+        Post.objects.create(author=self.author, text='Текст')
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': 'Petya'}))
+        self.assertEqual(response.context['counters'].posts_count, 7)
+
+    def test_reconcile_counters_command(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group)
+        Comment.objects.create(post=post, author=self.user, text='!')
+        Follow.objects.create(user=self.user, author=self.author)
+        UserCounters.objects.update(
+            posts_count=5, comments_count=5,
+            followers_count=5, following_count=5)
+        UserCounters.objects.filter(user=self.user).delete()
+        Group.objects.update(posts_count=3)
+        Post.objects.update(comments_count=3)
+        call_command('reconcile_counters', stdout=StringIO())
+        user_counters = self.counters(self.user)
+        author_counters = self.counters(self.author)
+        self.assertEqual(
+            (user_counters.comments_count, user_counters.following_count),
+            (1, 1))
+        self.assertEqual(
+            (author_counters.posts_count, author_counters.followers_count),
+            (1, 1))
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
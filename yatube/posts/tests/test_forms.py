@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -6,6 +7,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from core.storage import content_storage
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
@@ -13,6 +15,11 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def stored_name(name, content):
+    return content_storage.digest_name(
+        name, hashlib.sha256(content).hexdigest())
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsCreateTests(TestCase):
     @classmethod
@@ -32,6 +39,7 @@ class PostsCreateTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        cls.small_gif = small_gif
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -65,7 +73,7 @@ class PostsCreateTests(TestCase):
             Post.objects.filter(
                 group=self.group.pk,
                 text='Тестовый пост пост',
-                image='posts/small.gif'
+                image=stored_name('posts/small.gif', self.small_gif)
             ).exists())
 
     def test_post_edit_forms(self):
@@ -108,7 +116,7 @@ class PostsCreateTests(TestCase):
             Post.objects.filter(
                 group=self.group.pk,
                 text='Измененные текста на пост пост текст',
-                image='posts/small2.gif',
+                image=stored_name('posts/small2.gif', small_gif2),
             ).exists())
 
 
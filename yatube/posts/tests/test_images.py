@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from posts.forms import PostForm
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name, format_, size=(300, 200), frames=1, **params):
+    images = [
+        Image.new('RGB', size, color=(number * 40 % 256, 0, 0))
+        for number in range(frames)
+    ]
+    output = BytesIO()
+    images[0].save(
+        output, format_, save_all=frames > 1, append_images=images[1:],
+        **params)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100)
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def save_post(self, uploaded):
+        form = PostForm(data={'text': 'Текст'}, files={'image': uploaded})
+        self.assertTrue(form.is_valid(), form.errors)
+        post = form.save(commit=False)
+        post.author = self.user
+        post.save()
+        return Post.objects.get(pk=post.pk)
+
+    def test_large_photo_is_downscaled_without_exif(self):
+        """Большое фото уменьшается и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        post = self.save_post(
+            make_image('photo.jpg', 'JPEG', exif=exif.tobytes()))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(max(stored.size), 100)
+            self.assertFalse(stored.getexif())
+
+    def test_animated_gif_becomes_still(self):
+        """Из анимированного GIF остаётся первый кадр."""
+        post = self.save_post(make_image(
+            'animated.gif', 'GIF', size=(50, 50), frames=3, duration=50))
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(getattr(stored, 'n_frames', 1), 1)
+        Image.init()
+        if 'WEBP' in Image.SAVE:
+            self.assertTrue(post.animation.name.endswith('.webp'))
+        else:
+            self.assertFalse(post.animation)
+
+    def test_small_image_is_stored_unchanged(self):
+        """Картинку без лишнего не перекодируем."""
+        uploaded = make_image('small.png', 'PNG', size=(20, 10))
+        content = uploaded.read()
+        uploaded.seek(0)
+        post = self.save_post(uploaded)
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_budget_is_enforced(self):
+        """Слишком тяжёлые и слишком большие картинки не принимаются."""
+        cases = (
+            ({'IMAGE_MAX_BYTES': 100}, make_image('heavy.png', 'PNG')),
+            ({'IMAGE_MAX_PIXELS': 10 ** 6},
+             make_image('huge.gif', 'GIF', size=(2000, 1000))),
+        )
+        for limits, uploaded in cases:
+            with self.subTest(limits=limits), override_settings(**limits):
+                form = PostForm(
+                    data={'text': 'Текст'}, files={'image': uploaded})
+                self.assertIn('image', form.errors)
@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts import signals, thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_RELEASE_GRACE=0)
+@mock.patch.object(signals.transaction, 'on_commit', lambda func: func())
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile(name, content))
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.storage.exists(first.image.name))
+        first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(second.image.storage.exists(second.image.name))
+
+    def test_replaced_image_is_released(self):
+        """Заменённая при редактировании картинка удаляется."""
+        post = self.create_post('first.gif')
+        old_name = post.image.name
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={
+                'text': 'Новый текст',
+                'image': SimpleUploadedFile('other.gif', OTHER_GIF),
+            },
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_RELEASE_GRACE=60)
+class MediaGarbageCollectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('live.gif', SMALL_GIF))
+        thumbnails.generate(self.post.image.name)
+        self.storage = self.post.image.storage
+        self.live = [
+            os.path.relpath(os.path.join(directory, name), TEMP_MEDIA_ROOT)
+            for directory, _, files in os.walk(TEMP_MEDIA_ROOT)
+            for name in files
+        ]
+        self.orphans = [
+            'posts/aa/orphan.gif', 'posts/image_old.gif', 'cache/ab/cd/x.jpg']
+        for name in self.orphans + [self.post.image.name]:
+            path = self.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.path.exists(path):
+                with open(path, 'wb') as orphan:
+                    orphan.write(b'x' * 10)
+            os.utime(path, (0, 0))
+        self.fresh = 'posts/bb/uploading.gif'
+        self.storage.save(self.fresh, SimpleUploadedFile('f', b'fresh'))
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def gc(self, *args):
+        call_command('gc_media', *args, stdout=StringIO())
+
+    def test_dry_run_deletes_nothing(self):
+        """Пробный прогон ничего не удаляет."""
+        self.gc('--dry-run')
+        for name in self.orphans:
+            self.assertTrue(self.storage.exists(name))
+
+    def test_orphans_are_deleted(self):
+        """Удаляются только старые файлы без ссылок."""
+        self.assertGreater(len(self.live), 1)
+        self.gc('--batch-size', '2')
+        for name in self.orphans:
+            self.assertFalse(self.storage.exists(name), name)
+        for name in self.live:
+            self.assertTrue(self.storage.exists(name), name)
+        self.assertEqual(
+            len([name for name in os.listdir(self.storage.path('posts/bb'))
+                 if not name.startswith('.')]), 1)
+
+    def test_resume_from_checkpoint(self):
+        """Прерванная сборка продолжается после контрольной точки."""
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'gc.json')
+        with open(checkpoint, 'w') as state:
+            json.dump({'after': 'posts/aa/orphan.gif', 'files': 1,
+                       'bytes': 10}, state)
+        self.gc('--checkpoint', checkpoint)
+        self.assertTrue(self.storage.exists('posts/aa/orphan.gif'))
+        self.assertTrue(self.storage.exists('cache/ab/cd/x.jpg'))
+        self.assertFalse(self.storage.exists('posts/image_old.gif'))
+        self.assertFalse(os.path.exists(checkpoint))
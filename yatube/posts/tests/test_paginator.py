@@ -1,4 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.test import Client, TestCase
 from django.urls import reverse
 from yatube.settings import PAGE_SIZE
@@ -31,6 +34,7 @@ class PaginatorViewsTest(TestCase):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(PaginatorViewsTest.user)
+        cache.clear()
 
     def test_first_page_contains_ten_records(self):
         object_dict_page_1 = {
@@ -60,3 +64,37 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(response=response):
                 self.assertEqual(
                     len(response.context['page_obj']), post_number)
+
+    def test_cursor_navigation(self):
+        """Переход по курсору вперёд и назад без OFFSET."""
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context['page_obj']
+        next_cursor = first_page.paginator.next_cursor
+        self.assertIsNotNone(next_cursor)
+        second_page = self.guest_client.get(
+            url, {'cursor': next_cursor}).context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(len(second_page), SECOND_PAGE_POST_NUMBER)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        previous_page = self.guest_client.get(
+            url, {'cursor': second_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_cursor_page_has_no_count_query(self):
+        """Страница по курсору не считает COUNT(*)."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        cursor = self.guest_client.get(
+            url).context['page_obj'].paginator.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url, {'cursor': cursor})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), PAGE_SIZE)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+POST_NUMBERS = 15
+# Сессия, пользователь, записи страницы и одна выборка самой страницы
+# (группа или автор); число запросов не должно зависеть от PAGE_SIZE.
+FEED_QUERY_BUDGET = 4
+
+
+class FeedQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(POST_NUMBERS):
+            author = User.objects.create_user(
+                username=f'author{number}',
+                first_name='Автор', last_name=str(number)
+            )
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {number}')
+            Comment.objects.create(post=post, author=cls.reader, text='!')
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.author = author
+        cls.post = post
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def assertQueryBudget(self, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries)
+        )
+
+    def test_feed_pages_query_budget(self):
+        """Ленты укладываются в бюджет запросов к базе."""
+        budgets = {
+            reverse('posts:index'): FEED_QUERY_BUDGET,
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ): FEED_QUERY_BUDGET,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): FEED_QUERY_BUDGET,
+            reverse('posts:follow_index'): FEED_QUERY_BUDGET,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, budget)
+
+    def test_post_detail_query_budget(self):
+        """Комментарии не порождают запрос на каждого автора."""
+        for number in range(5):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=str(number))
+        self.assertQueryBudget(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            FEED_QUERY_BUDGET + 1
+        )
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.explain import explain_query_plan, plan_problems
+from posts.models import Comment, Follow, Group, Post
+from yatube.settings import PAGE_SIZE
+
+User = get_user_model()
+
+POST_NUMBERS = PAGE_SIZE * 2 + 3
+# Таблицы, которые растут вместе с сайтом: читать их целиком нельзя.
+LARGE_TABLES = (
+    'posts_post', 'posts_comment', 'posts_follow', 'posts_timelineentry',
+)
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2)
+class FeedQueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.heavy = User.objects.create_user(username='heavy')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.heavy)
+        Follow.objects.create(user=cls.author, author=cls.heavy)
+        for number in range(POST_NUMBERS):
+            for author in (cls.author, cls.heavy):
+                cls.post = Post.objects.create(
+                    author=author, group=cls.group, text=f'Пост {number}')
+                Comment.objects.create(
+                    post=cls.post, author=cls.reader, text='!')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def get_plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        plans = {
+            query['sql']: explain_query_plan(query['sql'])
+            for query in queries
+        }
+        return response, plans
+
+    def assertIndexedPlans(self, url):
+        response, plans = self.get_plans(url)
+        for sql, plan in plans.items():
+            problems = plan_problems(plan, LARGE_TABLES)
+            self.assertEqual(
+                problems, [],
+                f'{url}\n{sql}\n' + '\n'.join(plan)
+            )
+        return response
+
+    def test_feeds_are_read_by_index(self):
+        """Ленты читаются по индексу, без полного прохода и сортировки."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.assertIndexedPlans(url)
+                paginator = response.context['page_obj'].paginator
+                next_page = self.assertIndexedPlans(
+                    f'{url}?cursor={paginator.next_cursor}')
+                previous_cursor = next_page.context[
+                    'page_obj'].paginator.previous_cursor
+                self.assertIndexedPlans(f'{url}?cursor={previous_cursor}')
+
+    def test_post_detail_is_read_by_index(self):
+        """Пост и его комментарии выбираются по индексу."""
+        self.assertIndexedPlans(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+
+    def test_plan_problems(self):
+        """Полный проход и сортировка во временном B-дереве находятся."""
+        plan = [
+            'SCAN posts_post',
+            'SCAN django_content_type',
+            'SCAN posts_post USING INDEX post_pub_date',
+            'SEARCH posts_post USING INDEX post_author_pub_date (author_id=?)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]
+        self.assertEqual(
+            plan_problems(plan, LARGE_TABLES),
+            ['SCAN posts_post', 'USE TEMP B-TREE FOR ORDER BY'],
+        )
@@ -0,0 +1,207 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import checks, search
+from posts.models import Comment, Group, Post
+from yatube.settings import PAGE_SIZE
+
+User = get_user_model()
+
+
+class SearchIndexMixin:
+    backend = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Садоводы', slug='garden', description='Описание')
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return list(search.search_posts(query).order_by(*search.ORDERING))
+
+    def test_backend_is_selected(self):
+        """Настройка выбирает нужный индекс."""
+        self.assertEqual(search.get_backend().name, self.backend)
+
+    def test_results_are_ranked_by_bm25(self):
+        """Пост, где слово встречается чаще, стоит выше."""
+        once = Post.objects.create(author=self.author, text='кот и пёс')
+        twice = Post.objects.create(
+            author=self.author, text='кот кот и ещё раз кот')
+        Post.objects.create(author=self.author, text='только пёс')
+        self.assertEqual(self.found('кот'), [twice, once])
+        self.assertEqual(self.found('Кот пёс'), [once])
+        self.assertEqual(self.found('ёж'), [])
+        self.assertEqual(self.found(' ,. '), [])
+
+    def test_inflected_forms_match(self):
+        """Другие формы слова и «ё» вместо «е» тоже находятся."""
+        post = Post.objects.create(
+            author=self.author, text='Мы гуляли с котами по ёлочному парку')
+        self.assertEqual(self.found('кот'), [post])
+        self.assertEqual(self.found('гулять в парке'), [post])
+        self.assertEqual(self.found('елочные'), [post])
+        self.assertEqual(self.found('мы и с'), [])
+
+    def test_comments_and_group_title_are_indexed(self):
+        """Находятся слова из комментариев и из названия группы."""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group)
+        comment = Comment.objects.create(
+            post=post, author=self.author, text='отличный совет')
+        self.assertEqual(self.found('совет'), [post])
+        self.assertEqual(self.found('садоводы текст'), [post])
+        comment.delete()
+        self.assertEqual(self.found('совет'), [])
+
+    def test_new_comment_is_appended(self):
+        """Новый комментарий дописывается без чтения остальных, и оценка
+        та же, что после полной переиндексации."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        Comment.objects.create(
+            post=post, author=self.author, text='хороший совет')
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch.object(search, 'update') as update:
+            Comment.objects.create(
+                post=post, author=self.author, text='совет дня, совет')
+        update.assert_not_called()
+        self.assertFalse([
+            query for query in queries
+            if 'FROM "posts_comment"' in query['sql']
+        ])
+        ranks = list(search.search_posts('совет дня').values_list(
+            'search_rank', flat=True))
+        self.assertEqual(len(ranks), 1)
+        search.rebuild()
+        cache.clear()
+        self.assertEqual(
+            list(search.search_posts('совет дня').values_list(
+                'search_rank', flat=True)),
+            ranks)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка, смена названия группы и удаление обновляют индекс."""
+        post = Post.objects.create(
+            author=self.author, text='старое слово', group=self.group)
+        post.text = 'новое слово'
+        post.save()
+        self.assertEqual(self.found('старое'), [])
+        self.assertEqual(self.found('новое'), [post])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Огородники'
+        group.save()
+        self.assertEqual(self.found('садоводы'), [])
+        self.assertEqual(self.found('огородники'), [post])
+        group.delete()
+        self.assertEqual(self.found('огородники'), [])
+        post.delete()
+        self.assertEqual(self.found('слово'), [])
+
+    def test_rebuild_restores_index(self):
+        """Полная переиндексация находит все посты."""
+        post = Post.objects.create(author=self.author, text='потерянный')
+        search.get_backend().clear()
+        self.assertEqual(self.found('потерянный'), [])
+        self.assertEqual(search.rebuild(), 1)
+        cache.clear()
+        self.assertEqual(self.found('потерянный'), [post])
+
+    def test_empty_index_is_reported(self):
+        """Проверка предупреждает, что индекс пуст, а посты есть."""
+        self.assertEqual(checks.check_search_index(None), [])
+        Post.objects.create(author=self.author, text='пост')
+        self.assertEqual(checks.check_search_index(None), [])
+        search.get_backend().clear()
+        self.assertEqual(
+            [warning.id for warning in checks.check_search_index(None)],
+            ['posts.W001'])
+
+    def test_reindex_command(self):
+        """Команда переиндексирует посты частями."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'пост {number}')
+            for number in range(3)
+        ]
+        search.get_backend().clear()
+        out = StringIO()
+        call_command('reindex_search', batch_size=2, stdout=out)
+        self.assertIn('Проиндексировано постов: 3', out.getvalue())
+        cache.clear()
+        self.assertEqual(self.found('пост'), posts)
+
+    def test_view_pages_by_cursor(self):
+        """Выдача листается курсором и сохраняет запрос в ссылках."""
+        for number in range(PAGE_SIZE + 3):
+            Post.objects.create(
+                author=self.author, text='слово ' * (number + 1))
+        Post.objects.create(author=self.author, text='другое')
+        client = Client()
+        response = client.get(reverse('posts:search'), {'q': 'Слово'})
+        first = list(response.context['page_obj'])
+        self.assertEqual(len(first), PAGE_SIZE)
+        self.assertContains(
+            response, '?q=%D0%A1%D0%BB%D0%BE%D0%B2%D0%BE&amp;cursor=')
+        cursor = response.context['page_obj'].paginator.next_cursor
+        response = client.get(
+            reverse('posts:search'), {'q': 'Слово', 'cursor': cursor})
+        second = list(response.context['page_obj'])
+        self.assertEqual(len(second), 3)
+        ranked = first + second
+        self.assertEqual(ranked, self.found('слово'))
+        self.assertEqual(ranked[0].text.count('слово'), PAGE_SIZE + 3)
+        cursor = response.context['page_obj'].paginator.previous_cursor
+        response = client.get(
+            reverse('posts:search'), {'q': 'Слово', 'cursor': cursor})
+        self.assertEqual(list(response.context['page_obj']), first)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        post = Post.objects.create(author=self.author, text='редкое')
+        Post.objects.create(author=self.author, text='обычное')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'редкое'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [post])
+
+    def test_empty_query_renders_form(self):
+        """Без запроса страница показывает только форму."""
+        response = Client().get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['page_obj'])
+
+
+@override_settings(SEARCH_BACKEND='fts5')
+class Fts5SearchTests(SearchIndexMixin, TestCase):
+    backend = 'fts5'
+
+    @override_settings(SEARCH_CANDIDATES=2)
+    def test_fts5_ranks_only_newest_candidates(self):
+        """FTS5 оценивает только самые новые совпадения."""
+        old = Post.objects.create(author=self.author, text='кот кот кот')
+        posts = [
+            Post.objects.create(author=self.author, text='кот и пёс')
+            for _ in range(2)
+        ]
+        self.assertNotIn(old, self.found('кот'))
+        self.assertEqual(len(self.found('кот')), len(posts))
+
+
+@override_settings(SEARCH_BACKEND='postings')
+class PostingSearchTests(SearchIndexMixin, TestCase):
+    backend = 'postings'
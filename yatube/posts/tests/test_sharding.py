@@ -0,0 +1,168 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import search, sharding, thumbnails
+from posts.models import Comment, Follow, Group, IdSequence, Post, User
+
+SHARDS = ['shard0', 'shard1']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTests(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        cache.clear()
+        # Чётный и нечётный id: авторы попадают в разные шарды.
+        self.even = User.objects.create_user(id=10, username='even')
+        self.odd = User.objects.create_user(id=11, username='odd')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.client = Client()
+
+    def test_posts_are_stored_in_author_shard(self):
+        """Пост лежит в шарде автора, id уникальны во всех шардах."""
+        first = Post.objects.create(author=self.even, text='Чётный')
+        second = self.odd.posts.create(text='Нечётный')
+        self.assertEqual(first._state.db, 'shard0')
+        self.assertEqual(second._state.db, 'shard1')
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(list(self.odd.posts.all()), [second])
+
+    def test_sequence_keeps_last_row(self):
+        """Последовательность id не копит по строке на каждый пост."""
+        for number in range(3):
+            post = Post.objects.create(author=self.even, text=str(number))
+        self.assertEqual(
+            list(IdSequence.objects.values_list('pk', flat=True)), [post.pk])
+
+    def test_foreign_keys_are_dropped_only_in_shards(self):
+        """Внешние ключи на авторов и группы есть везде, кроме шардов."""
+        for alias, expected in (
+                ('default', {'auth_user', 'posts_group'}),
+                ('shard0', set())):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, Post._meta.db_table)
+            with self.subTest(alias=alias):
+                self.assertEqual(
+                    {
+                        constraint['foreign_key'][0]
+                        for constraint in constraints.values()
+                        if constraint['foreign_key']
+                    },
+                    expected)
+
+    def test_comment_is_stored_with_its_post(self):
+        """Комментарий ложится в шард поста, а не своего автора."""
+        post = Post.objects.create(author=self.odd, text='Пост')
+        comment = Comment.objects.create(
+            post_id=post.pk, author=self.even, text='Ответ')
+        self.assertEqual(comment._state.db, 'shard1')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(list(post.comments.all()), [comment])
+
+    def test_feeds_merge_shards(self):
+        """Ленты собирают посты всех шардов в порядке публикации."""
+        posts = [
+            Post.objects.create(
+                author=author, group=self.group, text=f'Пост {number}')
+            for number, author in enumerate(
+                (self.even, self.odd, self.odd, self.even))
+        ]
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=('group',)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    list(response.context['page_obj']), posts[::-1])
+        # Поиск сливает выдачи шардов по релевантности.
+        response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertCountEqual(response.context['page_obj'], posts)
+        self.client.force_login(self.even)
+        Follow.objects.create(user=self.even, author=self.odd)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [posts[2], posts[1]])
+
+    def test_post_detail_finds_shard(self):
+        """Страница поста и комментарий находят шард поста по id."""
+        post = Post.objects.create(
+            author=self.odd, group=self.group, text='Пост')
+        self.client.force_login(self.even)
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'Комментарий'})
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,)))
+        self.assertEqual(response.context['post'], post)
+        self.assertContains(response, 'Комментарий')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk + 100,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_failed_write_rolls_back_shard(self):
+        """Ошибка после записи в шард откатывает и её, а не только
+        default."""
+        self.client.force_login(self.odd)
+        with mock.patch.object(
+                thumbnails, 'schedule', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertFalse(Post.objects.using('shard1').exists())
+        post = Post.objects.create(author=self.odd, text='Пост')
+        with mock.patch.object(
+                search, 'add_comment', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(
+                    reverse('posts:add_comment', args=(post.pk,)),
+                    {'text': 'Комментарий'})
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_reshard_moves_posts_from_default(self):
+        """reshard раскладывает посты, созданные до шардирования."""
+        with override_settings(POST_SHARDS=[]):
+            post = Post.objects.create(author=self.odd, text='Старый пост')
+            Comment.objects.create(post=post, author=self.even, text='Да')
+        out = StringIO()
+        call_command('reshard', stdout=out)
+        self.assertIn('Перенесено авторов: 1, постов: 1', out.getvalue())
+        self.assertFalse(Post.objects.using('default').exists())
+        moved = Post.objects.using('shard1').get()
+        self.assertEqual(
+            (moved.pk, moved.pub_date), (post.pk, post.pub_date))
+        self.assertEqual(moved.comments.count(), 1)
+        self.assertEqual(
+            list(search.search_posts('старый', Post.objects.using(
+                'shard1'))), [moved])
+        # id новых постов не пересекаются с перенесёнными.
+        self.assertGreater(
+            Post.objects.create(author=self.odd, text='Новый').pk, post.pk)
+
+    def test_reshard_after_shard_count_change(self):
+        """После смены числа шардов посты переезжают к новым шардам."""
+        with override_settings(POST_SHARDS=['shard0']):
+            post = Post.objects.create(author=self.odd, text='Пост')
+        self.assertEqual(post._state.db, 'shard0')
+        moved = list(sharding.reshard(['shard0']))
+        self.assertEqual(moved, [(self.odd.pk, 'shard0', 'shard1', 1)])
+        self.assertEqual(sharding.locate(post.pk), 'shard1')
+
+    def test_reshard_requires_shards(self):
+        with override_settings(POST_SHARDS=[]):
+            with self.assertRaises(CommandError):
+                call_command('reshard', stdout=StringIO())
@@ -0,0 +1,206 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail.models import KVStore
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def create_post(self):
+        uploaded = SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        return Post.objects.get()
+
+    def test_pending_thumbnail_falls_back_to_original(self):
+        """Пока миниатюры нет, лента показывает оригинал и не ждёт её."""
+        post = self.create_post()
+        with mock.patch.object(
+                thumbnails.backend, 'get_thumbnail') as generate:
+            response = self.authorized_client.get(reverse('posts:index'))
+        generate.assert_not_called()
+        self.assertContains(response, f'src="{post.image.url}"')
+
+    @mock.patch.object(
+        thumbnails.transaction, 'on_commit', lambda func: func())
+    def test_post_create_generates_thumbnails(self):
+        """После создания поста миниатюры готовы до первого просмотра."""
+        post = self.create_post()
+        geometry, options = thumbnails.SIZES['card']
+        thumbnail = thumbnails.backend.get_cached(
+            post.image, geometry, **options)
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_finished_thumbnail_refreshes_cached_feed(self):
+        """Лента, закэшированная с оригиналом, обновляется миниатюрой."""
+        post = self.create_post()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{post.image.url}"')
+        thumbnails.generate(post.image.name)
+        geometry, options = thumbnails.SIZES['card']
+        thumbnail = thumbnails.backend.get_cached(
+            post.image, geometry, **options)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, f'src="{thumbnail.url}"')
+
+    def test_failed_variant_is_not_rescheduled(self):
+        """Упавший вариант не считается строящимся и не ставится в
+        очередь при каждом показе, пока не истечёт THUMBNAIL_RETRY_AFTER.
+        """
+        # Узкий вариант основного формата падает, остальные строятся.
+        _, narrow, broken, _ = next(thumbnails.variants('card'))
+        post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF))
+        get_thumbnail = thumbnails.backend.get_thumbnail
+
+        def fail_narrow(file_, geometry, **options):
+            if geometry == broken:
+                raise OSError('Не удалось сохранить миниатюру')
+            return get_thumbnail(file_, geometry, **options)
+
+        with mock.patch.object(
+                thumbnails.backend, 'get_thumbnail',
+                side_effect=fail_narrow):
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                thumbnails.generate(post.image.name)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            picture = thumbnails.picture(post.image)
+        schedule.assert_not_called()
+        self.assertFalse(picture['pending'])
+        self.assertNotIn(f' {narrow}w', picture['srcset'])
+        self.assertIn(' 960w', picture['srcset'])
+
+    def test_failed_main_variant_serves_original(self):
+        """Если не удался и основной вариант, показывается оригинал."""
+        post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF))
+        with mock.patch.object(
+                thumbnails.backend, 'get_thumbnail', side_effect=OSError):
+            with self.assertLogs('posts.thumbnails', 'ERROR'):
+                thumbnails.generate(post.image.name)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            picture = thumbnails.picture(post.image)
+        schedule.assert_not_called()
+        self.assertEqual(picture['src'], post.image.url)
+        self.assertFalse(picture['pending'])
+
+    def test_picture_lists_every_width_and_format(self):
+        """Картинка отдаётся в нескольких ширинах и новых форматах."""
+        post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF))
+        thumbnails.generate(post.image.name)
+        picture = thumbnails.picture(post.image)
+        for width in (*thumbnails.SRCSET_WIDTHS, 960):
+            self.assertIn(f' {width}w', picture['srcset'])
+        self.assertEqual(
+            [source['type'] for source in picture['sources']],
+            [thumbnails.MIME_TYPES[format_]
+             for format_ in thumbnails.modern_formats()],
+        )
+        avif = thumbnails.backend.thumbnail_file(
+            post.image, '960x339', format='AVIF')
+        self.assertTrue(avif.name.endswith('.avif'))
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, f'srcset="{picture["srcset"]}"')
+
+    def test_animation_is_served_only_on_post_detail(self):
+        """Необрезанная анимация не попадает в карточку ленты."""
+        post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF),
+            animation='posts/animations/small.webp')
+        thumbnails.generate(post.image.name)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, post.animation.url)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(
+            response, f'type="image/webp" srcset="{post.animation.url}"')
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        """Миниатюры всей страницы берутся одним запросом к хранилищу."""
+        posts = [
+            Post.objects.create(
+                author=self.user, text=str(number),
+                image=SimpleUploadedFile('small.gif', SMALL_GIF))
+            for number in range(3)
+        ]
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if KVStore._meta.db_table in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in posts:
+            self.assertNotContains(response, f'src="{post.image.url}"')
+
+    def test_warm_registers_thumbnails_from_disk(self):
+        """Команда находит на диске миниатюры, забытые хранилищем."""
+        post = Post.objects.create(
+            author=self.user, text='Текст',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF))
+        thumbnails.generate(post.image.name)
+        KVStore.objects.all().delete()
+        cache.clear()
+        geometry, options = thumbnails.SIZES['card']
+        self.assertIsNone(
+            thumbnails.backend.get_cached(post.image, geometry, **options))
+        call_command('warm_thumbnails', stdout=StringIO())
+        self.assertIsNotNone(
+            thumbnails.backend.get_cached(post.image, geometry, **options))
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from yatube.settings import PAGE_SIZE
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def follow_page(self, **params):
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'), params)
+        return response.context['page_obj']
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        Post.objects.create(author=self.other, text='Чужой текст')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(self.follow_page()), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет прошлые посты, отписка их убирает."""
+        posts = [
+            Post.objects.create(author=self.author, text=str(number))
+            for number in range(3)
+        ]
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(list(self.follow_page()), posts[::-1])
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(len(self.follow_page()), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_author_is_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        Follow.objects.create(user=self.other, author=self.author)
+        for number in range(PAGE_SIZE):
+            Post.objects.create(author=self.author, text=f'a{number}')
+            Post.objects.create(author=self.other, text=f'o{number}')
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author).exists())
+        expected = list(Post.objects.filter(
+            author__in=(self.author, self.other)).order_by('-pub_date'))
+        first_page = self.follow_page()
+        second_page = self.follow_page(
+            cursor=first_page.paginator.next_cursor)
+        self.assertEqual(list(first_page) + list(second_page), expected)
+        self.assertFalse(second_page.has_next())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_REFILL_BELOW=2)
+    def test_author_below_limit_gets_fanned_out(self):
+        """Посты, не разложенные, пока автор был тяжёлым, не пропадают:
+        отписка оставляет их чтению, а команда раскладывает."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(self.follow_page()), [post])
+        call_command('refill_timelines', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertFalse(timeline.is_heavy(self.author.pk))
+        self.assertEqual(list(self.follow_page()), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_REFILL_BELOW=1)
+    def test_author_near_limit_stays_heavy(self):
+        """Автор чуть ниже порога остаётся тяжёлым и не раскладывается."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Текст')
+        follow.delete()
+        call_command('refill_timelines', stdout=StringIO())
+        self.assertTrue(timeline.is_heavy(self.author.pk))
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(self.follow_page()), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_authors_are_read_one_by_one(self):
+        """Посты каждого тяжёлого автора читаются своей выборкой."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        posts = [
+            Post.objects.create(author=author, text='Текст')
+            for author in (self.author, self.other)
+        ]
+        entries, *sources = timeline.sources(self.reader)
+        self.assertCountEqual(
+            [list(source) for source in sources], [[post] for post in posts])
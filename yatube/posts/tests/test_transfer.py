@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from posts import transfer
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                          UserCounters)
+from posts.search import search_posts
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_DIR = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PUBLISHED = datetime(2020, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', first_name='Лев')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Поездка на море',
+            image=SimpleUploadedFile('sea.gif', SMALL_GIF))
+        Post.objects.filter(pk=self.post.pk).update(pub_date=PUBLISHED)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Красивые фотографии')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.path = os.path.join(TEMP_DIR, 'posts.ndjson.gz')
+        self.media = os.path.join(TEMP_DIR, 'media.tar')
+
+    def export(self):
+        out = StringIO()
+        call_command(
+            'export_posts', self.path, media=self.media, stdout=out)
+        return out.getvalue()
+
+    def test_export_import_roundtrip(self):
+        """Выгрузка загружается в пустую базу со всеми связями и файлами."""
+        image = self.post.image.name
+        output = self.export()
+        self.assertIn('post: 1', output)
+        self.assertIn('Файлов в архиве: 1', output)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+
+        out = StringIO()
+        call_command(
+            'import_posts', self.path, media=self.media,
+            batch_size=1, stdout=out)
+        self.assertIn('Загружено: 6', out.getvalue())
+        post = Post.objects.get()
+        self.assertEqual(post.pub_date, PUBLISHED)
+        self.assertEqual(post.image.name, image)
+        self.assertTrue(os.path.isfile(post.image.path))
+        self.assertEqual(post.group.slug, 'travel')
+        self.assertEqual(post.comments_count, 1)
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(post.author.first_name, 'Лев')
+        counters = UserCounters.objects.get(user__username='author')
+        self.assertEqual(
+            (counters.posts_count, counters.followers_count), (1, 1))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post).exists())
+        self.assertEqual(list(search_posts('фотография')), [post])
+
+    def test_import_twice_skips_existing_rows(self):
+        """Повторная загрузка не дублирует строки."""
+        self.export()
+        call_command('import_posts', self.path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_users_and_groups_are_matched_by_natural_key(self):
+        """Пользователи и группы сопоставляются по username и slug, а
+        занятые чужими строками id заменяются."""
+        author_id = self.author.pk
+        self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        stranger = User.objects.create_user(id=author_id, username='stranger')
+        User.objects.create_user(username='other')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            id=self.group.pk + 10, title='Путешествия', slug='travel',
+            description='Описание')
+
+        call_command('import_posts', self.path, stdout=StringIO())
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'author')
+        self.assertNotEqual(post.author_id, author_id)
+        self.assertEqual(post.group, group)
+        self.assertEqual(post.comments.get().author, reader)
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author=post.author).exists())
+        self.assertFalse(stranger.posts.exists())
+        self.assertEqual(Group.objects.count(), 1)
+
+    def test_taken_post_id_is_replaced(self):
+        """Пост, чей id занят чужим постом, загружается под новым id
+        вместе с комментариями, а повторная загрузка его не дублирует."""
+        post_id = self.post.pk
+        self.export()
+        Post.objects.all().delete()
+        stranger = User.objects.create_user(username='stranger')
+        taken = Post.objects.create(
+            id=post_id, author=stranger, text='Чужой пост')
+
+        for _ in range(2):
+            call_command('import_posts', self.path, stdout=StringIO())
+        post = Post.objects.get(author=self.author)
+        self.assertNotEqual(post.pk, post_id)
+        self.assertEqual(post.text, 'Поездка на море')
+        self.assertEqual(post.comments.get().author, self.reader)
+        self.assertFalse(taken.comments.exists())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_imported_posts_reach_existing_followers(self):
+        """Загруженный пост попадает в ленту уже подписанного читателя."""
+        line = json.dumps({
+            'model': 'post', 'id': self.post.pk + 1, 'text': 'Новый пост',
+            'pub_date': PUBLISHED.isoformat(), 'author_id': self.author.pk,
+            'group_id': None,
+        })
+        list(transfer.import_records([line]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post_id=self.post.pk + 1).exists())
+
+    def test_rejected_rows_are_transfer_errors(self):
+        """Строки, которые база не принимает, — TransferError."""
+        # Два новых пользователя с одним username в одном пакете.
+        lines = [
+            json.dumps({
+                'model': 'user', 'id': user_id, 'username': 'twin',
+                'first_name': '', 'last_name': '', 'email': '',
+                'is_active': True, 'date_joined': PUBLISHED.isoformat(),
+            })
+            for user_id in (100, 101)
+        ]
+        with self.assertRaisesMessage(transfer.TransferError, 'UNIQUE'):
+            list(transfer.import_records(lines))
+
+    def test_lines_are_records(self):
+        """Каждая строка выгрузки — одна запись JSON по порядку моделей."""
+        path = os.path.join(TEMP_DIR, 'posts.ndjson')
+        call_command('export_posts', path, stdout=StringIO())
+        with open(path, encoding='utf-8') as stream:
+            models = [json.loads(line)['model'] for line in stream]
+        self.assertEqual(
+            models, ['user', 'user', 'group', 'post', 'comment', 'follow'])
+
+    def test_broken_line_is_reported(self):
+        """Испорченная строка останавливает загрузку с номером строки."""
+        path = os.path.join(TEMP_DIR, 'broken.ndjson')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('{"model": "group", "id": 5}\n{oops\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            call_command('import_posts', path, stdout=StringIO())
@@ -1,10 +1,14 @@
 import shutil
 import tempfile
+import warnings
 from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 from django import forms
 from posts.models import Group, Post, Follow
@@ -163,32 +167,105 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post, first_object)
 
 
-class CacheTests(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.user = User.objects.create_user(username='Alex')
-        cls.post = Post.objects.create(
-            author=cls.user,
-            text='Тестовая пост'
-        )
+class CacheTests(TransactionTestCase):
+    # Поколения лент меняются после коммита, поэтому нужны настоящие
+    # транзакции.
 
     def setUp(self):
+        self.user = User.objects.create_user(username='Alex')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовая пост'
+        )
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_cache_index(self):
         """Тест кэширования страницы index.html"""
         first_state = self.authorized_client.get(reverse('posts:index'))
-        post = Post.objects.get(pk=1)
-        post.text = 'Измененный текст поста'
-        post.save()
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Изменено в обход модели')
         second_state = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first_state.content, second_state.content)
         cache.clear()
         third_state = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first_state.content, third_state.content)
 
+    def test_cache_invalidated_by_post_save(self):
+        """Сохранение поста сразу сбрасывает закэшированные ленты."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'Alex'}),
+        )
+        first_states = [self.authorized_client.get(url) for url in urls]
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Измененный текст поста'
+        post.save()
+        for url, first_state in zip(urls, first_states):
+            with self.subTest(url=url):
+                second_state = self.authorized_client.get(url)
+                self.assertNotEqual(
+                    first_state.content, second_state.content)
+                self.assertContains(second_state, 'Измененный текст поста')
+
+    def test_cache_is_invalidated_after_commit(self):
+        """Страница, закэшированная до коммита записи, после него не
+        отдаётся."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        with transaction.atomic():
+            Post.objects.create(author=self.user, text='Новый пост')
+            self.authorized_client.get(url)
+            # До коммита страница уже в кэше.
+            self.assertIsNone(self.authorized_client.get(url).context)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Новый пост')
+
+    def test_follow_invalidates_both_profiles(self):
+        """Подписка сбрасывает профиль и автора, и подписчика."""
+        author = User.objects.create_user(username='Пётр')
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'Alex'}),
+            reverse('posts:profile', kwargs={'username': 'Пётр'}),
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for url in urls:
+                self.authorized_client.get(url)
+            Follow.objects.create(user=self.user, author=author)
+            self.assertContains(
+                self.authorized_client.get(urls[0]), 'подписок: 1')
+            self.assertContains(
+                self.authorized_client.get(urls[1]), 'Подписчиков: 1')
+
+    def test_author_rename_invalidates_feeds(self):
+        """Новое имя автора сразу видно во всех лентах с его постами."""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(author=self.user, group=group, text='В группе')
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'Alex'}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        self.user.first_name = 'Алексей'
+        self.user.last_name = 'Толстой'
+        self.user.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.authorized_client.get(url), 'Алексей Толстой')
+
+    def test_cache_varies_by_user(self):
+        """Закэшированная страница не отдаётся другому пользователю."""
+        self.authorized_client.get(reverse('posts:index'))
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Пользователь: Alex')
+
 
 class Followtests(TestCase):
     @classmethod
@@ -0,0 +1,404 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Раньше ``{% thumbnail %}`` строил миниатюру прямо во время запроса, и
+первый читатель нового поста ждал, пока Pillow раскодирует, обрежет и
+сожмёт картинку. Теперь ``schedule`` после коммита ставит картинку в
+пул фоновых потоков, который строит все варианты из ``SIZES``, а
+шаблоны только смотрят в хранилище ключей sorl-thumbnail: пока
+миниатюры нет, показывается оригинал (или ``THUMBNAIL_PLACEHOLDER``).
+
+Каждый размер строится в нескольких ширинах (``SRCSET_WIDTHS``) и,
+кроме основного формата, в WebP и AVIF, если их умеет сохранять
+установленный Pillow. Из готовых вариантов ``{% post_image %}``
+собирает ``<picture>`` со ``srcset``, и мобильный браузер скачивает
+самый лёгкий подходящий файл.
+
+``prefetch`` находит миниатюры всех постов страницы одним
+``get_many`` к кэшу и одним запросом к таблице хранилища вместо
+отдельного поиска на каждый тег ``{% post_image %}``, а ``warm``
+при выкладке регистрирует в хранилище уже лежащие на диске миниатюры.
+
+Вариант, который не удалось построить (например, ошибка кодировщика
+AVIF), запоминается в кэше на ``THUMBNAIL_RETRY_AFTER`` секунд: до
+тех пор он не считается строящимся, и показ карточки не ставит
+картинку в очередь заново.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.templatetags.static import static
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+from posts import cache, sharding
+from posts.models import Post
+
+try:
+    import pillow_avif  # noqa: F401 — регистрирует AVIF в Pillow
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Размеры, которые используют шаблоны: имя -> (геометрия, опции).
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Дополнительные ширины для srcset; полная ширина размера есть всегда.
+SRCSET_WIDTHS = (320, 640)
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+FAILED_PREFIX = 'thumbnails:failed:'
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def modern_formats():
+    """Форматы из ``THUMBNAIL_MODERN_FORMATS``, которые умеет Pillow."""
+    Image.init()
+    return [
+        format_ for format_ in settings.THUMBNAIL_MODERN_FORMATS
+        if format_ in Image.SAVE
+    ]
+
+
+def variants(size):
+    """Варианты размера: (формат или None для основного, ширина,
+    геометрия, опции), от узкого к широкому."""
+    geometry, options = SIZES[size]
+    width, height = map(int, geometry.split('x'))
+    widths = sorted({*(w for w in SRCSET_WIDTHS if w < width), width})
+    for format_ in [None, *modern_formats()]:
+        for variant_width in widths:
+            variant_options = dict(options)
+            if format_ is not None:
+                variant_options['format'] = format_
+            variant_geometry = (
+                f'{variant_width}x{round(height * variant_width / width)}')
+            yield format_, variant_width, variant_geometry, variant_options
+
+
+def _failure_key(name, geometry, options):
+    raw = f'{name}|{geometry}|{serialize(options)}'
+    return FAILED_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+class PendingThumbnailBackend(ThumbnailBackend):
+    """Бэкенд, который умеет найти готовую миниатюру, не создавая её."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем же именем, что построит ``get_thumbnail``."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        # sorl-thumbnail не знает расширения AVIF.
+        format_ = options['format']
+        if format_ in EXTENSIONS:
+            return super()._get_thumbnail_filename(
+                source, geometry_string, options)
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        return '%s%s.%s' % (
+            thumbnail_settings.THUMBNAIL_PREFIX, path, format_.lower())
+
+    def get_cached(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+    def get_cached_many(self, requests):
+        """Готовые миниатюры для списка (картинка, геометрия, опции).
+
+        На место ещё не построенных миниатюр ставится ``None``.
+        """
+        thumbnails = [
+            self.thumbnail_file(file_, geometry, **options)
+            for file_, geometry, options in requests
+        ]
+        if not isinstance(default.kvstore, CachedDBKVStore):
+            return [default.kvstore.get(thumbnail) for thumbnail in thumbnails]
+        keys = [add_prefix(thumbnail.key) for thumbnail in thumbnails]
+        values = get_raw_many(keys)
+        return [
+            deserialize_image_file(values[key]) if key in values else None
+            for key in keys
+        ]
+
+
+def get_raw_many(keys):
+    """Пакетный ``_get_raw`` хранилища cached_db: кэш, затем база."""
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    metrics.count_cache(
+        'thumbnails', hits=len(values), misses=len(missing))
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        # Как и sorl-thumbnail, запоминаем и отсутствие ключа.
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        key: value for key, value in values.items()
+        if value != EMPTY_VALUE
+    }
+
+
+backend = PendingThumbnailBackend()
+
+
+def source_file(name):
+    """Исходник по имени из базы: ключи миниатюр зависят от хранилища."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def generate(name):
+    """Строит все варианты всех размеров из ``SIZES`` для картинки ``name``.
+
+    Ленты с этой картинкой могли попасть в кэш с оригиналом вместо
+    миниатюры, поэтому после сборки их поколения сбрасываются.
+    """
+    started = time.perf_counter()
+    try:
+        for size in SIZES:
+            for _, _, geometry, options in variants(size):
+                try:
+                    backend.get_thumbnail(
+                        source_file(name), geometry, **options)
+                except Exception:
+                    logger.exception(
+                        'Не удалось построить миниатюру %s %s для %s',
+                        geometry, options.get('format', ''), name)
+                    caches['default'].set(
+                        _failure_key(name, geometry, options), True,
+                        settings.THUMBNAIL_RETRY_AFTER)
+        for posts in sharding.scatter(Post.objects.all()):
+            for post in posts.filter(image=name):
+                cache.bump(*cache.post_scopes(post))
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+    finally:
+        metrics.observe_thumbnail(time.perf_counter() - started)
+        with _lock:
+            _pending.discard(name)
+
+
+def _run_in_worker(name):
+    try:
+        generate(name)
+    finally:
+        # У потока пула свои соединения с базой, закрываем их сами.
+        connections.close_all()
+
+
+def submit(name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if settings.THUMBNAIL_WORKERS:
+        _get_executor().submit(_run_in_worker, name)
+    else:
+        generate(name)
+
+
+def schedule(image):
+    """Ставит картинку в очередь, когда транзакция будет закоммичена."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: submit(name))
+
+
+def _lookup(images, sizes):
+    """Варианты картинок: {(картинка, размер): [(формат, ширина, файл)]}.
+
+    Для готового варианта ``файл`` — миниатюра, для неудавшегося —
+    ``None``; ещё не построенных в списке нет.
+    """
+    keys = []
+    requests = []
+    failure_keys = []
+    for image in images:
+        for size in sizes:
+            for format_, width, geometry, options in variants(size):
+                keys.append((image, size, format_, width))
+                requests.append((image, geometry, options))
+                failure_keys.append(
+                    _failure_key(image.name, geometry, options))
+    found = {}
+    thumbnails = backend.get_cached_many(requests)
+    failed = caches['default'].get_many(failure_keys)
+    for (image, size, format_, width), thumbnail, failure_key in zip(
+            keys, thumbnails, failure_keys):
+        variants_found = found.setdefault((image.name, size), [])
+        if thumbnail is not None or failure_key in failed:
+            variants_found.append((format_, width, thumbnail))
+    return found
+
+
+def prefetch(posts, sizes=('card',)):
+    """Заранее находит миниатюры картинок ``posts`` для ``picture``."""
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    found = _lookup([post.image for post in posts], sizes)
+    for post in posts:
+        post._thumbnails = {
+            size: found[post.image.name, size] for size in sizes}
+
+
+def picture(image, size='card', animated=False):
+    """Данные для ``<picture>``: запасной ``src``, его ``srcset`` и
+    источники в современных форматах из уже готовых вариантов;
+    ``pending`` — часть вариантов ещё строится.
+
+    С ``animated`` анимация WebP, если она есть у поста, идёт первым
+    источником. Она не обрезана по размеру, поэтому карточкам ленты её
+    не отдаём — только странице поста.
+    """
+    if not image:
+        return None
+    prefetched = getattr(image.instance, '_thumbnails', {})
+    if size in prefetched:
+        found = prefetched[size]
+    else:
+        found = _lookup([image], [size])[image.name, size]
+    full_width = int(SIZES[size][0].split('x')[0])
+    sources = []
+    animation = animated and getattr(image.instance, 'animation', None)
+    if animation:
+        sources.append({'type': 'image/webp', 'srcset': animation.url})
+    srcsets = {}
+    src = None
+    failed = False
+    for format_, width, thumbnail in found:
+        if thumbnail is None:
+            failed = failed or (format_ is None and width == full_width)
+            continue
+        srcsets.setdefault(format_, []).append(f'{thumbnail.url} {width}w')
+        if format_ is None and width == full_width:
+            src = thumbnail.url
+    # Не построенные и не упавшие варианты: например, добавился формат.
+    pending = len(found) < len(list(variants(size)))
+    if pending:
+        schedule(image)
+    if src is None:
+        # Основной вариант строится или не удался: показываем оригинал.
+        pending = not failed
+        if settings.THUMBNAIL_PLACEHOLDER and pending:
+            return {
+                'src': static(settings.THUMBNAIL_PLACEHOLDER),
+                'pending': True,
+            }
+        return {'src': image.url, 'sources': sources, 'pending': pending}
+    sources.extend(
+        {'type': MIME_TYPES[format_], 'srcset': ', '.join(srcset)}
+        for format_, srcset in srcsets.items() if format_ is not None
+    )
+    return {
+        'src': src,
+        'srcset': ', '.join(srcsets[None]),
+        'sizes': f'(max-width: {full_width}px) 100vw, {full_width}px',
+        'sources': sources,
+        'pending': pending,
+    }
+
+
+def _files_on_disk():
+    root = default.storage.path(thumbnail_settings.THUMBNAIL_PREFIX)
+    names = set()
+    for directory, _, files in os.walk(root):
+        relative = os.path.relpath(directory, default.storage.path(''))
+        names.update(
+            os.path.join(relative, name).replace(os.sep, '/')
+            for name in files
+        )
+    return names
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def warm(dry_run=False, batch_size=500):
+    """Регистрирует в хранилище ключей миниатюры из ``media/cache``.
+
+    Каталог миниатюр обходится один раз, а хранилище проверяется
+    пакетами картинок постов. Возвращает число миниатюр по исходам.
+    """
+    on_disk = _files_on_disk()
+    stats = {'registered': 0, 'known': 0, 'missing': 0}
+    images = chain.from_iterable(
+        posts.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct().iterator()
+        for posts in sharding.scatter(Post.objects.all()))
+    for names in _batches(images, batch_size):
+        requests = [
+            (source_file(name), geometry, options)
+            for name in names
+            for size in SIZES
+            for _, _, geometry, options in variants(size)
+        ]
+        found = backend.get_cached_many(requests)
+        for (source, geometry, options), thumbnail in zip(requests, found):
+            if thumbnail is not None:
+                stats['known'] += 1
+                continue
+            thumbnail = backend.thumbnail_file(source, geometry, **options)
+            if thumbnail.name not in on_disk:
+                stats['missing'] += 1
+                continue
+            stats['registered'] += 1
+            if not dry_run:
+                default.kvstore.get_or_set(source)
+                default.kvstore.set(thumbnail, source)
+    return stats
@@ -0,0 +1,217 @@
+"""Лента подписок, разложенная по читателям при записи (fan-out on write).
+
+Новый пост сразу копируется строкой ``TimelineEntry`` каждому
+подписчику автора, поэтому ``/follow/`` читает один диапазон индекса
+``(user, pub_date, post)``. Посты авторов, у которых подписчиков не
+меньше ``TIMELINE_FANOUT_LIMIT``, не раскладываются: их ленты
+подмешивают при чтении (fan-out on read), иначе один пост такого
+автора превращался бы в миллионы вставок. Автор, перешедший порог,
+помечается ``UserCounters.heavy`` и остаётся тяжёлым, пока подписчиков
+не станет меньше ``TIMELINE_REFILL_BELOW``; тогда команда
+``refill_timelines`` раскладывает его последние посты подписчикам
+(``refill``). Отписка сама ленты не перекладывает, а колебания около
+порога не перекладывают их снова и снова.
+
+При шардировании постов (``POST_SHARDS``) записи ленты не раскладываются:
+ленту собирает слияние постов подписок, прочитанных из их шардов.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.paginator import CursorPaginator
+from posts import sharding
+from posts.models import Follow, Post, TimelineEntry, UserCounters
+
+BATCH_SIZE = 1000
+ORDERING = ('-pub_date', '-post_id')
+
+
+def is_heavy(author_id):
+    return UserCounters.objects.filter(user_id=author_id, heavy=True).exists()
+
+
+def mark_heavy(author_id=None):
+    """Помечает тяжёлыми авторов, чьи подписчики дошли до порога."""
+    crossed = UserCounters.objects.filter(
+        heavy=False, followers_count__gte=settings.TIMELINE_FANOUT_LIMIT)
+    if author_id is not None:
+        crossed = crossed.filter(user_id=author_id)
+    return crossed.update(heavy=True)
+
+
+def fan_out(post):
+    if sharding.enabled() or is_heavy(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TimelineEntry(
+            user_id=user_id, post=post,
+            author_id=post.author_id, pub_date=post.pub_date,
+        ))
+        if len(batch) == BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    if user_id is None or author_id is None:
+        return
+    if sharding.enabled() or is_heavy(author_id):
+        return
+    _spread(author_id, _recent(author_id), [user_id])
+
+
+def backfill_follows(follows):
+    """Заполняет ленты пачки подписок, записанных без сигналов (импорт):
+    ``follows`` — пары (подписчик, автор). Последние посты каждого
+    автора читаются один раз на пачку."""
+    if sharding.enabled():
+        return
+    by_author = defaultdict(list)
+    for user_id, author_id in follows:
+        if user_id is not None and author_id is not None:
+            by_author[author_id].append(user_id)
+    heavy = _heavy(by_author)
+    for author_id, user_ids in by_author.items():
+        if author_id not in heavy:
+            _spread(author_id, _recent(author_id), user_ids)
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def refill(author_id):
+    """Раскладывает подписчикам посты автора, переставшего быть тяжёлым.
+
+    Пока автор был тяжёлым, его посты подмешивались при чтении; теперь
+    их никто не подмешает, поэтому последние ``TIMELINE_BACKFILL``
+    раскладываются каждому подписчику, как при новой подписке.
+    """
+    _spread(author_id, _recent(author_id))
+
+
+def fan_out_posts(posts):
+    """Раскладывает подписчикам пачку постов, записанных без сигналов
+    (импорт): ``posts`` — тройки (id, автор, дата публикации)."""
+    if sharding.enabled():
+        return
+    by_author = defaultdict(list)
+    for post_id, author_id, pub_date in posts:
+        by_author[author_id].append((post_id, pub_date))
+    heavy = _heavy(by_author)
+    for author_id, recent in by_author.items():
+        if author_id not in heavy:
+            _spread(author_id, recent)
+
+
+def _heavy(author_ids):
+    return set(UserCounters.objects.filter(
+        user_id__in=author_ids, heavy=True,
+    ).values_list('user_id', flat=True))
+
+
+def _recent(author_id):
+    return list(
+        Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list('pk', 'pub_date')
+        [:settings.TIMELINE_BACKFILL])
+
+
+def _spread(author_id, posts, followers=None):
+    """Копирует посты автора (пары id и даты) подписчикам: всем или
+    только ``followers``."""
+    if not posts:
+        return
+    if followers is None:
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list(
+            'user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for user_id in followers:
+        batch.extend(
+            TimelineEntry(
+                user_id=user_id, post_id=post_id,
+                author_id=author_id, pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        )
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def refill_light():
+    """Снимает пометку с тяжёлых авторов, у которых подписчиков стало
+    меньше ``TIMELINE_REFILL_BELOW``, и раскладывает их посты; отдаёт
+    id каждого автора."""
+    if sharding.enabled():
+        return
+    authors = UserCounters.objects.filter(
+        heavy=True, followers_count__lt=settings.TIMELINE_REFILL_BELOW,
+    ).values_list('user_id', flat=True)
+    for author_id in list(authors):
+        with transaction.atomic():
+            # Пометка снимается до раскладки: пост, записанный после
+            # коммита, разложится сам.
+            if UserCounters.objects.filter(
+                    user_id=author_id, heavy=True).update(heavy=False):
+                refill(author_id)
+        yield author_id
+
+
+def sources(user):
+    """Источники ленты: разложенные записи и посты «тяжёлых» авторов.
+
+    Посты каждого тяжёлого автора — своя выборка: пагинатор читает из
+    неё не больше страницы по индексу ``(author, -pub_date, -id)``, а
+    общую выборку по всем авторам базе пришлось бы сортировать целиком.
+    Порядок с записями ленты сводит слияние в пагинаторе.
+    """
+    if sharding.enabled():
+        return _shard_sources(user)
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
+    heavy = Follow.objects.filter(
+        user=user, author__counters__heavy=True,
+    ).values_list('author_id', flat=True)
+    return [entries, *(
+        Post.objects.for_feed().filter(author_id=author_id).annotate(
+            post_id=F('id'))
+        for author_id in heavy
+    )]
+
+
+def _shard_sources(user):
+    """Посты подписок: по одной выборке на шард."""
+    authors = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)
+    found = sharding.by_shard(authors)
+    return [
+        sharding.local(
+            Post.objects.using(db).for_feed().filter(author_id__in=ids)
+            .annotate(post_id=F('id')))
+        for db, ids in found.items()
+    ] or [Post.objects.none().annotate(post_id=F('id'))]
+
+
+def get_page(request):
+    paginator = CursorPaginator(
+        sources(request.user), settings.PAGE_SIZE, ordering=ORDERING,
+        with_page_range=settings.PAGINATOR_PAGE_RANGE,
+    )
+    page = paginator.get_page(
+        request.GET.get('page'), cursor=request.GET.get('cursor'))
+    page.object_list = [
+        row.post if isinstance(row, TimelineEntry) else row
+        for row in page.object_list
+    ]
+    return page
@@ -0,0 +1,417 @@
+"""Перенос постов между окружениями: NDJSON и tar с файлами.
+
+Экспорт — цепочка генераторов: выборки ``iterator(chunk_size=…)`` по
+возрастанию ``id`` → словари записей → строки JSON, по одной на запись
+(``{"model": "post", "id": 1, …}``). Порядок моделей — ``MODELS``:
+каждая запись ссылается только на уже выгруженные. Файлы постов
+(``image``, ``animation``) пишутся отдельным потоковым tar с путями
+относительно ``MEDIA_ROOT``.
+
+Импорт читает строки по одной, собирает подряд идущие записи модели в
+пакеты и пишет каждый пакет ``bulk_create`` в своей транзакции.
+Пользователи и группы сопоставляются по естественному ключу (``username``,
+``slug``): уже существующий не создаётся заново, а ссылки постов,
+комментариев и подписок переводятся на него; если id занят другой
+строкой, запись получает новый id. Посты и комментарии сохраняют свой
+id, если он свободен или занят ими же (та же строка того же автора);
+id, занятый чужой строкой, заменяется новым, и ссылки на запись
+переводятся на него. Подпискам id выдаёт база. Уже загруженное
+пропускается, поэтому прерванный импорт можно просто запустить заново.
+В памяти держится один пакет и таблица заменённых id; пользователи
+переносятся без паролей. Данные,
+которые база не принимает, дают ``TransferError``.
+
+``bulk_create`` не вызывает сигналов, поэтому производное состояние
+досчитывается по ходу и в конце: по пакетам создаются счётчики
+пользователей, сбрасываются страницы лент, новые посты раскладываются в
+ленты подписчиков, ленты подписок заполняются для новых подписок; в
+конце пересчитываются счётчики и переиндексируются затронутые посты.
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+from datetime import datetime
+from itertools import groupby
+
+from django.contrib.auth.hashers import make_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+
+from core.storage import content_storage
+from posts import cache, counters, search, sharding, timeline
+from posts.models import (
+    MEDIA_FIELDS, Comment, Follow, Group, Post, User, UserCounters)
+from posts.utils import keeping_dates
+
+CHUNK_SIZE = 2000
+# Команды печатают прогресс через столько записей.
+PROGRESS_EVERY = 100000
+
+MODELS = {
+    'user': (User, (
+        'id', 'username', 'first_name', 'last_name', 'email', 'is_active',
+        'date_joined')),
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', *MEDIA_FIELDS)),
+    'comment': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+}
+# Модели, которые сопоставляются по естественному ключу, и ссылки на них.
+NATURAL_KEYS = {'user': 'username', 'group': 'slug'}
+# Посты и комментарии сохраняют id, а тот же объект при повторном
+# импорте узнаётся по владельцу (те же поля без последнего) — строка с
+# тем же id — или по всем полям, если id при прошлом импорте заменился.
+IDENTITIES = {
+    'post': ('author_id', 'pub_date'),
+    'comment': ('post_id', 'author_id', 'created'),
+}
+REFERENCES = {
+    'post': {'author_id': 'user', 'group_id': 'group'},
+    'comment': {'post_id': 'post', 'author_id': 'user'},
+    'follow': {'user_id': 'user', 'author_id': 'user'},
+}
+
+
+class TransferError(Exception):
+    pass
+
+
+def open_ndjson(path, mode):
+    """Текстовый поток выгрузки: файл, .gz или «-» (stdin/stdout)."""
+    if path == '-':
+        return sys.stdout if mode == 'w' else sys.stdin
+    opener = gzip.open if path.endswith('.gz') else open
+    return opener(path, f'{mode}t', encoding='utf-8')
+
+
+def records(chunk_size=CHUNK_SIZE):
+    """Все записи для выгрузки, модель за моделью, по возрастанию id."""
+    for label, (model, fields) in MODELS.items():
+        rows = model.objects.order_by('pk').values(*fields)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield {'model': label, **row}
+
+
+def export(stream, chunk_size=CHUNK_SIZE):
+    """Пишет записи в текстовый поток, отдавая метку модели каждой."""
+    for item in records(chunk_size):
+        stream.write(json.dumps(
+            item, cls=DjangoJSONEncoder, ensure_ascii=False))
+        stream.write('\n')
+        yield item['model']
+
+
+def media_names(chunk_size=CHUNK_SIZE):
+    """Имена файлов постов; одинаковые имена подряд не повторяются."""
+    rows = Post.objects.order_by('pk').values_list(*MEDIA_FIELDS)
+    previous = set()
+    for names in rows.iterator(chunk_size=chunk_size):
+        current = {name for name in names if name}
+        yield from sorted(current - previous)
+        previous = current
+
+
+def export_media(fileobj, chunk_size=CHUNK_SIZE):
+    """Пишет файлы постов потоковым tar; отдаёт имя каждого файла."""
+    with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+        for name in media_names(chunk_size):
+            path = content_storage.path(name)
+            if not os.path.isfile(path):
+                continue
+            archive.add(path, arcname=name, recursive=False)
+            # TarFile копит TarInfo всех членов; при записи они не
+            # нужны, а на миллионах файлов это заметная память.
+            archive.members.clear()
+            yield name
+
+
+def decode(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as error:
+            raise TransferError(f'Строка {number}: {error}')
+        if item.get('model') not in MODELS:
+            raise TransferError(
+                f'Строка {number}: неизвестная модель {item.get("model")!r}')
+        yield item
+
+
+def batches(items, size):
+    """Пакеты подряд идущих записей одной модели, не больше size."""
+    for label, group in groupby(items, key=lambda item: item['model']):
+        batch = []
+        for item in group:
+            batch.append(item)
+            if len(batch) == size:
+                yield label, batch
+                batch = []
+        if batch:
+            yield label, batch
+
+
+def _datetime_fields(model, fields):
+    return [
+        field for field in fields
+        if isinstance(model._meta.get_field(field), models.DateTimeField)
+    ]
+
+
+DATETIME_FIELDS = {
+    label: _datetime_fields(model, fields)
+    for label, (model, fields) in MODELS.items()
+}
+
+
+def _build(label, item):
+    model, fields = MODELS[label]
+    values = {field: item.get(field) for field in fields}
+    for field in DATETIME_FIELDS[label]:
+        # fromisoformat на порядок быстрее разбора строки полем модели.
+        if values[field]:
+            values[field] = datetime.fromisoformat(values[field])
+    for field in MEDIA_FIELDS if model is Post else ():
+        values[field] = values[field] or ''
+    if model is User:
+        values['password'] = make_password(None)
+    return model(**values)
+
+
+def _remapped(label, batch, remap):
+    """Записи пакета со ссылками на заменённые id пользователей и групп."""
+    references = REFERENCES.get(label)
+    if not references:
+        return batch
+    return [
+        {
+            **item,
+            **{
+                field: remap[target].get(item[field], item[field])
+                for field, target in references.items()
+            },
+        }
+        for item in batch
+    ]
+
+
+def _create_by_natural_key(label, batch, remap):
+    """Создаёт пользователей или группы, которых ещё нет по ключу.
+
+    Записи, чей ключ уже есть в базе, сопоставляются с найденной
+    строкой; id, занятый строкой с другим ключом, заменяется новым.
+    Замены попадают в ``remap``.
+    """
+    model = MODELS[label][0]
+    key = NATURAL_KEYS[label]
+    existing = dict(model.objects.filter(
+        **{f'{key}__in': [item.get(key) for item in batch]}
+    ).values_list(key, 'pk'))
+    fresh = [item for item in batch if item.get(key) not in existing]
+    taken = set(model.objects.filter(
+        pk__in=[item['id'] for item in fresh]).values_list('pk', flat=True))
+    model.objects.bulk_create([
+        _build(label, {**item, 'id': None} if item['id'] in taken else item)
+        for item in fresh
+    ])
+    moved = [item.get(key) for item in fresh if item['id'] in taken]
+    existing.update(model.objects.filter(
+        **{f'{key}__in': moved}).values_list(key, 'pk'))
+    for item in batch:
+        target = existing.get(item.get(key), item['id'])
+        if target != item['id']:
+            remap[label][item['id']] = target
+
+
+def _identity(label, values):
+    """Значения полей ``IDENTITIES`` с датами, разобранными как в базе."""
+    return tuple(
+        datetime.fromisoformat(values[field])
+        if field in DATETIME_FIELDS[label] and isinstance(values[field], str)
+        else values[field]
+        for field in IDENTITIES[label]
+    )
+
+
+def _existing(label, identities):
+    if not identities:
+        return {}
+    model = MODELS[label][0]
+    fields = IDENTITIES[label]
+    found = model.objects.filter(**{
+        f'{field}__in': {identity[index] for identity in identities}
+        for index, field in enumerate(fields)
+    }).values_list(*fields, 'pk')
+    return {row[:-1]: row[-1] for row in found}
+
+
+def _create_keeping_ids(label, batch, remap):
+    """Создаёт посты или комментарии, которых ещё нет, с их id.
+
+    Строка с тем же id и тем же владельцем — уже импортированная
+    запись. Если id занят чужой строкой, запись ищется по всем полям
+    ``IDENTITIES`` (её id заменился при прошлом импорте) или создаётся
+    с новым id — при шардировании из ``IdSequence``. Замены попадают в
+    ``remap``; возвращает записи пакета с id, под которыми они лежат в
+    базе.
+    """
+    model = MODELS[label][0]
+    identities = {item['id']: _identity(label, item) for item in batch}
+    owners = {
+        row[0]: row[1:] for row in model.objects.filter(
+            pk__in=identities).values_list('pk', *IDENTITIES[label][:-1])
+    }
+    free = [item for item in batch if item['id'] not in owners]
+    foreign = [
+        item for item in batch
+        if item['id'] in owners
+        and owners[item['id']] != identities[item['id']][:-1]
+    ]
+    existing = _existing(
+        label, [identities[item['id']] for item in foreign])
+    moved = [
+        item for item in foreign if identities[item['id']] not in existing]
+    model.objects.bulk_create([
+        *(_build(label, item) for item in free),
+        *(_build(label, {**item, 'id': _new_id()}) for item in moved),
+    ])
+    if free and sharding.enabled():
+        sharding.advance_sequence(max(item['id'] for item in free))
+    if moved:
+        existing.update(_existing(
+            label, [identities[item['id']] for item in moved]))
+    for item in foreign:
+        remap[label][item['id']] = existing[identities[item['id']]]
+    return [
+        {**item, 'id': remap[label].get(item['id'], item['id'])}
+        for item in batch
+    ]
+
+
+def _new_id():
+    return sharding.next_id() if sharding.enabled() else None
+
+
+def _create_counters(user_ids):
+    """Счётчики пакета пользователей: ``reconcile`` в конце импорта
+    тогда не собирает недостающие строки всех пользователей разом."""
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=pk) for pk in user_ids], ignore_conflicts=True)
+
+
+def _after_posts(batch):
+    author_ids = {item['author_id'] for item in batch}
+    group_ids = {item['group_id'] for item in batch} - {None}
+    usernames = User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True)
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    scopes = [
+        'global', *(f'author:{name}' for name in usernames),
+        *(f'group:{slug}' for slug in slugs)]
+    cache.bump(*scopes)
+    transaction.on_commit(lambda: cache.bump(*scopes))
+    # Сохранённые строки, а не записи: пропущенный пост мог быть чужим.
+    timeline.fan_out_posts(Post.objects.filter(
+        pk__in=[item['id'] for item in batch],
+        author_id__in=author_ids,
+    ).values_list('pk', 'author_id', 'pub_date'))
+
+
+def _after_follows(batch):
+    timeline.backfill_follows(
+        (item['user_id'], item['author_id']) for item in batch)
+
+
+def _load(label, batch, remap):
+    """Пишет пакет и досчитывает по нему производное состояние."""
+    if label in NATURAL_KEYS:
+        _create_by_natural_key(label, batch, remap)
+    elif label in IDENTITIES:
+        batch = _create_keeping_ids(label, batch, remap)
+    else:
+        # Подписка узнаётся по паре (подписчик, автор), id ей выдаёт база.
+        Follow.objects.bulk_create(
+            [_build(label, {**item, 'id': None}) for item in batch],
+            ignore_conflicts=True)
+    if label == 'user':
+        _create_counters(
+            remap['user'].get(item['id'], item['id']) for item in batch)
+    elif label == 'post':
+        _after_posts(batch)
+    elif label == 'follow':
+        _after_follows(batch)
+    return batch
+
+
+def import_records(lines, batch_size=CHUNK_SIZE):
+    """Загружает записи из строк NDJSON; отдаёт (модель, размер пакета).
+
+    После последнего пакета пересчитывает счётчики и индекс поиска
+    для постов начиная с наименьшего затронутого id.
+    """
+    first_post_id = None
+    remap = {label: {} for label in (*NATURAL_KEYS, *IDENTITIES)}
+    for label, batch in batches(decode(lines), batch_size):
+        model = MODELS[label][0]
+        batch = _remapped(label, batch, remap)
+        try:
+            with transaction.atomic(), keeping_dates(model):
+                batch = _load(label, batch, remap)
+        except IntegrityError as error:
+            raise TransferError(
+                f'Записи {label} с id {batch[0]["id"]}–{batch[-1]["id"]}: '
+                f'{error}')
+        if label in ('post', 'comment'):
+            key = 'id' if label == 'post' else 'post_id'
+            first_post_id = min(filter(None, (
+                first_post_id, *(item[key] for item in batch))), default=None)
+        yield label, len(batch)
+    with transaction.atomic():
+        counters.reconcile()
+        timeline.mark_heavy()
+    if first_post_id is not None:
+        for _ in search.reindex(after=first_post_id - 1):
+            pass
+
+
+def _safe_member(member):
+    if not member.isfile():
+        return False
+    name = member.name
+    return not (os.path.isabs(name) or '..' in name.split('/'))
+
+
+def import_media(fileobj):
+    """Распаковывает файлы постов из потокового tar; отдаёт имена.
+
+    Файл с тем же именем уже есть — для хранилища по содержимому это
+    тот же файл, он не перезаписывается.
+    """
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if not _safe_member(member):
+                continue
+            path = content_storage.path(member.name)
+            if not os.path.exists(path):
+                directory = os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                source = archive.extractfile(member)
+                descriptor, temporary = tempfile.mkstemp(
+                    dir=directory, prefix='.import-')
+                try:
+                    with os.fdopen(descriptor, 'wb') as output:
+                        shutil.copyfileobj(source, output)
+                    os.replace(temporary, path)
+                except BaseException:
+                    if os.path.exists(temporary):
+                        os.remove(temporary)
+                    raise
+            archive.members.clear()
+            yield member.name
@@ -0,0 +1,30 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from core.paginator import CursorPaginator
+
+
+def paginate(request, post_list, ordering=('-pub_date', '-id')):
+    paginator = CursorPaginator(
+        post_list, settings.PAGE_SIZE, ordering=ordering,
+        with_page_range=settings.PAGINATOR_PAGE_RANGE,
+    )
+    return paginator.get_page(
+        request.GET.get('page'), cursor=request.GET.get('cursor'))
+
+
+@contextmanager
+def keeping_dates(model):
+    """Не даёт auto_now_add затереть перенесённые даты."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
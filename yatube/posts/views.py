@@ -1,20 +1,23 @@
-from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
-from yatube.settings import PAGE_SIZE
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.http import urlencode
 from posts.models import Post, Group, User, Follow
+from posts import sharding, thumbnails, timeline
+from posts.cache import cached_feed
+from posts.counters import get_counters
 from posts.forms import PostForm, CommentForm
+from posts.search import ORDERING as SEARCH_ORDERING, search_posts
+from posts.utils import paginate
 
 
-@cache_page(20, key_prefix='index_page')
+@cached_feed('global', 'groups')
 def index(request):
     title = 'Последние обновления на сайте'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PAGE_SIZE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = sharding.scatter(Post.objects.for_feed())
+    page_obj = paginate(request, post_list)
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -22,12 +25,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cached_feed('group:{slug}', 'groups')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_posts_list = group.posts.all()
-    paginator = Paginator(group_posts_list, PAGE_SIZE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group_posts_list = sharding.scatter(group.posts.for_feed())
+    page_obj = paginate(request, group_posts_list)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,21 +37,20 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cached_feed('author:{username}', 'groups')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    authors = User.objects.select_related('counters')
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, PAGE_SIZE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        authors = authors.annotate(is_followed=Exists(Follow.objects.filter(
+            user=request.user, author=OuterRef('pk')
+        )))
+    author = get_object_or_404(authors, username=username)
+    following = getattr(author, 'is_followed', False)
+    post_list = sharding.local(author.posts.for_feed())
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
-        'user_posts': post_list,
+        'counters': get_counters(author),
         'author': author,
         'following': following
     }
@@ -57,10 +58,13 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    post_author = post.author
-    user_posts_count = post_author.posts.count()
-    comments = post.comments.all()
+    post = sharding.get_object_or_404(
+        Post.objects.for_feed().select_related('author__counters'),
+        id=post_id
+    )
+    user_posts_count = get_counters(post.author).posts_count
+    comments = sharding.local(
+        post.comments.select_related('author').order_by('created'))
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -79,13 +83,15 @@ def post_create(request):
         return render(request, 'posts/create_post.html', context)
     post = form.save(commit=False)
     post.author = request.user
-    form.save()
+    with sharding.atomic(sharding.shard_for(request.user.pk)):
+        form.save()
+        thumbnails.schedule(post.image)
     return redirect('posts:profile', username=post.author)
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_object_or_404(Post.objects.all(), id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.id)
     if request.method != 'POST':
@@ -103,33 +109,51 @@ def post_edit(request, post_id):
             'is_edit': True, 'post_id': post.id
         }
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    with sharding.atomic(post._state.db):
+        form.save()
+        thumbnails.schedule(post.image)
     return redirect('posts:post_detail', post_id=post.id)
 
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_object_or_404(Post.objects.all(), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with sharding.atomic(post._state.db):
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, PAGE_SIZE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.get_page(request)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        post_list = [
+            search_posts(query, source)
+            for source in sharding.scatter(Post.objects.for_feed())
+        ]
+        page_obj = paginate(request, post_list, ordering=SEARCH_ORDERING)
+    context = {
+        'query': query,
+        'query_prefix': urlencode({'q': query}) + '&',
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
@@ -139,6 +163,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=request.user, author=author)
@@ -0,0 +1,25 @@
+"""Настройки yatube: профиль выбирается переменной окружения DJANGO_ENV.
+
+* dev (по умолчанию) — разработка: DEBUG, шаблоны читаются с диска;
+* test — прогон тестов: быстрый хешер паролей, без разогрева шаблонов;
+* prod — боевой: постоянные соединения с базой и их проверка, WAL и
+  прагмы SQLite, кэш и разогрев шаблонов; ключ — DJANGO_SECRET_KEY.
+
+Профиль можно указать и напрямую: DJANGO_SETTINGS_MODULE=yatube.settings.prod.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('dev', 'test', 'prod')
+PROFILE = os.getenv('DJANGO_ENV', 'dev')
+
+if PROFILE == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif PROFILE == 'test':
+    from .test import *  # noqa: F401,F403
+elif PROFILE == 'dev':
+    from .dev import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(
+        f'DJANGO_ENV={PROFILE}: нет такого профиля, есть {", ".join(PROFILES)}')
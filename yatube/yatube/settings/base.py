@@ -0,0 +1,342 @@
+"""
+Общие настройки проекта yatube для всех профилей.
+
+Профиль выбирает переменная окружения DJANGO_ENV (dev, test, prod),
+см. yatube/settings/__init__.py.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# SECURITY WARNING: keep the secret key used in production secret!
+# Профили dev и test подставляют свой ключ, prod без него не запустится
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.getenv(
+    'DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1,[::1],testserver',
+).split(',')
+
+# Кэш выбирается переменными окружения: CACHE_BACKEND=locmem|file|sqlite
+# (в prod по умолчанию sqlite), CACHE_LOCATION — каталог или файл общего
+# кэша, CACHE_L1=1 ставит перед общим кэшем LRU в памяти каждого процесса
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+}
+CACHE_LOCATIONS = {
+    'locmem': '',
+    'file': os.path.join(BASE_DIR, 'cache'),
+    'sqlite': os.path.join(BASE_DIR, 'cache.sqlite3'),
+}
+
+
+def cache_settings(backend):
+    """CACHES для общего кэша ``backend`` (и L1 перед ним при CACHE_L1)."""
+    shared = {
+        'BACKEND': CACHE_BACKENDS[backend],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_LOCATIONS[backend]),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+    }
+    if os.getenv('CACHE_L1', '') != '1':
+        return {'default': shared}
+    return {
+        'default': {
+            'BACKEND': 'core.cache_backends.TieredCache',
+            'OPTIONS': {
+                'L2': 'shared',
+                'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000)),
+                'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', 5)),
+                'L1_SKIP_PREFIXES': ['feed:v:'],
+            },
+        },
+        'shared': shared,
+    }
+
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHES = cache_settings(CACHE_BACKEND)
+
+CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'posts.apps.PostsConfig',
+    'users.apps.UsersConfig',
+    'core.apps.CoreConfig',
+    'benchmarks.apps.BenchmarksConfig',
+    'django.forms',
+    'sorl.thumbnail',
+]
+
+MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.routers.ReplicaMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiler.ProfilerMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+# Профиль prod оборачивает загрузчики в cached.Loader
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'core.metrics.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'core.context_processors.year.year',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+# База задаётся переменными окружения DB_*; по умолчанию — файл SQLite
+DATABASES = {
+    'default': {
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', ''),
+        'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+    }
+}
+# Реплика для чтения (core.routers): DB_REPLICA_NAME — база реплики с
+# теми же остальными параметрами, что у основной (DB_REPLICA_HOST —
+# другой сервер). Локально это второй файл SQLite, который наполняет
+# команда sync_replica. GET-запросы читают с реплики; запрос, который
+# писал в базу, и следующие REPLICA_STICKY_SECONDS секунд запросы того
+# же браузера читают с основной базы, чтобы автор видел свою правку
+if os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'TEST': {'MIRROR': 'default'},
+    }
+# Шардирование постов и комментариев по автору (posts.sharding):
+# DB_SHARDS=N добавляет базы shard0…shardN-1 с теми же параметрами, что
+# у основной, и именами по шаблону DB_SHARD_NAME; пусто — всё в default.
+# После смены числа шардов посты переносит команда reshard
+POST_SHARDS = [f'shard{number}' for number in range(
+    int(os.getenv('DB_SHARDS') or 0))]
+for number, alias in enumerate(POST_SHARDS):
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(
+            'DB_SHARD_NAME',
+            os.path.join(BASE_DIR, 'db.shard{}.sqlite3')).format(number),
+    }
+# Базы-шарды из DATABASES: миграции не создают в них внешних ключей
+# постов и комментариев на авторов и группы
+DATABASE_SHARDS = list(POST_SHARDS)
+DATABASE_REPLICAS = [
+    alias for alias in DATABASES
+    if alias != 'default' and alias not in POST_SHARDS]
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.PrimaryReplicaRouter',
+]
+REPLICA_STICKY_SECONDS = 10
+# Соединения с базой (core.db): DATABASE_HEALTH_CHECKS проверяет
+# перед запросом сайта, живо ли постоянное соединение (CONN_MAX_AGE),
+# и открывает новое вместо оборванного; SQLITE_PRAGMAS выполняются
+# на каждом новом соединении с SQLite
+DATABASE_HEALTH_CHECKS = False
+SQLITE_PRAGMAS = {}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+LOGIN_URL = 'users:login'
+LOGIN_REDIRECT_URL = 'posts:index'
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+PAGE_SIZE = 10
+# Полоса с номерами всех страниц требует COUNT(*) на каждый запрос
+PAGINATOR_PAGE_RANGE = False
+# Лента подписок: сколько последних постов автора добавлять при
+# подписке и с какого числа подписчиков посты автора не раскладываются
+# по лентам, а подмешиваются при чтении
+TIMELINE_BACKFILL = 100
+TIMELINE_FANOUT_LIMIT = 10000
+# Тяжёлый автор снова раскладывается по лентам (refill_timelines), лишь
+# когда подписчиков меньше этого: колебания около порога не
+# перекладывают ленты раз за разом
+TIMELINE_REFILL_BELOW = 8000
+# Страницы лент сбрасываются при изменении данных, таймаут лишь
+# ограничивает время жизни вытесненных поколений
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Фрагменты карточек постов ключуются версией поста; таймаут лишь
+# убирает фрагменты старых версий
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Миниатюры картинок строятся в фоне: число потоков пула (0 — сразу,
+# в том же потоке) и заглушка из static вместо оригинала, пока их нет
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PLACEHOLDER = None
+# Через сколько секунд снова пробовать вариант миниатюры, который не
+# удалось построить
+THUMBNAIL_RETRY_AFTER = 60 * 60 * 6
+# Дополнительные форматы миниатюр для <picture>; берутся только те,
+# которые умеет сохранять установленный Pillow
+THUMBNAIL_MODERN_FORMATS = ('AVIF', 'WEBP')
+# Картинки постов при загрузке: больше IMAGE_MAX_BYTES или
+# IMAGE_MAX_PIXELS не принимаются, длинная сторона уменьшается до
+# IMAGE_MAX_SIDE; анимированный GIF хранится первым кадром и, если
+# включено и Pillow умеет WebP, анимацией WebP
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MAX_SIDE = 2048
+IMAGE_ANIMATED_WEBP = True
+# Файл поста без ссылок удаляется, только если он не менялся столько
+# секунд: его могла только что переиспользовать ещё не закоммиченная
+# загрузка
+MEDIA_RELEASE_GRACE = 60
+# Полнотекстовый поиск: 'fts5' (SQLite), 'postings' (таблицы термов,
+# работает на любой базе) или 'auto' — FTS5, если база его умеет.
+# Веса полей умножают вклад совпадений в оценку BM25; FTS5 ранжирует
+# не больше SEARCH_CANDIDATES самых новых совпадений (0 — все)
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+SEARCH_WEIGHTS = {'text': 3, 'comments': 1, 'group_title': 2}
+SEARCH_MAX_TERMS = 8
+SEARCH_CANDIDATES = 10000
+# Замеры запросов (core.metrics): заголовок Server-Timing в ответах и
+# адреса, с которых Prometheus может читать /metrics ('*' — с любых)
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', '1') == '1'
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+# Журнал медленных запросов (core.slow_queries): запросы дольше
+# SLOW_QUERY_MS миллисекунд (None — не записывать) с планом EXPLAIN;
+# файл ротируется по размеру, сводка — команда slow_queries
+SLOW_QUERY_MS = (
+    float(os.environ['SLOW_QUERY_MS']) if os.getenv('SLOW_QUERY_MS')
+    else 100)
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.log'))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_queries': {
+            'class': 'core.slow_queries.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.templates': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+# Выборочный профилировщик (core.profiler) для сотрудников:
+# ?__profile=N к странице (N повторов GET-запроса) или
+# /__profile/?seconds=N для всего воркера; выключен, пока не задан
+# PROFILER_ENABLED=1. Выборка стеков раз в PROFILER_INTERVAL секунд;
+# замер воркера идёт в фоне, его результат хранится в кэше
+# PROFILER_RESULT_TIMEOUT секунд после окончания
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '') == '1'
+PROFILER_INTERVAL = 0.002
+PROFILER_MAX_REPEAT = 100
+PROFILER_MAX_SECONDS = 60
+PROFILER_RESULT_TIMEOUT = 60 * 10
+# Разбор всех шаблонов при запуске воркера (core.precompile, вызов в
+# yatube/wsgi.py), чтобы кэш шаблонов был полон до первого запроса;
+# включается профилем prod. Проверка шаблонов при сборке — команда
+# compile_templates
+TEMPLATE_WARMUP = os.getenv('TEMPLATE_WARMUP', '0') == '1'
@@ -0,0 +1,10 @@
+"""Профиль разработки: DEBUG и шаблоны, которые читаются с диска."""
+from .base import *  # noqa: F401,F403
+
+PROFILE = 'dev'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+SECRET_KEY = SECRET_KEY or (  # noqa: F405
+    '8*h-w@#k4q07f*yk2jbsjva+a)b*c!1k5jdiy7r%o_#un)a&^8')
@@ -0,0 +1,63 @@
+"""Боевой профиль.
+
+Соединение с базой живёт DB_CONN_MAX_AGE секунд и переиспользуется
+запросами; перед запросом сайта оно проверяется и заменяется новым,
+если оборвалось (core.db). На каждом новом соединении с SQLite
+выполняются прагмы: журнал WAL (читатели не ждут писателя),
+synchronous=NORMAL (fsync только при контрольной точке WAL), страницы
+файла через mmap и кэш страниц побольше.
+
+Кэш по умолчанию общий для воркеров (SQLite): в locmem у каждого
+процесса своя копия, и сброс поколений лент после записи не доходит до
+остальных воркеров, поэтому CACHE_BACKEND=locmem здесь запрещён.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import (DATABASES, SECRET_KEY, TEMPLATE_LOADERS, TEMPLATES,
+                   cache_settings)
+
+PROFILE = 'prod'
+
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Профиль prod: задайте DJANGO_SECRET_KEY')
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+if CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured(
+        'Профиль prod: CACHE_BACKEND=locmem не общий для воркеров, '
+        'задайте file или sqlite')
+CACHES = cache_settings(CACHE_BACKEND)
+
+DATABASES = {
+    alias: {
+        **database,
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+    }
+    for alias, database in DATABASES.items()
+}
+DATABASE_HEALTH_CHECKS = True
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+# Разобранные шаблоны хранятся в памяти процесса и разбираются при
+# запуске воркера, а не первым запросом
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+        ],
+    },
+}]
+TEMPLATE_WARMUP = os.getenv('TEMPLATE_WARMUP', '1') == '1'
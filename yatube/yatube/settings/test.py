@@ -0,0 +1,35 @@
+"""Профиль тестов: всё, что замедляет прогон и не проверяется им."""
+from .base import *  # noqa: F401,F403
+
+PROFILE = 'test'
+
+SECRET_KEY = SECRET_KEY or 'test'  # noqa: F405
+
+# Стойкий хешер паролей — основная цена create_user в тестах
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Миниатюры строятся сразу: потоки пула делили бы с тестом базу SQLite
+# в памяти, где их запись блокирует таблицы основному потоку
+THUMBNAIL_WORKERS = 0
+
+# Реплика-зеркало той же базы и два шарда: роутеры включают только их
+# тесты (override_settings DATABASE_REPLICAS и POST_SHARDS)
+DATABASES = {
+    **DATABASES,  # noqa: F405
+    'replica': {
+        **DATABASES['default'],  # noqa: F405
+        'TEST': {'MIRROR': 'default'},
+    },
+    **{
+        alias: {
+            **DATABASES['default'],  # noqa: F405
+            'NAME': os.path.join(BASE_DIR, f'db.test-{alias}.sqlite3'),  # noqa: F405
+        }
+        for alias in ('shard0', 'shard1')
+    },
+}
+DATABASE_REPLICAS = []
+DATABASE_SHARDS = ['shard0', 'shard1']
+POST_SHARDS = []
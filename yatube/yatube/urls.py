@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view, profile_worker
+
 handler403 = 'core.views.csrf_failure'
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -27,7 +29,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
-    path('about/', include('about.urls', namespace='about'),)
+    path('about/', include('about.urls', namespace='about'),),
+    path('metrics', metrics_view, name='metrics'),
+    path('__profile/', profile_worker, name='profile_worker'),
 ]
 
 if settings.DEBUG: